@@ -0,0 +1,211 @@
+# bench/fake_ollama.py
+
+"""Stand-in Ollama HTTP server for load tests and benchmarks.
+
+Serves /api/tags, /api/chat and /api/generate with configurable latency, failure rate and
+malformed-JSON rate, answering the category-variant and puzzle prompts that PuzzleGenerator sends.
+
+Run standalone and point the app at it:
+
+    python bench/fake_ollama.py --port 11500 --latency 2.0 --failure-rate 0.05
+    OLLAMA_ENDPOINT=http://127.0.0.1:11500 python scr/app.py
+
+or start it in-process with FakeOllamaServer (see load_test.py).
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Phrases served by the fake model; enough of them that dedup against recent phrases rarely triggers
+PHRASES = [
+    ("Sweet tooth", "🍬 🦷 😋 🍭"),
+    ("Food baby", "🤰 🍔 😴 🍟"),
+    ("Love bombing", "❤️ 💣 💐 😍"),
+    ("Couch potato", "🛋️ 🥔 📺 😴"),
+    ("Night owl", "🌙 🦉 💻 ☕"),
+    ("Cold feet", "🥶 🦶 💍 🏃"),
+    ("Break the ice", "🔨 🧊 🗣️ 😊"),
+    ("Spill the tea", "🫖 💦 🗣️ 👀"),
+    ("Hit the road", "👊 🛣️ 🚗 💨"),
+    ("Piece of cake", "🍰 😌 👍 ✅"),
+    ("Cat nap", "🐱 😴 💤 🛋️"),
+    ("Road rage", "🚗 😡 🛣️ 💢"),
+    ("Brain freeze", "🧠 🥶 🍦 😖"),
+    ("Beach body", "🏖️ 💪 👙 ☀️"),
+    ("Money talks", "💰 🗣️ 💬 🤑"),
+    ("Ghosting someone", "👻 📱 🚫 💬"),
+    ("Walk of shame", "🚶 🌅 👠 😳"),
+    ("Second date", "2️⃣ 📅 🍝 💕"),
+    ("Office gossip", "🏢 🗣️ 👂 🤫"),
+    ("Retail therapy", "🛍️ 💳 😌 🛒"),
+]
+
+VARIANT_PROMPT_MARKER = "New Unique Variant Category"
+
+
+@dataclass
+class FakeOllamaConfig:
+    latency: float = 0.5 # Mean seconds per generation call
+    latency_jitter: float = 0.2 # Uniform +/- jitter as a fraction of latency
+    failure_rate: float = 0.0 # Fraction of calls answered with HTTP 500
+    malformed_rate: float = 0.0 # Fraction of puzzle calls answered with broken JSON
+    models: tuple = ("gemma3:27b", "llava:latest")
+    chat_supported: bool = True # False answers /api/chat with 404 to exercise the generate fallback
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    server_version = "FakeOllama/1.0"
+
+    def log_message(self, format, *args): # Keep benchmark output readable
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError): # Client gave up (timeout); nothing to do
+            pass
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": name} for name in self.server.config.models]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        config = self.server.config
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            request_body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON body"})
+            return
+
+        if self.path == "/api/chat":
+            if not config.chat_supported:
+                self._send_json(404, {"error": "404 page not found"})
+                return
+            prompt = "\n".join(str(m.get("content", "")) for m in request_body.get("messages", []))
+        elif self.path == "/api/generate":
+            prompt = request_body.get("prompt", "")
+        else:
+            self._send_json(404, {"error": "not found"})
+            return
+
+        started = time.perf_counter()
+        jitter = config.latency * config.latency_jitter
+        time.sleep(max(0.0, random.uniform(config.latency - jitter, config.latency + jitter)))
+        self.server.record_call(self.path)
+
+        if random.random() < config.failure_rate:
+            self._send_json(500, {"error": "fake model failure"})
+            return
+
+        text = self._answer(prompt, config)
+        duration_ns = int((time.perf_counter() - started) * 1e9)
+        payload = {
+            "model": request_body.get("model"),
+            "done": True,
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": len(text) // 4,
+            "total_duration": duration_ns,
+            "load_duration": 0,
+            "eval_duration": duration_ns,
+        }
+        if self.path == "/api/chat":
+            payload["message"] = {"role": "assistant", "content": text}
+        else:
+            payload["response"] = text
+        self._send_json(200, payload)
+
+    @staticmethod
+    def _answer(prompt, config):
+        if VARIANT_PROMPT_MARKER in prompt:
+            return random.choice(["Everyday Mishaps", "Awkward Social Moments", "Things Overheard at Brunch"])
+        phrase, emojis = random.choice(PHRASES)
+        puzzle = {
+            "phrase": phrase,
+            "words": phrase.split(),
+            "category": "echoed by generator",
+            "emojis": emojis,
+            "explanation": f"'{phrase}' is a common saying. The emojis show each part of the phrase in order.",
+        }
+        text = "```json\n" + json.dumps(puzzle, ensure_ascii=False, indent=2) + "\n```"
+        if random.random() < config.malformed_rate:
+            text = text.replace('",\n', '"\n', 1) # Drop a comma: the classic LLM JSON defect
+        return text
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), _FakeOllamaHandler)
+        self.config = config or FakeOllamaConfig()
+        self.call_counts = {}
+        self._counts_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_call(self, path):
+        with self._counts_lock:
+            self.call_counts[path] = self.call_counts.get(path, 0) + 1
+
+    def start(self):
+        """Serves on a background thread and returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def add_config_arguments(parser):
+    """Adds the fake model's tuning flags to an argparse parser (shared with load_test.py)."""
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean seconds per model call")
+    parser.add_argument("--latency-jitter", type=float, default=0.2, help="Jitter as a fraction of latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of calls failing with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Fraction of puzzle answers with broken JSON")
+    parser.add_argument("--no-chat", action="store_true", help="Answer /api/chat with 404 (generate-only backend)")
+
+
+def config_from_args(args):
+    return FakeOllamaConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        failure_rate=args.failure_rate,
+        malformed_rate=args.malformed_rate,
+        chat_supported=not args.no_chat,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(config_from_args(args), host=args.host, port=args.port)
+    print(f"Fake Ollama listening on {server.url} (config: {server.config})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
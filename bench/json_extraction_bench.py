@@ -0,0 +1,122 @@
+# bench/json_extraction_bench.py
+
+"""Compares the old fence-stripping parser with json_extraction.extract_json_object on a corpus.
+
+The corpus is JSONL with a "response" per line (raw model output) and optionally "shape" and
+"expected_phrase" (null when the response holds no usable puzzle). bench/data/model_responses.jsonl
+covers the response shapes gemma3 produces for the puzzle prompt; real traffic can be added with
+
+    PUZZLE_CAPTURE_RESPONSES=captured.jsonl python scr/app.py
+    python bench/json_extraction_bench.py --corpus bench/data/model_responses.jsonl captured.jsonl
+
+The report shows parse success per shape for both parsers, the resulting retry rate (a parse
+failure costs a full extra generation) and the parse time per response. The bundled corpus is a synthetic mix
+(a few examples of each shape), so its success and retry rates describe that mix, not production
+traffic. tests/test_json_extraction.py asserts every entry's expected_phrase.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from collections import defaultdict
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scr"))
+
+from json_extraction import extract_json_object  # noqa: E402
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent / "data" / "model_responses.jsonl"
+
+
+def legacy_parse(response_text):
+    """The parser _generate_single_puzzle_attempt used before json_extraction."""
+    cleaned_response = response_text.strip()
+    if cleaned_response.startswith("```json"): cleaned_response = cleaned_response[len("```json"):].strip()
+    elif cleaned_response.startswith("```"): cleaned_response = cleaned_response[len("```"):].strip()
+    if cleaned_response.endswith("```"): cleaned_response = cleaned_response[:-len("```")].strip()
+    return json.loads(cleaned_response)
+
+
+def tolerant_parse(response_text):
+    return extract_json_object(response_text)[0]
+
+
+PARSERS = {"legacy": legacy_parse, "tolerant": tolerant_parse}
+
+
+def load_corpus(paths):
+    entries = []
+    for path in paths:
+        with open(path, encoding="utf-8") as corpus_file:
+            for line in corpus_file:
+                if line.strip():
+                    entry = json.loads(line)
+                    entry.setdefault("shape", "captured")
+                    entries.append(entry)
+    return entries
+
+
+def outcome(parser, entry):
+    """'ok', 'wrong' (parsed, but not the expected puzzle) or 'fail'."""
+    try:
+        value = parser(entry["response"])
+    except ValueError:
+        return "fail"
+    if not isinstance(value, dict):
+        return "fail"
+    expected = entry.get("expected_phrase", value.get("phrase"))
+    return "ok" if expected is not None and value.get("phrase") == expected else "wrong"
+
+
+def mean_parse_micros(parser, entries, repeat):
+    def run():
+        for entry in entries:
+            try:
+                parser(entry["response"])
+            except ValueError:
+                pass
+    return min(timeit.repeat(run, number=1, repeat=repeat)) / len(entries) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark puzzle JSON extraction on a response corpus")
+    parser.add_argument("--corpus", nargs="+", default=[str(DEFAULT_CORPUS)], help="JSONL corpus file(s)")
+    parser.add_argument("--repeat", type=int, default=200, help="Timing repetitions (best is reported)")
+    args = parser.parse_args()
+
+    entries = load_corpus(args.corpus)
+    recoverable = [e for e in entries if e.get("expected_phrase", "") is not None]
+    by_shape = defaultdict(lambda: {name: 0 for name in PARSERS})
+    shape_counts = defaultdict(int)
+    totals = {name: defaultdict(int) for name in PARSERS}
+    for entry in entries:
+        shape_counts[entry["shape"]] += 1
+        for name, parse in PARSERS.items():
+            result = outcome(parse, entry)
+            totals[name][result] += 1
+            if result == "ok":
+                by_shape[entry["shape"]][name] += 1
+
+    print(f"Corpus: {len(entries)} responses ({len(recoverable)} contain a usable puzzle)")
+    if any(entry["shape"] != "captured" for entry in entries):
+        # The bundled corpus is hand-built: one or a few responses per shape, not real traffic frequencies
+        print("Note: rates below come from a synthetic mix of response shapes, not from captured traffic; "
+              "add captured responses with --corpus for real-world rates.")
+    print()
+    print(f"{'shape':<22}{'count':>7}{'legacy ok':>11}{'tolerant ok':>13}")
+    for shape in sorted(shape_counts):
+        print(f"{shape:<22}{shape_counts[shape]:>7}{by_shape[shape]['legacy']:>11}{by_shape[shape]['tolerant']:>13}")
+    print()
+    for name in PARSERS:
+        ok, wrong = totals[name]["ok"], totals[name]["wrong"]
+        # Every response without a correctly parsed puzzle costs one more generation attempt
+        retry_rate = 1 - ok / len(entries) if entries else 0.0
+        micros = mean_parse_micros(PARSERS[name], entries, args.repeat)
+        print(f"{name:<9} parsed {ok}/{len(entries)}, wrong object {wrong}, retry rate {retry_rate:.1%}, "
+              f"{micros:.1f} us/response")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+# bench/load_test.py
+
+"""Concurrent-player load test for the puzzle server.
+
+Each virtual player loops: GET /api/generate-puzzle, optionally "plays" for --think-time seconds,
+then POST /api/log-puzzle-result for the puzzle it got. The report gives throughput and
+p50/p95/p99 latency per endpoint plus status-code counts.
+
+Against a self-contained setup (fake Ollama + app server started here):
+
+    python bench/load_test.py --spawn --players 16 --duration 60 --latency 2.0
+
+Against an already running server:
+
+    python bench/load_test.py --base-url http://127.0.0.1:5006 --players 8 --duration 30
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import requests
+
+from fake_ollama import FakeOllamaServer, add_config_arguments, config_from_args
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SCR_DIR = PROJECT_ROOT / "scr"
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return float("nan")
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values))))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class LatencyRecorder:
+    """Thread-safe per-endpoint latency and status collection."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def summary(self, elapsed):
+        report = {}
+        with self._lock:
+            for endpoint, values in self.latencies.items():
+                values = sorted(values)
+                report[endpoint] = {
+                    "requests": len(values),
+                    "throughput_rps": round(len(values) / elapsed, 3) if elapsed else 0.0,
+                    "p50_ms": round(percentile(values, 50) * 1000, 1),
+                    "p95_ms": round(percentile(values, 95) * 1000, 1),
+                    "p99_ms": round(percentile(values, 99) * 1000, 1),
+                    "max_ms": round(values[-1] * 1000, 1),
+                    "statuses": dict(self.statuses[endpoint]),
+                }
+        return report
+
+
+def timed_request(session, recorder, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = session.request(method, url, **kwargs)
+        status = response.status_code
+    except requests.RequestException as e:
+        response, status = None, type(e).__name__
+    recorder.record(endpoint, time.perf_counter() - started, status)
+    return response
+
+
+def result_payload(puzzle, total_score):
+    """A plausible /api/log-puzzle-result body for a puzzle the player just finished."""
+    solved = random.random() < 0.6
+    hints = random.randint(0, 3)
+    score = max(0, 100 - 10 * hints) if solved else 0
+    return {
+        "category": puzzle.get("category"),
+        "phrase": puzzle.get("phrase"),
+        "emojis_list": puzzle.get("emojis_list"),
+        "solvedCorrectly": "yes" if solved else "no",
+        "letterHintsUsed": hints,
+        "puzzleScore": score,
+        "totalScoreAtEnd": total_score + score,
+    }
+
+
+def player_loop(base_url, recorder, stop_at, think_time, request_timeout):
+    session = requests.Session()
+    total_score = 25
+    while time.monotonic() < stop_at:
+        response = timed_request(session, recorder, "generate-puzzle", "GET",
+                                 f"{base_url}/api/generate-puzzle", timeout=request_timeout)
+        if response is None or response.status_code != 200:
+            retry_after = response.headers.get("Retry-After") if response is not None else None
+            time.sleep(min(float(retry_after or 1), 5))
+            continue
+        puzzle = response.json()
+        if think_time:
+            time.sleep(random.uniform(0, 2 * think_time))
+        payload = result_payload(puzzle, total_score)
+        total_score = payload["totalScoreAtEnd"]
+        timed_request(session, recorder, "log-puzzle-result", "POST",
+                      f"{base_url}/api/log-puzzle-result", json=payload, timeout=request_timeout)
+
+
+def wait_for_server(base_url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{base_url}/metrics", timeout=2).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    return False
+
+
+def spawn_app_server(port, ollama_url, extra_env=None):
+    """Starts scr/app.py's Flask app (threaded, no debug reloader) in a subprocess."""
+    env = dict(os.environ, OLLAMA_ENDPOINT=ollama_url, **(extra_env or {}))
+    # Keep benchmark runs out of the real result log
+    env.setdefault("PUZZLE_LOG_CSV", str(PROJECT_ROOT / "bench_puzzle_log.csv"))
+    env.setdefault("PUZZLE_USAGE_LOG", str(PROJECT_ROOT / "bench_model_usage.jsonl"))
+    # Background daily-puzzle generation would compete with the measured load
+    env.setdefault("PUZZLE_DAILY_FILL_INTERVAL", "0")
+    # Every virtual player connects from 127.0.0.1, so a per-client limit would throttle the whole run
+    env.setdefault("PUZZLE_RATE_LIMIT_PER_MINUTE", "1000000")
+    env.setdefault("PUZZLE_RATE_LIMIT_BURST", "1000000")
+    code = f"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False)"
+    return subprocess.Popen([sys.executable, "-c", code], cwd=SCR_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+
+def run_load(base_url, players, duration, think_time, request_timeout):
+    recorder = LatencyRecorder()
+    stop_at = time.monotonic() + duration
+    threads = [threading.Thread(target=player_loop, args=(base_url, recorder, stop_at, think_time, request_timeout),
+                                daemon=True) for _ in range(players)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + request_timeout + 5)
+    return recorder.summary(time.perf_counter() - started)
+
+
+def print_report(report):
+    print(f"{'endpoint':<20}{'reqs':>7}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses")
+    for endpoint, stats in sorted(report.items()):
+        print(f"{endpoint:<20}{stats['requests']:>7}{stats['throughput_rps']:>9.2f}{stats['p50_ms']:>10.1f}"
+              f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}  {stats['statuses']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/generate-puzzle and /api/log-puzzle-result")
+    parser.add_argument("--base-url", help="Running server to test (omit with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start a fake Ollama and an app server for the run")
+    parser.add_argument("--app-port", type=int, default=5099, help="Port for the spawned app server")
+    parser.add_argument("--players", type=int, default=8, help="Concurrent virtual players")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Mean seconds a player spends per puzzle")
+    parser.add_argument("--request-timeout", type=float, default=180, help="Client timeout per request")
+    parser.add_argument("--json", dest="json_path", help="Also write the report as JSON to this path")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.spawn and not args.base_url:
+        parser.error("either --base-url or --spawn is required")
+
+    fake_ollama = app_process = None
+    base_url = args.base_url
+    try:
+        if args.spawn:
+            fake_ollama = FakeOllamaServer(config_from_args(args)).start()
+            app_process = spawn_app_server(args.app_port, fake_ollama.url)
+            base_url = f"http://127.0.0.1:{args.app_port}"
+            if not wait_for_server(base_url):
+                sys.exit("App server did not come up; run it manually to see its output.")
+            print(f"Spawned fake Ollama at {fake_ollama.url} and app at {base_url}")
+
+        print(f"Running {args.players} players for {args.duration:.0f}s against {base_url} ...")
+        report = run_load(base_url, args.players, args.duration, args.think_time, args.request_timeout)
+        print_report(report)
+        if fake_ollama:
+            print(f"Fake Ollama calls: {fake_ollama.call_counts}")
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as report_file:
+                json.dump({"args": vars(args), "report": report}, report_file, indent=2)
+    finally:
+        if app_process:
+            app_process.terminate()
+            app_process.wait(10)
+        if fake_ollama:
+            fake_ollama.stop()
+
+
+if __name__ == "__main__":
+    main()
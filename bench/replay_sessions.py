@@ -0,0 +1,270 @@
+# bench/replay_sessions.py
+
+"""Replays real play sessions from puzzle_log.csv against the server.
+
+Every row in the log is a /api/log-puzzle-result call a player made. The generate call for a
+puzzle happened when the previous row in the same session was logged (the player clicked
+"New Puzzle"), so the log can be turned back into the arrival pattern of both endpoints.
+Rows are split into sessions on long idle gaps or when TotalScoreAtEnd drops (a new game).
+
+Each session is replayed in order on its own thread. An event fires at its scheduled offset,
+or as soon as the previous call returns if the server is running behind (a player can't ask
+for the next puzzle before the current one has loaded).
+
+    # Inspect the traffic shape only
+    python bench/replay_sessions.py --dry-run
+
+    # All sessions start together, 60x faster than real time, against fake Ollama + app
+    python bench/replay_sessions.py --spawn --overlay --speedup 60 --latency 2.0
+
+    # Real arrival times (1 day of log = 1 hour of replay) against a running server
+    python bench/replay_sessions.py --base-url http://127.0.0.1:5006 --speedup 24
+"""
+
+import argparse
+import csv
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import requests
+
+from fake_ollama import FakeOllamaServer, add_config_arguments, config_from_args
+from load_test import (PROJECT_ROOT, LatencyRecorder, print_report, spawn_app_server,
+                       timed_request, wait_for_server)
+
+DEFAULT_LOG_PATH = PROJECT_ROOT / "puzzle_log.csv"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+@dataclass
+class LogRow:
+    timestamp: datetime
+    category: str
+    phrase: str
+    emojis: str
+    solved_correctly: str = None # None for early rows that only recorded the generated puzzle
+    letter_hints_used: int = 0
+    puzzle_score: float = 0.0
+    total_score_at_end: float = None
+
+
+@dataclass
+class ReplayEvent:
+    offset: float # Seconds from the session's replay start (before speedup)
+    kind: str # "generate" or "log"
+    row: LogRow = None
+
+
+@dataclass
+class Session:
+    rows: list = field(default_factory=list)
+    events: list = field(default_factory=list)
+
+    @property
+    def start(self):
+        return self.rows[0].timestamp
+
+
+def read_log(path):
+    """Parses puzzle_log.csv, tolerating the short 4-column rows and the stale 4-column header."""
+    rows = []
+    with open(path, newline="", encoding="utf-8") as log_file:
+        for record in csv.reader(log_file):
+            if not record or record[0] == "Timestamp":
+                continue
+            try:
+                timestamp = datetime.strptime(record[0], TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            row = LogRow(timestamp, record[1], record[2], record[3])
+            if len(record) >= 8:
+                try:
+                    row.solved_correctly = record[4]
+                    row.letter_hints_used = int(float(record[5]))
+                    row.puzzle_score = float(record[6])
+                    row.total_score_at_end = float(record[7])
+                except ValueError:
+                    row.solved_correctly = None
+            rows.append(row)
+    rows.sort(key=lambda r: r.timestamp)
+    return rows
+
+
+def split_sessions(rows, session_gap):
+    """Groups rows into sessions on idle gaps longer than session_gap seconds or a score reset."""
+    sessions = []
+    current = None
+    for row in rows:
+        previous = current.rows[-1] if current else None
+        new_session = (
+            previous is None
+            or (row.timestamp - previous.timestamp).total_seconds() > session_gap
+            or (row.total_score_at_end is not None and previous.total_score_at_end is not None
+                and row.total_score_at_end < previous.total_score_at_end)
+        )
+        if new_session:
+            current = Session()
+            sessions.append(current)
+        current.rows.append(row)
+    return sessions
+
+
+def build_events(session, first_play_seconds, max_think_seconds):
+    """Turns a session's rows into generate/log events with offsets from the session start.
+
+    Idle gaps inside a session are capped at max_think_seconds so a player who walked away
+    doesn't stretch the replay.
+    """
+    events = []
+    offset = 0.0
+    previous = None
+    for row in session.rows:
+        if previous is None:
+            events.append(ReplayEvent(0.0, "generate"))
+            offset = first_play_seconds
+        else:
+            gap = (row.timestamp - previous.timestamp).total_seconds()
+            if row.phrase != previous.phrase:
+                # The player asked for this puzzle right after logging the previous one
+                events.append(ReplayEvent(offset, "generate"))
+            offset += min(gap, max_think_seconds)
+        if row.solved_correctly is not None:
+            events.append(ReplayEvent(offset, "log", row))
+        previous = row
+    session.events = events
+    return events
+
+
+def logged_starts(sessions):
+    """Session start offsets at their real times in the log, relative to the first session.
+
+    Gaps between sessions are kept as logged (--max-think only shortens idle time inside a
+    session), so sessions overlap exactly when real players did.
+    """
+    if not sessions:
+        return []
+    first = min(session.start for session in sessions)
+    return [(session.start - first).total_seconds() for session in sessions]
+
+
+def log_payload(row):
+    return {
+        "category": row.category,
+        "phrase": row.phrase,
+        "emojis_list": [emoji for emoji in row.emojis.split(" ") if emoji],
+        "solvedCorrectly": row.solved_correctly,
+        "letterHintsUsed": row.letter_hints_used,
+        "puzzleScore": row.puzzle_score,
+        "totalScoreAtEnd": row.total_score_at_end,
+    }
+
+
+def describe_schedule(sessions, session_starts, speedup):
+    """Prints the traffic shape that will be replayed."""
+    arrivals = Counter()
+    kinds = Counter()
+    for session, start in zip(sessions, session_starts):
+        for event in session.events:
+            kinds[event.kind] += 1
+            arrivals[int((start + event.offset) / speedup // 60)] += 1
+    span = max((start + s.events[-1].offset for s, start in zip(sessions, session_starts)), default=0) / speedup
+    lengths = [len(s.rows) for s in sessions]
+    print(f"Sessions: {len(sessions)} (puzzles per session: median {statistics.median(lengths) if lengths else 0}, "
+          f"max {max(lengths, default=0)})")
+    print(f"Events: {kinds['generate']} generate, {kinds['log']} log-result over {span:.0f}s of replay time")
+    if arrivals:
+        print(f"Arrivals per replay minute: mean {statistics.mean(arrivals.values()):.1f}, peak {max(arrivals.values())}")
+
+
+def replay_session(session, base_url, recorder, replay_start, session_start, speedup, lag, request_timeout):
+    http = requests.Session()
+    for event in session.events:
+        scheduled = replay_start + (session_start + event.offset) / speedup
+        delay = scheduled - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            lag.append(-delay)
+        if event.kind == "generate":
+            timed_request(http, recorder, "generate-puzzle", "GET", f"{base_url}/api/generate-puzzle",
+                          timeout=request_timeout)
+        else:
+            timed_request(http, recorder, "log-puzzle-result", "POST", f"{base_url}/api/log-puzzle-result",
+                          json=log_payload(event.row), timeout=request_timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay puzzle_log.csv sessions against the server")
+    parser.add_argument("--log", default=str(DEFAULT_LOG_PATH), help="Result log to replay")
+    parser.add_argument("--base-url", help="Running server to replay against")
+    parser.add_argument("--spawn", action="store_true", help="Start a fake Ollama and an app server for the run")
+    parser.add_argument("--app-port", type=int, default=5099)
+    parser.add_argument("--speedup", type=float, default=1.0, help="Time compression factor (60 = 1h in 1min)")
+    parser.add_argument("--overlay", action="store_true",
+                        help="Start every session at t=0 (concurrent players) instead of at its logged time")
+    parser.add_argument("--copies", type=int, default=1, help="Replay each session this many times concurrently")
+    parser.add_argument("--session-gap", type=float, default=1800, help="Idle seconds that end a session")
+    parser.add_argument("--max-think", type=float, default=300,
+                        help="Cap on idle seconds inside a session (gaps between sessions are replayed as logged)")
+    parser.add_argument("--first-play", type=float, default=45, help="Assumed play time of a session's first puzzle")
+    parser.add_argument("--request-timeout", type=float, default=180)
+    parser.add_argument("--dry-run", action="store_true", help="Only print the schedule summary")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    sessions = split_sessions(read_log(args.log), args.session_gap)
+    for session in sessions:
+        build_events(session, args.first_play, args.max_think)
+    session_starts = [0.0] * len(sessions) if args.overlay else logged_starts(sessions)
+    # Copies of a session start together, as additional concurrent players
+    session_starts = [start for start in session_starts for _ in range(args.copies)]
+    sessions = [session for session in sessions for _ in range(args.copies)]
+    describe_schedule(sessions, session_starts, args.speedup)
+    if args.dry_run:
+        return
+    if not args.spawn and not args.base_url:
+        parser.error("either --base-url, --spawn or --dry-run is required")
+
+    fake_ollama = app_process = None
+    base_url = args.base_url
+    try:
+        if args.spawn:
+            fake_ollama = FakeOllamaServer(config_from_args(args)).start()
+            app_process = spawn_app_server(args.app_port, fake_ollama.url)
+            base_url = f"http://127.0.0.1:{args.app_port}"
+            if not wait_for_server(base_url):
+                sys.exit("App server did not come up; run it manually to see its output.")
+
+        recorder, lag = LatencyRecorder(), []
+        replay_start = time.monotonic()
+        threads = [threading.Thread(target=replay_session, daemon=True,
+                                    args=(session, base_url, recorder, replay_start, start, args.speedup, lag,
+                                          args.request_timeout))
+                   for session, start in zip(sessions, session_starts)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - replay_start
+        print_report(recorder.summary(elapsed))
+        if lag:
+            lag.sort()
+            print(f"Schedule lag (server slower than the recorded players): {len(lag)} late events, "
+                  f"median {statistics.median(lag):.2f}s, max {lag[-1]:.2f}s")
+        if fake_ollama:
+            print(f"Fake Ollama calls: {fake_ollama.call_counts}")
+    finally:
+        if app_process:
+            app_process.terminate()
+            app_process.wait(10)
+        if fake_ollama:
+            fake_ollama.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+# bench/usage_report.py
+
+"""Model cost per served puzzle, from the usage log joined to the result log.
+
+PuzzleGenerator writes one line per generation to model_usage.jsonl (tokens and model time of
+every call, per pipeline stage), keyed by the puzzle's ID. Result log rows carry the same ID in
+their PuzzleId column, so together they show:
+
+- tokens per served puzzle: everything the model was asked to do, including failed generations
+  and puzzles nobody played, divided by the distinct puzzles that were played;
+- which stage (variant, attempt_N, analysis) dominates tokens and latency;
+- per prompt version (see scr/prompt_versions.py): prompt tokens per attempt, generation latency,
+  validation pass rate and the solve rate of its puzzles.
+
+    python bench/usage_report.py
+    python bench/usage_report.py --usage bench_model_usage.jsonl --log bench_puzzle_log.csv
+"""
+
+import argparse
+import csv
+import json
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+SOLVED_COLUMN = 4
+PUZZLE_ID_COLUMN = 8 # Rows logged before the column existed are shorter and are not joined
+
+
+def read_usage(path):
+    records = []
+    with open(path, encoding="utf-8") as usage_file:
+        for line in usage_file:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue # A line cut short by a crash
+    return records
+
+
+def read_plays(path):
+    """Returns {PuzzleId: [plays, solved plays]} from the result log."""
+    plays = defaultdict(lambda: [0, 0])
+    try:
+        with open(path, newline="", encoding="utf-8") as log_file:
+            for record in csv.reader(log_file):
+                if len(record) > PUZZLE_ID_COLUMN and record[0] != "Timestamp" and record[PUZZLE_ID_COLUMN]:
+                    counts = plays[record[PUZZLE_ID_COLUMN]]
+                    counts[0] += 1
+                    counts[1] += record[SOLVED_COLUMN].lower() == "yes"
+    except FileNotFoundError:
+        pass
+    return plays
+
+
+def stage_table(records):
+    stages = defaultdict(lambda: {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'model_ms': 0.0,
+                                  'wall_ms': 0.0})
+    for record in records:
+        for stage, totals in record.get('stages', {}).items():
+            for key in stages[stage]:
+                stages[stage][key] += totals.get(key, 0)
+    return stages
+
+
+def prompt_version_table(records, plays):
+    versions = defaultdict(lambda: {'generations': 0, 'ok': 0, 'attempts': 0, 'valid_attempts': 0,
+                                    'attempt_calls': 0, 'attempt_prompt_tokens': 0, 'duration_ms': 0.0,
+                                    'plays': 0, 'solved': 0})
+    for record in records:
+        if not record.get('prompt_version'):
+            continue # Logged before prompt versions were recorded
+        v = versions[record['prompt_version']]
+        v['generations'] += 1
+        v['ok'] += bool(record.get('puzzle_id'))
+        v['attempts'] += record.get('attempts', 0)
+        v['valid_attempts'] += record.get('valid_attempts', 0)
+        v['duration_ms'] += record.get('duration_ms', 0)
+        for stage, totals in record.get('stages', {}).items():
+            if stage.startswith("attempt_"):
+                v['attempt_calls'] += totals['calls']
+                v['attempt_prompt_tokens'] += totals['prompt_tokens']
+        if record.get('puzzle_id') in plays:
+            v['plays'] += plays[record['puzzle_id']][0]
+            v['solved'] += plays[record['puzzle_id']][1]
+    return versions
+
+
+def print_report(records, plays):
+    played_ids = set(plays)
+    play_count = sum(counts[0] for counts in plays.values())
+    generated = [r for r in records if r.get('puzzle_id')]
+    total_tokens = sum(r['prompt_tokens'] + r['completion_tokens'] for r in records)
+    print(f"Generations: {len(records)} ({len(generated)} ok, {len(records) - len(generated)} failed)")
+    print(f"Tokens: {total_tokens} total, "
+          f"{sum(r['prompt_tokens'] for r in records)} prompt, {sum(r['completion_tokens'] for r in records)} completion")
+    if generated:
+        print(f"Tokens per generated puzzle: {total_tokens / len(generated):.0f}")
+    generated_ids = {r['puzzle_id'] for r in generated}
+    served_ids = played_ids & generated_ids
+    if served_ids:
+        served_tokens = sum(r['prompt_tokens'] + r['completion_tokens'] for r in generated
+                            if r['puzzle_id'] in served_ids)
+        print(f"Served puzzles: {len(served_ids)} distinct, {play_count} plays logged")
+        print(f"Tokens per served puzzle: {total_tokens / len(served_ids):.0f} "
+              f"(of which {served_tokens / len(served_ids):.0f} spent on the served puzzles themselves)")
+    else:
+        print("Served puzzles: none of the generated puzzles appear in the result log")
+
+    stages = stage_table(records)
+    total_wall = sum(s['wall_ms'] for s in stages.values()) or 1
+    print(f"\n{'stage':<14}{'calls':>7}{'prompt tok':>12}{'compl tok':>11}{'model s':>10}{'wall s':>10}{'wall %':>8}")
+    for stage, s in sorted(stages.items(), key=lambda item: -item[1]['wall_ms']):
+        calls = s['calls'] or 1
+        print(f"{stage:<14}{s['calls']:>7}{s['prompt_tokens'] / calls:>12.0f}{s['completion_tokens'] / calls:>11.0f}"
+              f"{s['model_ms'] / 1000:>10.1f}{s['wall_ms'] / 1000:>10.1f}{100 * s['wall_ms'] / total_wall:>7.1f}%")
+    print("(prompt/completion tokens are per call)")
+
+    versions = prompt_version_table(records, plays)
+    if versions:
+        print(f"\n{'prompt version':<16}{'gens':>6}{'ok %':>7}{'prompt tok':>12}{'gen s':>8}{'valid %':>9}"
+              f"{'plays':>7}{'solved %':>10}")
+        for name, v in sorted(versions.items()):
+            solve_rate = f"{100 * v['solved'] / v['plays']:>9.1f}%" if v['plays'] else f"{'-':>10}"
+            print(f"{name:<16}{v['generations']:>6}{100 * v['ok'] / v['generations']:>6.1f}%"
+                  f"{v['attempt_prompt_tokens'] / (v['attempt_calls'] or 1):>12.0f}"
+                  f"{v['duration_ms'] / 1000 / v['generations']:>8.1f}"
+                  f"{100 * v['valid_attempts'] / (v['attempts'] or 1):>8.1f}%{v['plays']:>7}{solve_rate}")
+        print("(prompt tok per puzzle attempt; gen s per generation; valid = attempts passing parse and validation)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens and model time per served puzzle and per stage")
+    parser.add_argument("--usage", default=str(PROJECT_ROOT / "model_usage.jsonl"), help="Usage log")
+    parser.add_argument("--log", default=str(PROJECT_ROOT / "puzzle_log.csv"), help="Result log")
+    args = parser.parse_args()
+
+    try:
+        records = read_usage(args.usage)
+    except FileNotFoundError:
+        sys.exit(f"No usage log at {args.usage}")
+    print_report(records, read_plays(args.log))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# src/admission.py
+
+"""Admission control for the endpoints that start model work.
+
+Two independent checks keep the Ollama backend at its efficient operating point:
+
+- Per-client token buckets (ClientRateLimiter): each client may start `rate` generations per
+  second on average, with bursts up to `burst`. A client over its limit gets 429 with Retry-After
+  set to when its next token is due. Buckets live in the SharedStateStore under the multi-process
+  server, so the limit applies to the client as a whole rather than per worker; in-process
+  otherwise.
+- Bounded concurrency (ConcurrencyGate, and GenerationCoalescer's max_waiting): a fixed number of
+  generations run at once, and only a bounded number of requests may wait for a slot. Beyond that,
+  requests are refused at once with 503 and Retry-After (Overloaded) instead of joining a queue
+  they would time out in.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from trace_log import get_logger
+
+logger = get_logger("admission")
+
+
+class Overloaded(Exception):
+    """Raised when a request is refused because the generation queue is full."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LocalRateLimitBuckets:
+    """In-process token buckets (SharedStateStore offers the same interface across processes)."""
+
+    def __init__(self, max_clients=10000):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict() # key -> (tokens, updated_at), least recently used first
+        self._lock = threading.Lock()
+
+    def take_rate_token(self, key, rate, burst, cost=1):
+        """Takes `cost` tokens from the bucket if it has them.
+
+        Returns:
+            float: 0 if the tokens were taken, else seconds until enough will have accumulated.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class ClientRateLimiter:
+    def __init__(self, rate_per_minute=6, burst=4, buckets=None):
+        """
+        Args:
+            rate_per_minute (float): Sustained generations a client may start per minute.
+            burst (float): Generations a client may start back to back after being idle.
+            buckets (optional): Bucket storage with take_rate_token, e.g. the SharedStateStore so the
+                limit holds across worker processes. Defaults to a LocalRateLimitBuckets.
+        """
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.buckets = buckets if buckets is not None else LocalRateLimitBuckets()
+
+    def check(self, client_id, cost=1):
+        """Charges `cost` tokens to the client.
+
+        Returns:
+            float: 0 if the request may proceed, else the Retry-After in seconds.
+        """
+        return self.buckets.take_rate_token(f"rate:{client_id}", self.rate, self.burst, cost)
+
+
+class ConcurrencyGate:
+    """At most `max_concurrent` holders at once, with at most `max_waiting` queued behind them."""
+
+    def __init__(self, max_concurrent, max_waiting, retry_after=10):
+        """
+        Args:
+            max_concurrent (int): Requests allowed inside the gate at once.
+            max_waiting (int): Requests allowed to wait for a slot; any more raise Overloaded.
+            retry_after (float): Retry-After suggested to refused requests.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.retry_after = retry_after
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+
+    def acquire(self, deadline):
+        """Waits for a slot until the deadline.
+
+        Raises:
+            Overloaded: If the wait queue is full, or no slot freed up before the deadline.
+        """
+        with self._cond:
+            if self._active >= self.max_concurrent and self._waiting >= self.max_waiting:
+                raise Overloaded("Too many requests are waiting for the model.", self.retry_after)
+            self._waiting += 1
+            try:
+                while self._active >= self.max_concurrent:
+                    remaining = deadline.remaining()
+                    if remaining <= 0:
+                        raise Overloaded("Timed out waiting for the model.", self.retry_after)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._active += 1
+
+    def release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {'active': self._active, 'waiting': self._waiting}
@@ -1,130 +1,573 @@
 # src/app.py
 
-from flask import Flask, jsonify, render_template, send_from_directory, request # Added request
+import hashlib
+import hmac
+import math
+import os
+import time
+from werkzeug.exceptions import RequestEntityTooLarge
+from flask import Flask, jsonify, render_template, send_from_directory, request, g, Response, make_response, url_for # Added request
 # Make sure your generator and connector classes are in the src directory
 from model_connector import ModelConnector
 from generator import PuzzleGenerator # This now has the new methods
+from deadline import Deadline
+from generation_coalescer import GenerationCoalescer
+from shared_state import SharedStateStore
+from static_assets import StaticAssetManifest
+from puzzle_pack import PuzzlePackBuilder
+from result_ingest import ResultIngestor
+from image_preprocess import ImagePreprocessError
+from daily_puzzles import DailyPuzzleSchedule, seconds_until_midnight
+from admission import ClientRateLimiter, ConcurrencyGate, Overloaded
+from puzzle_registry import PuzzleRegistry
+from puzzle_cards import CardRenderer, GlyphAtlas, CARD_LAYOUT_VERSION
+from request_profiler import RequestProfiler
+from metrics import REGISTRY, HTTP_REQUEST_SECONDS, ADMISSION_REJECTIONS
+from trace_log import configure_logging, get_logger, fields, request_id_var, new_request_id
+
+configure_logging()
+logger = get_logger("app")
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 
+# Content-hashed, precompressed copies of static/ served with immutable caching; templates use asset_url()
+static_assets = StaticAssetManifest(app.static_folder, auto_reload=__name__ == '__main__')
+app.add_template_global(static_assets.url, 'asset_url')
+# Files the service worker precaches so the game page loads with no network
+app.config['APP_SHELL_FILES'] = ('manifest.json', 'css/style.css', 'css/mobile.css', 'js/script.js')
+# Puzzles in the offline pack the service worker downloads (already played puzzles from the result log)
+app.config['PUZZLE_PACK_SIZE'] = 40
+app.config['MAX_PUZZLE_PACK_SIZE'] = 200
+
+# End-to-end time budget (seconds) per API endpoint, shared by every model call the request makes.
+# Override with environment variables, e.g. PUZZLE_DEADLINE_GENERATE_PUZZLE=90
+app.config['REQUEST_DEADLINES'] = {
+    'generate_puzzle_api': float(os.environ.get('PUZZLE_DEADLINE_GENERATE_PUZZLE', 120)),
+    'puzzles_api': float(os.environ.get('PUZZLE_DEADLINE_PUZZLES', 120)),
+    'photo_puzzle_api': float(os.environ.get('PUZZLE_DEADLINE_PHOTO_PUZZLE', 150)),
+}
+# Upper bound on puzzle generations running against Ollama at once; extra requests wait and share them.
+# Per worker process: the server as a whole runs up to this times PUZZLE_WORKERS
+app.config['MAX_CONCURRENT_GENERATIONS'] = int(os.environ.get('PUZZLE_MAX_CONCURRENT_GENERATIONS', 2))
+# Requests allowed to wait for a generation slot; beyond this they get 503 + Retry-After at once
+app.config['MAX_WAITING_GENERATIONS'] = int(os.environ.get('PUZZLE_MAX_WAITING_GENERATIONS', 8))
+# Per-client allowance for requests that may start model work (token bucket: sustained rate and burst)
+app.config['RATE_LIMIT_PER_MINUTE'] = float(os.environ.get('PUZZLE_RATE_LIMIT_PER_MINUTE', 6))
+app.config['RATE_LIMIT_BURST'] = float(os.environ.get('PUZZLE_RATE_LIMIT_BURST', 4))
+# Behind a reverse proxy, identify clients by the first X-Forwarded-For address instead of the socket peer
+app.config['TRUST_PROXY'] = os.environ.get('PUZZLE_TRUST_PROXY', '') == '1'
+# Photo puzzles run two model stages each, so they get their own small concurrency cap. Like the
+# generation cap it is per worker process: the effective limit is this times PUZZLE_WORKERS (4 by default)
+app.config['MAX_CONCURRENT_PHOTO_PUZZLES'] = int(os.environ.get('PUZZLE_MAX_CONCURRENT_PHOTO_PUZZLES', 1))
+app.config['MAX_WAITING_PHOTO_PUZZLES'] = int(os.environ.get('PUZZLE_MAX_WAITING_PHOTO_PUZZLES', 2))
+# Largest batch /api/puzzles hands out in one response (the client prefetch queue asks for a few)
+app.config['MAX_PUZZLES_PER_REQUEST'] = 5
+# Daily puzzle mode: days after today kept scheduled, and how often (seconds) the background fill
+# checks for missing days; 0 disables the background fill (run `python daily_puzzles.py` instead)
+app.config['DAILY_DAYS_AHEAD'] = int(os.environ.get('PUZZLE_DAILY_DAYS_AHEAD', 2))
+app.config['DAILY_FILL_INTERVAL'] = float(os.environ.get('PUZZLE_DAILY_FILL_INTERVAL', 3600))
+# Largest photo upload accepted by /api/photo-puzzle; it is downsized before reaching the vision model
+app.config['MAX_PHOTO_UPLOAD_BYTES'] = int(os.environ.get('PUZZLE_MAX_PHOTO_UPLOAD_BYTES', 15 * 1024 * 1024))
+
+# Fraction of requests (and coalesced generations) run under cProfile; 0 disables profiling. It can
+# also be changed at runtime through POST /admin/profiling
+app.config['PROFILE_SAMPLE_RATE'] = float(os.environ.get('PUZZLE_PROFILE_SAMPLE_RATE', 0))
+# Bearer token for the /admin/ endpoints; they answer 404 while it is unset
+app.config['ADMIN_TOKEN'] = os.environ.get('PUZZLE_ADMIN_TOKEN', '')
+
+def request_deadline(endpoint_name):
+    """Starts the deadline budget configured for the given view function."""
+    return Deadline(app.config['REQUEST_DEADLINES'][endpoint_name])
+
+# Production mode (see wsgi.py): state that must be global across worker processes lives in this SQLite file
+app.config['SHARED_STATE_DB'] = os.environ.get('PUZZLE_SHARED_STATE_DB')
+# How long one worker's Ollama model probe is reused by the others (seconds)
+app.config['MODEL_LIST_MAX_AGE'] = 600
+# How long the other workers wait for the probing worker's result before probing themselves (seconds)
+app.config['MODEL_PROBE_WAIT'] = 30
+
+shared_state = SharedStateStore(app.config['SHARED_STATE_DB']) if app.config['SHARED_STATE_DB'] else None
+# A rate set through the admin endpoint reaches every worker through the shared store
+request_profiler = RequestProfiler(app.config['PROFILE_SAMPLE_RATE'], settings=shared_state)
+
+def probe_models_once(connector):
+    """Fetches Ollama's model list. With a shared store, only the first worker to start actually probes."""
+    if shared_state is None:
+        return connector.refresh_models()
+    max_age = app.config['MODEL_LIST_MAX_AGE']
+    models = shared_state.get_value('ollama_models', max_age=max_age)
+    if models is None:
+        # One worker claims the probe and runs it outside any write transaction (a slow Ollama would
+        # otherwise block every writer of the store); concurrently starting workers poll for its result
+        if shared_state.claim_idempotency_key('ollama-models-probe', app.config['MODEL_PROBE_WAIT']):
+            try:
+                # Re-read: a worker that just finished probing has released the claim
+                models = shared_state.get_value('ollama_models', max_age=max_age)
+                if models is None:
+                    models = connector.refresh_models()
+                    shared_state.set_value('ollama_models', models)
+            finally:
+                shared_state.release_idempotency_key('ollama-models-probe')
+        else:
+            give_up_at = time.monotonic() + app.config['MODEL_PROBE_WAIT']
+            while models is None and time.monotonic() < give_up_at:
+                time.sleep(0.25)
+                models = shared_state.get_value('ollama_models', max_age=max_age)
+            if models is None:
+                # The probing worker died or is stuck; probe for this worker only
+                models = connector.refresh_models()
+    connector.available_models = models
+    return models
+
 try:
     # Initialize with the model you confirmed is available
-    puzzle_gen_instance = PuzzleGenerator(model_name="gemma3:27b") #
-    print("PuzzleGenerator instance created.") #
+    puzzle_gen_instance = PuzzleGenerator(model_name="gemma3:27b", shared_state=shared_state, probe_models=False) #
+    logger.info("PuzzleGenerator instance created.")
     # Initial check to see if Ollama is responsive through the connector
     if hasattr(puzzle_gen_instance, 'connector') and puzzle_gen_instance.connector: #
-        models = puzzle_gen_instance.connector.refresh_models() # Refresh models on startup #
+        models = probe_models_once(puzzle_gen_instance.connector) # Refresh models on startup #
         if models and puzzle_gen_instance.model_name in models: #
-            print(f"Confirmed model '{puzzle_gen_instance.model_name}' is available in Ollama: {models}") #
+            logger.info("Confirmed model is available in Ollama", extra=fields(model=puzzle_gen_instance.model_name, models=models))
         elif models: #
-            print(f"Warning: Model '{puzzle_gen_instance.model_name}' not in Ollama models: {models}. Puzzle generation may fail.") #
+            logger.warning(f"Model '{puzzle_gen_instance.model_name}' not in Ollama models. Puzzle generation may fail.", extra=fields(models=models))
         else:
-            print("Warning: Could not fetch model list from Ollama. Ensure Ollama is running.") #
+            logger.warning("Could not fetch model list from Ollama. Ensure Ollama is running.")
 except Exception as e:
-    print(f"CRITICAL: Failed to initialize PuzzleGenerator: {e}") #
+    logger.critical(f"Failed to initialize PuzzleGenerator: {e}")
     puzzle_gen_instance = None #
 
+generation_coalescer = None
+if puzzle_gen_instance:
+    generation_coalescer = GenerationCoalescer(
+        # Generations run on the coalescer's threads, so they are sampled on their own ("generation")
+        request_profiler.wrap("generation", puzzle_gen_instance.generate_parsed_puzzle_details),
+        max_in_flight=app.config['MAX_CONCURRENT_GENERATIONS'],
+        generation_budget=app.config['REQUEST_DEADLINES']['generate_puzzle_api'],
+        pool=shared_state, # None -> per-process pool
+        max_waiting=app.config['MAX_WAITING_GENERATIONS'],
+    )
+
+rate_limiter = ClientRateLimiter(app.config['RATE_LIMIT_PER_MINUTE'], app.config['RATE_LIMIT_BURST'],
+                                 buckets=shared_state) # None -> per-process buckets
+photo_gate = ConcurrencyGate(app.config['MAX_CONCURRENT_PHOTO_PUZZLES'], app.config['MAX_WAITING_PHOTO_PUZZLES'])
+
+# Served puzzles get content-hash IDs so share card URLs work from any worker process
+puzzle_registry = PuzzleRegistry(store=shared_state)
+card_renderer = CardRenderer(GlyphAtlas(os.environ.get('PUZZLE_EMOJI_FONT'))) # Default: AssetManager's Noto Color Emoji
+daily_schedule = None
+if puzzle_gen_instance:
+    daily_schedule = DailyPuzzleSchedule(
+        puzzle_gen_instance,
+        claims=shared_state, # Only one worker process generates each day
+        shared_state=shared_state, # Serializes schedule rewrites across workers
+        registry=puzzle_registry,
+        days_ahead=app.config['DAILY_DAYS_AHEAD'],
+        generation_budget=app.config['REQUEST_DEADLINES']['generate_puzzle_api'],
+    )
+
+def start_background_work():
+    """Starts the daily puzzle fill thread. Called by the server entry points (wsgi.py, the development
+    server below), not on import, so tools and tests can import the app without model work starting."""
+    if daily_schedule and app.config['DAILY_FILL_INTERVAL'] > 0:
+        daily_schedule.start_background_fill(app.config['DAILY_FILL_INTERVAL'])
+
+puzzle_pack_builder = PuzzlePackBuilder(puzzle_gen_instance.csv_log_file_path, registry=puzzle_registry) if puzzle_gen_instance else None
+# Idempotency keys are shared by all workers in production mode, else kept in a per-process LRU
+result_ingestor = ResultIngestor(puzzle_gen_instance, keys=shared_state) if puzzle_gen_instance else None
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Every log line and trace span emitted while handling this request carries its ID
+    g.request_id = request.headers.get('X-Request-ID') or new_request_id()
+    g.request_id_token = request_id_var.set(g.request_id)
+    if not request.path.startswith('/admin/'):
+        g.profile = request_profiler.start() # None unless this request is sampled
+
+@app.teardown_request
+def clear_request_id(exc):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        request_profiler.stop(profile, request.url_rule.rule if request.url_rule else 'unmatched')
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        request_id_var.reset(token)
+
+@app.after_request
+def record_request_latency(response):
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    # Only API calls are timed; static files and the page itself would drown out the interesting series
+    if request.path.startswith('/api/') and 'request_started' in g:
+        HTTP_REQUEST_SECONDS.labels(endpoint=request.endpoint or 'unknown', status=response.status_code).observe(
+            time.perf_counter() - g.request_started)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint for the generation pipeline metrics."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/generate-puzzle', methods=['GET']) #
 def generate_puzzle_api():
-    print("API: Received request for a new puzzle at /api/generate-puzzle") #
+    logger.debug("API: Received request for a new puzzle at /api/generate-puzzle")
     if not puzzle_gen_instance: #
-        print("API Error: PuzzleGenerator instance is not available.") #
+        logger.error("API Error: PuzzleGenerator instance is not available.")
         return jsonify({'error': 'Puzzle generator not initialized or failed to initialize.'}), 500 #
+    limited = rate_limit_response('generate_puzzle_api')
+    if limited:
+        return limited
 
     try:
         # Use the new method that returns a dictionary of details
-        puzzle_details = puzzle_gen_instance.generate_parsed_puzzle_details() #
+        # Concurrent requests share a bounded set of in-flight generations, each getting its own puzzle
+        deadline = request_deadline('generate_puzzle_api')
+        puzzle_details = generation_coalescer.get(deadline) #
 
         if puzzle_details and isinstance(puzzle_details, dict) and 'emojis_list' in puzzle_details: #
-            print(f"API: Successfully generated puzzle details: {puzzle_details}") #
+            puzzle_registry.register(puzzle_details)
+            logger.info("API: Served puzzle", extra=fields(category=puzzle_details.get('category'), phrase=puzzle_details.get('phrase')))
+            logger.debug("API: Puzzle details", extra=fields(puzzle=puzzle_details))
             # Send the whole dictionary to the frontend
             return jsonify(puzzle_details) #
         else:
             error_message = "API Error: Failed to generate valid puzzle details from PuzzleGenerator." #
             if puzzle_details and 'error' in puzzle_details: # If generator itself returned an error structure #
                  error_message = puzzle_details['error'] #
-            print(error_message) #
-            return jsonify({'error': error_message}), 500 #
+            return generation_failure_response(error_message, deadline)
+    except Overloaded as e:
+        return overloaded_response('generate_puzzle_api', e)
     except Exception as e:
         # Catch any unexpected errors during the puzzle generation call
-        print(f"API Exception: An unexpected error occurred during puzzle generation: {e}") #
+        logger.exception(f"API Exception: An unexpected error occurred during puzzle generation: {e}")
         return jsonify({'error': f'An unexpected server error occurred: {str(e)}'}), 500 #
 
+@app.route('/api/puzzles', methods=['GET'])
+def puzzles_api():
+    """Returns up to ?count=N ready puzzles in one response, for the client's prefetch queue.
+
+    Puzzles already waiting in the surplus pool are returned at once; only if there are none does the
+    request wait for one generation. The shortfall is generated in the background for the next call.
+    The client is charged one rate-limit token per puzzle requested.
+    """
+    if not puzzle_gen_instance:
+        logger.error("API Error: PuzzleGenerator instance is not available.")
+        return jsonify({'error': 'Puzzle generator not initialized or failed to initialize.'}), 500
+
+    try:
+        count = int(request.args.get('count', 1))
+    except ValueError:
+        return jsonify({'error': "'count' must be an integer."}), 400
+    # Each puzzle in the batch costs one rate-limit token, as a separate /api/generate-puzzle call would.
+    # A batch larger than the burst could never be paid for, so it is cut down to the burst
+    count = max(1, min(count, app.config['MAX_PUZZLES_PER_REQUEST'], int(app.config['RATE_LIMIT_BURST'])))
+    limited = rate_limit_response('puzzles_api', cost=count)
+    if limited:
+        return limited
+
+    try:
+        deadline = request_deadline('puzzles_api')
+        puzzles = [p for p in generation_coalescer.get_many(count, deadline)
+                   if isinstance(p, dict) and 'emojis_list' in p]
+        if puzzles:
+            for puzzle in puzzles:
+                puzzle_registry.register(puzzle)
+            logger.info("API: Served puzzle batch", extra=fields(requested=count, served=len(puzzles),
+                                                                 phrases=[p.get('phrase') for p in puzzles]))
+            return jsonify({'puzzles': puzzles})
+        return generation_failure_response("API Error: No puzzle became ready for the batch request.", deadline)
+    except Overloaded as e:
+        return overloaded_response('puzzles_api', e)
+    except Exception as e:
+        logger.exception(f"API Exception: An unexpected error occurred during batch puzzle generation: {e}")
+        return jsonify({'error': f'An unexpected server error occurred: {str(e)}'}), 500
+
+@app.route('/api/daily-puzzle', methods=['GET'])
+def daily_puzzle_api():
+    """Today's puzzle, the same for every player. Served from the precomputed schedule, never generated here."""
+    if not daily_schedule:
+        return jsonify({'error': 'Puzzle generator not initialized.'}), 500
+    puzzle = daily_schedule.puzzle_for()
+    if puzzle is None:
+        logger.warning("API: No daily puzzle scheduled for today")
+        return jsonify({'error': "Today's puzzle isn't ready yet. Please try again shortly."}), 503, {'Retry-After': '60'}
+    response = jsonify(puzzle)
+    # Shared caches may hold it until midnight; the date in the ETag makes tomorrow's a different resource
+    response.headers['Cache-Control'] = f'public, max-age={seconds_until_midnight()}'
+    response.set_etag(f"{puzzle['date']}-{puzzle.get('id', '')}")
+    return response.make_conditional(request)
+
+@app.route('/api/photo-puzzle', methods=['POST'])
+def photo_puzzle_api():
+    """Generates a puzzle themed on an uploaded photo (multipart field 'image', or the raw image as the body)."""
+    if not puzzle_gen_instance:
+        logger.error("API Error: PuzzleGenerator instance is not available.")
+        return jsonify({'error': 'Puzzle generator not initialized or failed to initialize.'}), 500
+
+    max_bytes = app.config['MAX_PHOTO_UPLOAD_BYTES']
+    too_large = jsonify({'error': f'Photo is too large; the limit is {max_bytes // (1024 * 1024)} MB.'}), 413
+    # Reject by the declared length before reading the body
+    if request.content_length is not None and request.content_length > max_bytes + 64 * 1024: # + multipart overhead
+        return too_large
+    # A chunked body declares no length: stop reading (multipart parsing included) past the limit
+    request.max_content_length = max_bytes + 64 * 1024
+    try:
+        upload = request.files.get('image')
+        image_data = read_at_most(upload.stream if upload else request.stream, max_bytes + 1)
+    except RequestEntityTooLarge:
+        return too_large
+    if not image_data:
+        return jsonify({'error': "No image received; send it as the 'image' form field."}), 400
+    if len(image_data) > max_bytes:
+        return too_large
+
+    limited = rate_limit_response('photo_puzzle_api', cost=2) # A vision call plus a puzzle generation
+    if limited:
+        return limited
+
+    try:
+        deadline = request_deadline('photo_puzzle_api')
+        photo_gate.acquire(deadline)
+        try:
+            puzzle_details = puzzle_gen_instance.generate_puzzle_from_image(image_data, deadline)
+        finally:
+            photo_gate.release()
+    except Overloaded as e:
+        return overloaded_response('photo_puzzle_api', e)
+    except ImagePreprocessError as e:
+        logger.info(f"API: Rejected photo upload: {e}")
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.exception(f"API Exception: An unexpected error occurred during photo puzzle generation: {e}")
+        return jsonify({'error': f'An unexpected server error occurred: {str(e)}'}), 500
+
+    if puzzle_details and 'emojis_list' in puzzle_details:
+        puzzle_registry.register(puzzle_details)
+        logger.info("API: Served photo puzzle", extra=fields(phrase=puzzle_details.get('phrase')))
+        return jsonify(puzzle_details)
+    return generation_failure_response("API Error: Could not generate a puzzle from the photo.", deadline)
+
+def read_at_most(stream, limit):
+    """Reads a stream until EOF or `limit` bytes, whichever comes first."""
+    chunks, remaining = [], limit
+    while remaining > 0:
+        chunk = stream.read(min(remaining, 64 * 1024))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+def client_id():
+    """Identifies the client for rate limiting."""
+    if app.config['TRUST_PROXY']:
+        forwarded = request.headers.get('X-Forwarded-For', '')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr or 'unknown'
+
+def rate_limit_response(endpoint_name, cost=1):
+    """429 response if the client has used up its allowance for model work, else None."""
+    retry_after = rate_limiter.check(client_id(), cost)
+    if retry_after <= 0:
+        return None
+    ADMISSION_REJECTIONS.labels(endpoint=endpoint_name, reason="rate_limited").inc()
+    logger.info("API: Client over its rate limit", extra=fields(endpoint=endpoint_name, client=client_id(),
+                                                                 retry_after=round(retry_after, 1)))
+    return (jsonify({'error': 'Too many puzzle requests. Please wait a moment and try again.'}), 429,
+            {'Retry-After': str(math.ceil(retry_after))})
+
+def overloaded_response(endpoint_name, error):
+    """503 response for a request refused because too many are already waiting for the model."""
+    ADMISSION_REJECTIONS.labels(endpoint=endpoint_name, reason="overloaded").inc()
+    logger.warning(f"API: Refused request, generation queue full: {error}", extra=fields(endpoint=endpoint_name))
+    return (jsonify({'error': 'The puzzle server is busy. Please try again shortly.'}), 503,
+            {'Retry-After': str(max(1, math.ceil(error.retry_after)))})
+
+def generation_failure_response(error_message, deadline):
+    """Error response for a request that got no puzzle: 503 while the Ollama circuit is open, 504 when
+    the deadline ran out, 500 otherwise."""
+    connector = puzzle_gen_instance.connector
+    if not connector.is_available():
+        # Ollama circuit is open: tell the client when it is worth trying again
+        retry_after = max(1, int(connector.breaker.retry_after()))
+        logger.warning(f"{error_message} (Ollama circuit open, retry after {retry_after}s)")
+        return jsonify({'error': 'The puzzle model is temporarily unavailable. Please try again shortly.'}), 503, {'Retry-After': str(retry_after)}
+    if deadline.expired():
+        logger.warning(f"{error_message} (deadline of {deadline.budget_seconds:.0f}s exhausted)")
+        return jsonify({'error': 'Puzzle generation took too long. Please try again.'}), 504
+    logger.error(error_message)
+    return jsonify({'error': error_message}), 500 #
+
 # --- NEW API ENDPOINT FOR LOGGING PUZZLE RESULTS ---
 @app.route('/api/log-puzzle-result', methods=['POST'])
 def log_puzzle_result_api():
-    print("API: Received request to log puzzle result at /api/log-puzzle-result")
-    if not puzzle_gen_instance:
-        print("API Error: PuzzleGenerator instance is not available for logging.")
+    logger.debug("API: Received request to log puzzle result at /api/log-puzzle-result")
+    if not result_ingestor:
+        logger.error("API Error: PuzzleGenerator instance is not available for logging.")
         return jsonify({'status': 'error', 'message': 'Puzzle generator not initialized.'}), 500
 
     try:
         data = request.get_json()
         if not data:
-            print("API Error: No JSON data received for logging.")
+            logger.warning("API Error: No JSON data received for logging.")
             return jsonify({'status': 'error', 'message': 'No data received.'}), 400
 
-        # Extract data from the frontend payload
-        # Ensure these keys match what your frontend will send
-        category = data.get('category')
-        phrase = data.get('phrase')
-        emojis_list = data.get('emojis_list') # Frontend sends a list of emojis
-        solved_correctly = data.get('solvedCorrectly') # e.g., "yes" or "no"
-        letter_hints_used = data.get('letterHintsUsed') # e.g., 0, 1, 2, 3
-        puzzle_score = data.get('puzzleScore') # Score for this specific puzzle
-        total_score_at_end = data.get('totalScoreAtEnd') # Total score after this puzzle
-
-        # Validate required fields
-        required_fields = {
-            'category': category, 'phrase': phrase, 'emojis_list': emojis_list,
-            'solvedCorrectly': solved_correctly, 'letterHintsUsed': letter_hints_used,
-            'puzzleScore': puzzle_score, 'totalScoreAtEnd': total_score_at_end
-        }
-        missing_fields = [key for key, value in required_fields.items() if value is None]
-        if missing_fields:
-            print(f"API Error: Missing fields in log data: {', '.join(missing_fields)}")
-            return jsonify({'status': 'error', 'message': f'Missing data: {", ".join(missing_fields)}'}), 400
-
-        # Convert emojis_list to emojis_string for the logger
-        emojis_string = " ".join(emojis_list)
-
-        # Call the logging method in PuzzleGenerator
-        puzzle_gen_instance._log_puzzle_to_csv(
-            category=category,
-            phrase=phrase,
-            emojis_string=emojis_string,
-            solved_correctly=str(solved_correctly), # Ensure it's a string for CSV consistency
-            letter_hints_used=int(letter_hints_used), # Ensure it's an int
-            puzzle_score=float(puzzle_score), # Ensure it's a number
-            total_score_at_end=float(total_score_at_end) # Ensure it's a number
-        )
-        
-        print(f"API: Successfully logged puzzle result: Category='{category}', Phrase='{phrase}'")
+        # Same path as the batch endpoint, so an optional idempotencyKey is honoured here too
+        outcome = result_ingestor.ingest([data])
+        if outcome['rejected']:
+            message = outcome['rejected'][0]['message']
+            logger.warning(f"API Error: Invalid log data: {message}")
+            return jsonify({'status': 'error', 'message': message}), 400
+        if outcome['duplicates']:
+            return jsonify({'status': 'success', 'message': 'Puzzle result was already logged.'}), 200
+
+        logger.info("API: Successfully logged puzzle result", extra=fields(category=data.get('category'), phrase=data.get('phrase'), solved=data.get('solvedCorrectly')))
         return jsonify({'status': 'success', 'message': 'Puzzle result logged successfully.'}), 200
 
-    except TypeError as te: # Catch errors if fields are not convertible (e.g. letterHintsUsed to int)
-        print(f"API Error: Type error in data provided for logging: {te}")
-        return jsonify({'status': 'error', 'message': f'Invalid data type provided: {str(te)}'}), 400
     except Exception as e:
-        print(f"API Exception: An unexpected error occurred during logging: {e}")
+        logger.exception(f"API Exception: An unexpected error occurred during logging: {e}")
+        return jsonify({'status': 'error', 'message': f'An unexpected server error occurred during logging: {str(e)}'}), 500
+
+@app.route('/api/log-puzzle-results', methods=['POST'])
+def log_puzzle_results_api():
+    """Batch result ingestion: {"results": [...]} or a bare JSON array, each result carrying a client
+    'idempotencyKey'. Results whose key was already ingested are skipped, so clients can resend freely.
+
+    The body is parsed regardless of Content-Type, because the page's sendBeacon sends it as text/plain.
+    """
+    if not result_ingestor:
+        logger.error("API Error: PuzzleGenerator instance is not available for logging.")
+        return jsonify({'status': 'error', 'message': 'Puzzle generator not initialized.'}), 500
+
+    data = request.get_json(force=True, silent=True)
+    results = data.get('results') if isinstance(data, dict) else data
+    try:
+        outcome = result_ingestor.ingest(results)
+    except ValueError as e:
+        logger.warning(f"API Error: Invalid result batch: {e}")
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    except Exception as e:
+        logger.exception(f"API Exception: An unexpected error occurred during batch logging: {e}")
         return jsonify({'status': 'error', 'message': f'An unexpected server error occurred during logging: {str(e)}'}), 500
+    return jsonify({'status': 'success', **outcome}), 200
 # --- END NEW API ENDPOINT ---
 
 @app.route('/', methods=['GET']) #
 def index():
-    print("Serving index.html") #
-    return render_template('index.html') #
+    logger.debug("Serving index.html")
+    # The page embeds the fingerprinted asset URLs, so revalidate it on every visit (a 304 when unchanged)
+    response = make_response(render_template('index.html', card_layout_version=CARD_LAYOUT_VERSION)) #
+    response.headers['Cache-Control'] = 'no-cache'
+    response.add_etag()
+    return response.make_conditional(request)
+
+@app.route('/assets/<path:filename>')
+def fingerprinted_asset(filename):
+    return static_assets.response(filename, request)
 
 # Route to serve manifest.json for PWA
 @app.route('/manifest.json') #
 def manifest():
     return send_from_directory(app.static_folder, 'manifest.json') #
 
-# Route to serve service worker if you add one later
+@app.route('/api/puzzle-pack', methods=['GET'])
+def puzzle_pack_api():
+    """Offline puzzle pack for the service worker: {'version': ..., 'puzzles': [...]} (?size=N)."""
+    if not puzzle_pack_builder:
+        return jsonify({'error': 'Puzzle generator not initialized.'}), 500
+    try:
+        size = int(request.args.get('size', app.config['PUZZLE_PACK_SIZE']))
+    except ValueError:
+        return jsonify({'error': "'size' must be an integer."}), 400
+    size = max(1, min(size, app.config['MAX_PUZZLE_PACK_SIZE']))
+    pack = puzzle_pack_builder.get_pack(size)
+    response = jsonify(pack)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.set_etag(pack['version'])
+    return response.make_conditional(request)
+
+@app.route('/api/puzzle/<puzzle_id>/card.png', methods=['GET'])
+def puzzle_card(puzzle_id):
+    """Shareable PNG card for a served puzzle (emojis and letter blanks, never the answer)."""
+    puzzle = puzzle_registry.get(puzzle_id)
+    if puzzle is None:
+        return jsonify({'error': 'Unknown puzzle.'}), 404
+    try:
+        png = card_renderer.card_png(puzzle)
+    except Exception as e:
+        logger.exception(f"API Exception: Could not render card for puzzle {puzzle_id}: {e}")
+        return jsonify({'error': 'Could not render the puzzle card.'}), 500
+    response = make_response(png)
+    response.mimetype = 'image/png'
+    # The ID is a content hash, so a card only changes when its layout does. The page links cards with
+    # ?v=<layout version>; only such URLs are immutable, anything else revalidates against the ETag
+    if request.args.get('v') == str(CARD_LAYOUT_VERSION):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    response.set_etag(f"{puzzle_id}-{CARD_LAYOUT_VERSION}")
+    return response.make_conditional(request)
+
+def admin_authorized():
+    """True if the request carries the admin bearer token (never, while PUZZLE_ADMIN_TOKEN is unset)."""
+    token = app.config['ADMIN_TOKEN']
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return bool(token) and hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """Profiling status (GET), or {"sample_rate": 0.05} / {"reset": true} to change it (POST)."""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found.'}), 404
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('reset'):
+            request_profiler.reset()
+        if 'sample_rate' in data:
+            try:
+                request_profiler.set_sample_rate(data['sample_rate'])
+            except (TypeError, ValueError):
+                return jsonify({'error': "'sample_rate' must be a number between 0 and 1."}), 400
+    return jsonify(request_profiler.summary())
+
+@app.route('/admin/profile', methods=['GET'])
+def admin_profile():
+    """A route's aggregated profile (this worker process only): ?route=/api/generate-puzzle, with
+    &sort=tottime&limit=60 for the text report, or &format=pstats for a file pstats/snakeviz can load."""
+    if not admin_authorized():
+        return jsonify({'error': 'Not found.'}), 404
+    route = request.args.get('route', '')
+    if request.args.get('format') == 'pstats':
+        dump = request_profiler.dump(route)
+        if dump is None:
+            return jsonify({'error': 'No samples for this route yet.'}), 404
+        filename = (route.strip('/').replace('/', '_') or 'root') + '.pstats'
+        return Response(dump, mimetype='application/octet-stream',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+    try:
+        report = request_profiler.report(route, request.args.get('sort', 'cumulative'),
+                                         int(request.args.get('limit', 40)))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if report is None:
+        return jsonify({'error': 'No samples for this route yet.'}), 404
+    return Response(report, mimetype='text/plain')
+
+# Service worker: rendered from templates/ so it lists the current fingerprinted app-shell URLs. Any
+# asset change changes the script bytes, which makes browsers install the new worker.
 @app.route('/service-worker.js') #
 def service_worker():
-    return send_from_directory(app.static_folder, 'service-worker.js') #
+    shell_urls = [url_for('index')] + [static_assets.url(filename) for filename in app.config['APP_SHELL_FILES']]
+    cache_version = hashlib.sha256("\n".join(shell_urls).encode('utf-8')).hexdigest()[:12]
+    response = make_response(render_template('service-worker.js', shell_urls=shell_urls, cache_version=cache_version))
+    response.mimetype = 'application/javascript'
+    response.headers['Cache-Control'] = 'no-cache' # Browsers must always see the newest worker
+    return response
 
 if __name__ == '__main__': #
-    print("Starting Flask development server for ConcentrationGameWeb...") #
+    # Development server only; for production use the multi-process WSGI entry point in wsgi.py
+    logger.info("Starting Flask development server for ConcentrationGameWeb...")
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true': # The debug reloader's serving child, not its watcher
+        start_background_work()
     app.run(debug=True, host='0.0.0.0', port=5006) # Using port 5006 #
\ No newline at end of file
@@ -3,6 +3,10 @@
 import os
 from pathlib import Path
 
+from trace_log import configure_logging, get_logger
+
+logger = get_logger("asset_manager")
+
 # Determine the project root directory.
 # This assumes asset_manager.py is in a 'src' subdirectory of the project root.
 PROJECT_ROOT = Path(__file__).resolve().parent.parent
@@ -34,15 +38,16 @@ class AssetManager:
             Path | None: The Path object to the font file if it exists, otherwise None.
         """
         if self.font_path.exists() and self.font_path.is_file():
-            print(f"Font file found: {self.font_path}")
+            logger.info(f"Font file found: {self.font_path}")
             return self.font_path
         else:
-            print(f"Error: Font file not found at {self.font_path}")
-            print(f"Please ensure '{EMOJI_FONT_FILENAME}' is in the '{FONT_DIR}' directory.")
+            logger.warning(f"Error: Font file not found at {self.font_path}")
+            logger.warning(f"Please ensure '{EMOJI_FONT_FILENAME}' is in the '{FONT_DIR}' directory.")
             return None
 
 # --- Main execution for testing ---
 if __name__ == "__main__":
+    configure_logging()
     print("Starting Asset Manager Test...")
     
     # This uses the default path defined in this file.
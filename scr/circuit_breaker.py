@@ -0,0 +1,96 @@
+# src/circuit_breaker.py
+
+import threading
+import time
+
+from trace_log import get_logger
+
+logger = get_logger("circuit_breaker")
+
+
+class CircuitBreaker:
+    """Tracks consecutive failures of a backend and short-circuits calls while it is unhealthy.
+
+    States:
+        closed    - calls flow normally; consecutive failures are counted.
+        open      - calls are rejected immediately until reset_timeout has elapsed.
+        half_open - a single probe call is let through; its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        """
+        Args:
+            failure_threshold (int): Consecutive failures (errors or timeouts) that trip the circuit.
+            reset_timeout (float): Seconds to stay open before letting a half-open probe through.
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow_request(self):
+        """Returns True if a call may proceed. In half-open state only one probe is admitted at a time."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+            # Half-open: admit exactly one probe
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def is_open(self):
+        """Returns True while calls would be rejected, without consuming the half-open probe slot."""
+        with self._lock:
+            if self._state == self.OPEN:
+                return self._clock() - self._opened_at < self.reset_timeout
+            return self._state == self.HALF_OPEN and self._probe_in_flight
+
+    def retry_after(self):
+        """Seconds until the next probe will be admitted (0 if calls are currently allowed)."""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (self._clock() - self._opened_at))
+
+    def release_probe(self):
+        """Frees the half-open probe slot when a call ended without telling us anything about backend health."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit breaker: backend recovered, closing circuit (was {self._state}).")
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit breaker: opening circuit after {self._consecutive_failures} consecutive failure(s).")
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self._probe_in_flight = False
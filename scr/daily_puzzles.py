@@ -0,0 +1,243 @@
+# src/daily_puzzles.py
+
+"""Daily puzzle mode: one puzzle per calendar day, shared by every player.
+
+Daily puzzles are generated ahead of time into a schedule, so serving one costs no model call,
+however many players arrive at once:
+
+- DailyPuzzleSchedule keeps the schedule (date -> puzzle) in memory and persists it to a JSON file.
+  The file is replaced atomically, and every worker process reloads it when it changes. With a
+  shared store, each rewrite (read, add the day, write) holds the store's write lock, so workers
+  saving different days at once don't drop each other's entries.
+- fill() generates the missing days from today up to days_ahead days ahead. Each puzzle passes
+  the normal generation rules, and a phrase is never reused within the schedule. A per-day claim
+  (an idempotency key in the shared store) ensures only one worker process generates each day.
+- The app runs fill() on a background thread at startup and then periodically. It can also be
+  run by hand: python daily_puzzles.py --days 7
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+
+from deadline import Deadline
+from llm_scheduler import BACKGROUND, llm_priority
+from result_ingest import LocalIdempotencyKeys
+from trace_log import configure_logging, get_logger, fields
+
+logger = get_logger("daily_puzzles")
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_SCHEDULE_PATH = os.path.join(PROJECT_ROOT, "daily_puzzles.json")
+
+
+def seconds_until_midnight(now=None):
+    """Seconds left in the current (local) day, i.e. how long today's puzzle stays current."""
+    now = now or datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+class DailyPuzzleSchedule:
+    def __init__(self, generator, schedule_path=None, claims=None, registry=None, days_ahead=3, keep_days=60,
+                 generation_budget=300, max_attempts_per_day=3, shared_state=None):
+        """
+        Args:
+            generator (PuzzleGenerator): Generates and validates the scheduled puzzles.
+            schedule_path (str, optional): JSON schedule file. Defaults to PUZZLE_DAILY_SCHEDULE or
+                daily_puzzles.json in the project root.
+            claims (optional): Anything with claim_idempotency_key/release_idempotency_key (e.g. the
+                SharedStateStore), so only one worker process generates each day. Defaults to in-process.
+            registry (PuzzleRegistry, optional): Served daily puzzles are registered once per process,
+                so they carry an 'id' (e.g. for share cards).
+            days_ahead (int): Days after today that fill() schedules.
+            keep_days (int): Past days kept in the file (older entries are dropped on write).
+            generation_budget (float): Seconds one generate_parsed_puzzle_details call may take.
+            max_attempts_per_day (int): Generations tried before a day is left for the next fill().
+            shared_state (SharedStateStore, optional): Its write lock serializes schedule rewrites from
+                several worker processes. Defaults to None, using an in-process lock only.
+        """
+        self.generator = generator
+        self.schedule_path = schedule_path or os.environ.get("PUZZLE_DAILY_SCHEDULE") or DEFAULT_SCHEDULE_PATH
+        self.claims = claims if claims is not None else LocalIdempotencyKeys()
+        self.registry = registry
+        self.days_ahead = days_ahead
+        self.keep_days = keep_days
+        self.generation_budget = generation_budget
+        self.max_attempts_per_day = max_attempts_per_day
+        self.shared_state = shared_state
+        self._schedule = {} # ISO date -> puzzle details
+        self._served = {} # ISO date -> puzzle as served (with 'date' and 'id'), built once per day
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._fill_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reload()
+
+    # --- Serving ---
+    def puzzle_for(self, day=None):
+        """The scheduled puzzle for `day` (default: today), or None if that day isn't scheduled."""
+        self._reload()
+        key = (day or date.today()).isoformat()
+        with self._lock:
+            served = self._served.get(key)
+            puzzle = self._schedule.get(key)
+        if served is not None or puzzle is None:
+            return served
+        served = dict(puzzle)
+        if self.registry is not None:
+            self.registry.register(served)
+        served['date'] = key
+        with self._lock:
+            self._served[key] = served
+        return served
+
+    def scheduled_days(self):
+        self._reload()
+        with self._lock:
+            return sorted(self._schedule)
+
+    # --- Precomputation ---
+    def fill(self, days_ahead=None, today=None):
+        """Generates puzzles for every unscheduled day from today to today + days_ahead.
+
+        Returns:
+            int: Number of days newly scheduled by this call.
+        """
+        days_ahead = self.days_ahead if days_ahead is None else days_ahead
+        today = today or date.today()
+        added = 0
+        with self._fill_lock:
+            for offset in range(days_ahead + 1):
+                day = (today + timedelta(days=offset)).isoformat()
+                self._reload()
+                with self._lock:
+                    if day in self._schedule:
+                        continue
+                claim_key = f"daily-puzzle:{day}"
+                # Held for the generation budget; if this worker dies, another may take the day after it
+                if not self.claims.claim_idempotency_key(claim_key, self.generation_budget * self.max_attempts_per_day):
+                    continue
+                puzzle = None
+                try:
+                    puzzle = self._generate_unique()
+                    if puzzle is not None:
+                        self._save_day(day, puzzle)
+                        added += 1
+                        logger.info("Scheduled daily puzzle", extra=fields(date=day, phrase=puzzle['phrase']))
+                    else:
+                        logger.warning("Could not generate a daily puzzle", extra=fields(date=day))
+                finally:
+                    if puzzle is None:
+                        self.claims.release_idempotency_key(claim_key)
+        return added
+
+    def _generate_unique(self):
+        with self._lock:
+            used_phrases = {p['phrase'].lower() for p in self._schedule.values()}
+        for _ in range(self.max_attempts_per_day):
+            if self._stop.is_set():
+                return None
+            with llm_priority(BACKGROUND): # Nobody is waiting on it; live requests go first
+                puzzle = self.generator.generate_parsed_puzzle_details(Deadline(self.generation_budget))
+            if puzzle and 'emojis_list' in puzzle and puzzle['phrase'].lower() not in used_phrases:
+                return puzzle
+        return None
+
+    def start_background_fill(self, interval=3600):
+        """Runs fill() now and then every `interval` seconds on a daemon thread."""
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.fill()
+                except Exception as e:
+                    logger.exception(f"Daily puzzle fill failed: {e}")
+                self._stop.wait(interval)
+        thread = threading.Thread(target=run, name="daily-puzzle-fill", daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
+
+    # --- Persistence ---
+    def _reload(self):
+        """Re-reads the schedule file if another process (or a manual run) has rewritten it."""
+        try:
+            mtime = os.path.getmtime(self.schedule_path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        schedule = self._read_file()
+        if schedule is None:
+            return
+        with self._lock:
+            self._schedule = schedule
+            self._served = {}
+            self._mtime = mtime
+
+    def _read_file(self):
+        """The schedule file's contents, or None if it can't be read."""
+        try:
+            with open(self.schedule_path, encoding='utf-8') as schedule_file:
+                return json.load(schedule_file)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read daily puzzle schedule {self.schedule_path}: {e}")
+            return None
+
+    def _save_day(self, day, puzzle):
+        if self.shared_state is not None:
+            with self.shared_state.exclusive():
+                self._rewrite_with(day, puzzle)
+        else:
+            self._rewrite_with(day, puzzle)
+
+    def _rewrite_with(self, day, puzzle):
+        """Adds one day to the schedule file (the caller holds the cross-process lock, if any)."""
+        oldest_kept = (date.today() - timedelta(days=self.keep_days)).isoformat()
+        # Read the file itself, not the mtime-cached copy: another worker may have written it within
+        # the filesystem's mtime resolution
+        current = self._read_file() if os.path.exists(self.schedule_path) else {}
+        with self._lock:
+            if current is None:
+                current = self._schedule # Unreadable file: keep what this process knows
+            schedule = {d: p for d, p in current.items() if d >= oldest_kept}
+            schedule[day] = {key: value for key, value in puzzle.items() if key != 'id'}
+            directory = os.path.dirname(os.path.abspath(self.schedule_path))
+            # Write to a temporary file and rename, so readers never see a half-written schedule
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".daily_puzzles.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+                    json.dump(schedule, tmp_file, ensure_ascii=False, indent=2, sort_keys=True)
+                os.replace(tmp_path, self.schedule_path)
+            except OSError:
+                os.unlink(tmp_path)
+                raise
+            self._schedule = schedule
+            self._served = {}
+            self._mtime = os.path.getmtime(self.schedule_path)
+
+
+# --- Main execution: precompute the schedule by hand ---
+if __name__ == "__main__":
+    from generator import PuzzleGenerator
+
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Generate upcoming daily puzzles into the schedule file")
+    parser.add_argument("--days", type=int, default=7, help="Days after today to schedule")
+    parser.add_argument("--schedule", help="Schedule file (default: PUZZLE_DAILY_SCHEDULE or daily_puzzles.json)")
+    args = parser.parse_args()
+
+    # Alongside running servers, share their store so days and file rewrites don't collide with theirs
+    shared_state = None
+    if os.environ.get('PUZZLE_SHARED_STATE_DB'):
+        from shared_state import SharedStateStore
+        shared_state = SharedStateStore(os.environ['PUZZLE_SHARED_STATE_DB'])
+    schedule = DailyPuzzleSchedule(PuzzleGenerator(), schedule_path=args.schedule, claims=shared_state,
+                                   shared_state=shared_state)
+    added = schedule.fill(days_ahead=args.days)
+    print(f"Scheduled {added} new day(s); schedule now covers: {', '.join(schedule.scheduled_days())}")
@@ -0,0 +1,35 @@
+# src/deadline.py
+
+import time
+
+
+class Deadline:
+    """An end-to-end time budget for one request, shared by every model call made on its behalf."""
+
+    def __init__(self, budget_seconds, clock=time.monotonic):
+        """
+        Args:
+            budget_seconds (float): Total seconds the request may spend from now.
+            clock (callable, optional): Monotonic time source. Defaults to time.monotonic.
+        """
+        self.budget_seconds = budget_seconds
+        self._clock = clock
+        self.expires_at = clock() + budget_seconds
+
+    def remaining(self):
+        """Seconds left in the budget (never negative)."""
+        return max(0.0, self.expires_at - self._clock())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+    def has_time_for(self, seconds):
+        """Returns True if at least `seconds` of budget remain."""
+        return self.remaining() >= seconds
+
+    def cap_timeout(self, timeout):
+        """Shrinks a per-call timeout so the call cannot outlive the budget."""
+        return min(timeout, self.remaining())
+
+    def __repr__(self):
+        return f"Deadline(remaining={self.remaining():.1f}s of {self.budget_seconds:.1f}s)"
@@ -0,0 +1,116 @@
+# src/emoji_tokenizer.py
+
+"""Splits a model's 'emojis' string into one item per displayed emoji.
+
+Splitting on spaces breaks when the model leaves the spaces out ("🍬🦷😈🤤"). Splitting per code
+point is also wrong, because one displayed emoji can be several code points:
+
+- ZWJ sequences: 👨‍👩‍👧 (emojis joined by U+200D)
+- skin-tone modifiers: 👍🏽 (U+1F3FB-U+1F3FF)
+- variation selectors: ❤️ (U+FE0F), and keycaps: 2️⃣ (digit + U+FE0F + U+20E3)
+- flags: 🇯🇵 (two regional indicators), and tag sequences: 🏴󠁧󠁢󠁳󠁣󠁴󠁿 (black flag + tag characters)
+
+The pattern is compiled once at import. A single finditer pass over a 5-emoji string takes a few
+microseconds. Punctuation and separators between emojis ("🍬, 🦷 | 😈 - 🤤") are delimiters and are
+dropped. Any other non-emoji text ("Mother", "7") never comes out as an emoji; split_emoji_text
+returns it on its own list, so validation can reject a puzzle that wrote words instead of emojis.
+
+Usage:
+    split_emojis("🍬🦷 😈🤤")  # ['🍬', '🦷', '😈', '🤤']
+    split_emoji_text("🍬,🦷 Mother")  # (['🍬', '🦷'], ['Mother'])
+"""
+
+import re
+import unicodedata
+
+# Code points that start an emoji: the supplementary emoji blocks plus the BMP symbols that render
+# as emoji (usually followed by U+FE0F)
+_EMOJI_BASE = (
+    "©®‼⁉™ℹ↔-↙↩↪⌚⌛⌨⏏"
+    "⏩-⏳⏸-⏺Ⓜ▪▫▶◀◻-◾☀-➿"
+    "⤴⤵⬅-⬇⬛⬜⭐⭕〰〽㊗㊙"
+    "\U0001f000-\U0001f1e5\U0001f200-\U0001faff"
+)
+_REGIONAL_INDICATOR = "\U0001f1e6-\U0001f1ff"
+_SKIN_TONE = "\U0001f3fb-\U0001f3ff"
+_TAG = "\U000e0020-\U000e007e"
+_TAG_END = "\U000e007f"
+_VARIATION_SELECTORS = "\ufe0e\ufe0f"
+_ZWJ = "\u200d"
+_KEYCAP = "\u20e3"
+
+# One emoji inside a ZWJ sequence: base, optional presentation selector, skin tone, tags
+_ELEMENT = (
+    f"[{_EMOJI_BASE}][{_VARIATION_SELECTORS}]?[{_SKIN_TONE}]?\ufe0f?"
+    f"(?:[{_TAG}]+{_TAG_END})?"
+)
+_CLUSTER = (
+    f"[{_REGIONAL_INDICATOR}]{{2}}" # flag
+    f"|[0-9#*]\ufe0f?{_KEYCAP}" # keycap
+    f"|{_ELEMENT}(?:{_ZWJ}{_ELEMENT})*" # single emoji or ZWJ sequence
+)
+_EMOJI_CLUSTER = re.compile(_CLUSTER)
+# An emoji cluster, or a run of anything else that isn't whitespace or a stray emoji modifier
+_EMOJI_OR_TEXT = re.compile(
+    f"(?P<emoji>{_CLUSTER})"
+    f"|(?P<text>[^\\s{_EMOJI_BASE}{_REGIONAL_INDICATOR}{_ZWJ}{_VARIATION_SELECTORS}{_KEYCAP}]+)"
+)
+# Unicode categories that separate emojis rather than stand for anything: punctuation (",", "-"),
+# spaces, math symbols ("|", "+", "~") and control/format characters
+_SEPARATOR_CATEGORIES = ("P", "Z", "Sm", "Cc", "Cf")
+
+
+def split_emojis(text):
+    """Splits an emoji string into display clusters, with or without spaces between them.
+
+    Separators, stray joiners and variation selectors are dropped, and so is any other text (see
+    split_emoji_text to get it).
+
+    Args:
+        text (str): The 'emojis' value from the model.
+
+    Returns:
+        list[str]: One item per emoji.
+    """
+    return split_emoji_text(text)[0]
+
+
+def split_emoji_text(text):
+    """Splits an emoji string into its emoji clusters and the non-emoji text between them.
+
+    Args:
+        text (str): The 'emojis' value from the model.
+
+    Returns:
+        tuple[list[str], list[str]]: The emojis, and the words of other text with separators removed
+            (empty for a well-formed emoji string, however it is delimited).
+    """
+    emojis, words = [], []
+    if not text:
+        return emojis, words
+    for match in _EMOJI_OR_TEXT.finditer(text):
+        if match.lastgroup == "emoji":
+            emojis.append(match.group())
+        else:
+            words.extend(_split_words(match.group()))
+    return emojis, words
+
+
+def is_emoji(token):
+    """True if token is exactly one emoji cluster."""
+    return _EMOJI_CLUSTER.fullmatch(token) is not None
+
+
+def _split_words(run):
+    """The words of a non-emoji run, split at (and without) separator characters."""
+    words, current = [], []
+    for char in run:
+        if unicodedata.category(char).startswith(_SEPARATOR_CATEGORIES):
+            if current:
+                words.append("".join(current))
+                current = []
+        else:
+            current.append(char)
+    if current:
+        words.append("".join(current))
+    return words
@@ -0,0 +1,222 @@
+# src/generation_coalescer.py
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from admission import Overloaded
+from deadline import Deadline
+from llm_scheduler import BACKGROUND, INTERACTIVE, PriorityHandle, llm_priority
+from trace_log import get_logger, fields, new_request_id, request_context, request_id_var
+
+logger = get_logger("generation_coalescer")
+
+
+class LocalPuzzlePool:
+    """In-process pool of ready puzzles (SharedStateStore offers the same interface across processes)."""
+
+    def __init__(self):
+        self._puzzles = deque()
+        self._lock = threading.Lock()
+
+    def push_puzzle(self, puzzle, max_size):
+        with self._lock:
+            self._puzzles.append(puzzle)
+            while len(self._puzzles) > max_size:
+                self._puzzles.popleft()
+
+    def pop_puzzle(self):
+        with self._lock:
+            return self._puzzles.popleft() if self._puzzles else None
+
+    def pool_size(self):
+        with self._lock:
+            return len(self._puzzles)
+
+
+class _Waiter:
+    """One request waiting for a puzzle."""
+    __slots__ = ("done", "result", "request_id", "generation_id")
+
+    def __init__(self, request_id):
+        self.done = False
+        self.result = None
+        self.request_id = request_id
+        self.generation_id = None
+
+
+class GenerationCoalescer:
+    """Admission layer that shares a bounded set of in-flight generations among waiting requests.
+
+    Instead of every request running its own LLM pipeline, requests queue up as waiters and at most
+    `max_in_flight` generations run at once (never more than there are waiters). Each finished
+    generation is handed to the oldest waiter, so every request receives a distinct puzzle. Results
+    that finish after their waiter gave up are kept in a small surplus pool for the next request.
+    Batch requests (get_many) can also queue prefill generations that fill that pool ahead of demand.
+    At most `max_waiting` requests may queue; beyond that get() raises Overloaded at once.
+    """
+
+    def __init__(self, generate_fn, max_in_flight=2, generation_budget=120, max_surplus=4, pool=None,
+                 max_waiting=None):
+        """
+        Args:
+            generate_fn (callable): Called as generate_fn(deadline=Deadline) and returns puzzle details or None.
+            max_in_flight (int): Upper bound on concurrent generations against the model backend.
+            generation_budget (float): Deadline in seconds given to each individual generation.
+            max_surplus (int): How many unclaimed results to keep for future requests.
+            pool (optional): Where surplus puzzles are kept; anything with push_puzzle/pop_puzzle/pool_size,
+                e.g. a SharedStateStore so all worker processes share it. Defaults to a LocalPuzzlePool.
+            max_waiting (int, optional): Most requests allowed to wait for a generation. Defaults to
+                unbounded.
+        """
+        self.generate_fn = generate_fn
+        self.max_in_flight = max_in_flight
+        self.generation_budget = generation_budget
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="puzzle-gen")
+        self._cond = threading.Condition()
+        self._waiters = deque()
+        self._in_flight = 0
+        self._running = [] # PriorityHandle of every in-flight generation
+        self._prefill_wanted = 0 # Generations requested for the surplus pool rather than a waiter
+        self.max_surplus = max_surplus
+        self.pool = pool if pool is not None else LocalPuzzlePool()
+        self.max_waiting = max_waiting
+        # Moving average of generation time, used to suggest a Retry-After to refused requests
+        self._avg_generation_seconds = generation_budget / 4
+
+    def stats(self):
+        """Snapshot of the admission queue for diagnostics."""
+        with self._cond:
+            return {
+                'waiting': len(self._waiters),
+                'in_flight': self._in_flight,
+                'surplus': self.pool.pool_size(),
+                'prefill_wanted': self._prefill_wanted,
+            }
+
+    def get(self, deadline):
+        """Blocks until a puzzle is available for this request or its deadline passes.
+
+        Returns:
+            dict | None: Puzzle details, or None if the generation assigned to this request failed
+                or the deadline expired first.
+
+        Raises:
+            Overloaded: If max_waiting requests are already queued (checked after the surplus pool).
+        """
+        pooled = self.pool.pop_puzzle()
+        if pooled is not None:
+            logger.debug("span", extra=fields(stage="await_generation", source="pool", duration_ms=0))
+            return pooled
+        wait_started = time.perf_counter()
+        with self._cond:
+            if self.max_waiting is not None and len(self._waiters) >= self.max_waiting:
+                raise Overloaded("Too many requests are waiting for a puzzle.", self._retry_after())
+            waiter = _Waiter(request_id_var.get())
+            self._waiters.append(waiter)
+            self._start_generations()
+            while not waiter.done:
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    # Give up; whatever was started for us goes to the next waiter or the surplus
+                    self._waiters.remove(waiter)
+                    break
+                self._cond.wait(remaining)
+        # Links this request's trace to the generation's own ID, whose spans were logged on a worker thread
+        logger.debug("span", extra=fields(stage="await_generation", source="generation",
+                                          generation_id=waiter.generation_id, timed_out=not waiter.done,
+                                          duration_ms=round((time.perf_counter() - wait_started) * 1000, 2)))
+        return waiter.result
+
+    def get_many(self, count, deadline):
+        """Returns up to `count` puzzles: whatever the pool holds right now, else waits for one.
+
+        The shortfall is queued as background generations into the surplus pool, so a client that
+        asks again while playing finds its next puzzles ready.
+
+        Returns:
+            list: Between 0 and `count` puzzle details (empty if no puzzle arrived before the deadline).
+        """
+        puzzles = []
+        while len(puzzles) < count:
+            pooled = self.pool.pop_puzzle()
+            if pooled is None:
+                break
+            puzzles.append(pooled)
+        if not puzzles:
+            puzzle = self.get(deadline)
+            if puzzle is not None:
+                puzzles.append(puzzle)
+        self.prefill(count - len(puzzles))
+        return puzzles
+
+    def prefill(self, count):
+        """Asks for up to `count` extra generations into the surplus pool (bounded by max_surplus)."""
+        if count <= 0:
+            return
+        with self._cond:
+            room = self.max_surplus - self.pool.pool_size() - self._prefill_wanted
+            self._prefill_wanted += max(0, min(count, room))
+            self._start_generations()
+
+    def _start_generations(self):
+        """Starts generations until demand or the in-flight cap is met. Caller holds the lock.
+
+        Waiting requests come first: a finished generation goes to the oldest waiter, and prefill
+        generations only use in-flight slots that waiters don't need. Prefill generations make their
+        model calls at BACKGROUND priority, so they yield the backend to interactive calls. A waiter
+        that arrives while prefill generations hold the slots will receive one of their results, so
+        enough of them are promoted to INTERACTIVE that the waiter doesn't queue behind other players.
+        """
+        while self._in_flight < min(self.max_in_flight, len(self._waiters) + self._prefill_wanted):
+            self._in_flight += 1
+            handle = PriorityHandle(INTERACTIVE)
+            if self._in_flight > len(self._waiters):
+                self._prefill_wanted -= 1
+                handle = PriorityHandle(BACKGROUND)
+            self._running.append(handle)
+            self._executor.submit(self._run_generation, handle)
+        interactive = sum(1 for handle in self._running if handle.priority == INTERACTIVE)
+        for handle in self._running:
+            if interactive >= len(self._waiters):
+                break
+            if handle.priority == BACKGROUND:
+                handle.promote()
+                interactive += 1
+
+    def _retry_after(self):
+        """Rough seconds until the queue ahead of a new request has drained. Caller holds the lock."""
+        rounds = len(self._waiters) // max(1, self.max_in_flight) + 1
+        return max(1, round(self._avg_generation_seconds * rounds))
+
+    def _run_generation(self, priority):
+        """Runs one generation; `priority` is its PriorityHandle (promoted if a waiter needs it)."""
+        # Generations aren't owned by one request, so their spans carry a generation ID of their own
+        generation_id = f"gen-{new_request_id()}"
+        with request_context(generation_id), llm_priority(priority):
+            started = time.perf_counter()
+            try:
+                result = self.generate_fn(deadline=Deadline(self.generation_budget))
+            except Exception as e:
+                logger.exception(f"Coalesced puzzle generation raised an exception: {e}")
+                result = None
+
+            handed_to = None
+            with self._cond:
+                self._avg_generation_seconds += 0.2 * (time.perf_counter() - started - self._avg_generation_seconds)
+                self._in_flight -= 1
+                self._running.remove(priority)
+                if self._waiters:
+                    # Failures are handed out too, so a dead backend can't leave requests waiting forever
+                    waiter = self._waiters.popleft()
+                    waiter.result = result
+                    waiter.generation_id = generation_id
+                    waiter.done = True
+                    handed_to = waiter.request_id
+                    result = None
+                self._start_generations()
+                self._cond.notify_all()
+            if result is not None:
+                self.pool.push_puzzle(result, self.max_surplus)
+            logger.debug("Generation finished", extra=fields(handed_to=handed_to, pooled=result is not None))
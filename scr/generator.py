@@ -5,41 +5,83 @@ import json
 import random
 import os
 import csv
+import threading
+import time
 from datetime import datetime
+from image_preprocess import prepare_image
+from json_extraction import JSONExtractionError, extract_json_object
+from model_usage import UsageLog, annotate_usage, collect_usage, count_usage, usage_stage
+from prompt_versions import PromptVersionRegistry
+from puzzle_registry import puzzle_id
+from puzzle_validator import PuzzleValidator
+from trace_log import configure_logging, get_logger, fields, trace_span
+from metrics import (CATEGORY_VARIANT_SECONDS, PUZZLE_ATTEMPTS, PROMPT_VERSION_ATTEMPTS, JSON_PARSE_FAILURES, JSON_REPAIRS,
+                     VALIDATION_REJECTIONS, DUPLICATE_REJECTIONS, RESULT_LOG_WRITE_SECONDS)
+
+logger = get_logger("generator")
+
+PHOTO_DESCRIPTION_PROMPT = (
+    "Describe this photo in 2-3 short sentences: the main subject, what is happening, and the setting. "
+    "Mention any strong mood or theme. Do not speculate about who the people are."
+)
 
 class PuzzleGenerator:
-    def __init__(self, model_name="gemma3:27b"):
+    def __init__(self, model_name="gemma3:27b", shared_state=None, probe_models=True):
+        """
+        Args:
+            model_name (str): Ollama model used for generation.
+            shared_state (SharedStateStore, optional): Cross-process store for recent phrases and the
+                CSV write lock (production server). Defaults to None, keeping that state in memory.
+            probe_models (bool): Query Ollama for its model list on startup. Production workers pass
+                False and rely on the single probe done for the whole server.
+        """
         self.connector = ModelConnector()
         self.model_name = model_name
+        # Vision model that describes uploaded photos for generate_puzzle_from_image
+        self.vision_model_name = os.environ.get("PUZZLE_VISION_MODEL", "llava:latest")
+        self.shared_state = shared_state
+        self.validator = PuzzleValidator()
         
         # --- CSV Logging Setup ---
         # Determine the project root (one directory up from 'src') and set the log file path
         project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
-        self.csv_log_file_path = os.path.join(project_root, "puzzle_log.csv")
+        # PUZZLE_LOG_CSV redirects the log, e.g. so benchmark runs don't mix with real play data
+        self.csv_log_file_path = os.environ.get("PUZZLE_LOG_CSV") or os.path.join(project_root, "puzzle_log.csv")
         # Updated CSV Header
         self.csv_header = [
             "Timestamp", "Category", "Phrase", "Emojis",
-            "SolvedCorrectly", "LetterHintsUsed", "PuzzleScore", "TotalScoreAtEnd"
+            "SolvedCorrectly", "LetterHintsUsed", "PuzzleScore", "TotalScoreAtEnd", "PuzzleId"
         ] 
         
         log_dir = os.path.dirname(self.csv_log_file_path)
         if log_dir and not os.path.exists(log_dir):
             try:
                 os.makedirs(log_dir, exist_ok=True) 
-                print(f"Created log directory: {log_dir}")
+                logger.info(f"Created log directory: {log_dir}")
             except OSError as e:
-                print(f"Warning: Could not create log directory {log_dir}. Error: {e}")
+                logger.warning(f"Warning: Could not create log directory {log_dir}. Error: {e}")
         # --- End CSV Logging Setup ---
 
-        available_models = self.connector.refresh_models()
-        if not available_models:
-            print("Warning: No models reported by Ollama. Puzzle generation might fail.")
-        elif self.model_name not in available_models:
-            print(f"Warning: Model '{self.model_name}' not found in available models: {available_models}.")
-            if available_models:
-                print(f"Please ensure model '{self.model_name}' is available in Ollama, or choose from: {available_models}")
-            else:
-                 print("No models available from Ollama. Cannot proceed with puzzle generation.")
+        # Tokens and model time of every generation, keyed by the same PuzzleId as the result log
+        # (see model_usage). PUZZLE_USAGE_LOG redirects it like PUZZLE_LOG_CSV
+        self.usage_log = UsageLog(os.environ.get("PUZZLE_USAGE_LOG") or os.path.join(project_root, "model_usage.jsonl"),
+                                  shared_state=shared_state)
+
+        # PUZZLE_CAPTURE_RESPONSES appends every raw puzzle response to a JSONL file, e.g. to grow
+        # the corpus used by bench/json_extraction_bench.py
+        self.response_capture_path = os.environ.get("PUZZLE_CAPTURE_RESPONSES")
+        self._capture_lock = threading.Lock()
+
+        if probe_models:
+            available_models = self.connector.refresh_models()
+            if not available_models:
+                logger.warning("Warning: No models reported by Ollama. Puzzle generation might fail.")
+            elif self.model_name not in available_models:
+                logger.warning(f"Warning: Model '{self.model_name}' not found in available models: {available_models}.")
+                if available_models:
+                    logger.warning(f"Please ensure model '{self.model_name}' is available in Ollama, or choose from: {available_models}")
+                else:
+                     logger.warning("No models available from Ollama. Cannot proceed with puzzle generation.")
 
         self.categories = [
             # Original 1
@@ -1023,41 +1065,102 @@ class PuzzleGenerator:
         ]
 
         self.recently_used_phrases = []
+        self._recent_phrases_lock = threading.Lock() # Generations may run concurrently (see GenerationCoalescer)
         self.max_recent_phrases = 15
         self.max_retry_attempts = 3
         self.max_category_variant_attempts = 2 # New: Max attempts for category variant generation
+        # Budget (seconds) a puzzle attempt needs to be worth starting when a request deadline is set
+        self.min_attempt_seconds = 20
+        # Category shown for puzzles made from an uploaded photo
+        self.photo_category = "Inspired by Your Photo"
+
+        # Puzzle prompt versions and their traffic split (see prompt_versions); each generation uses one.
+        # PUZZLE_PROMPT_WEIGHTS overrides the weights, e.g. "v2=9,v3_compact=1"
+        self.prompt_versions = PromptVersionRegistry(os.environ.get("PUZZLE_PROMPT_WEIGHTS"))
+        self.prompt_versions.register("v2", self._create_emoji_puzzle_prompt_v2, weight=1)
+        self.prompt_versions.register("v3_compact", self._create_emoji_puzzle_prompt_compact, weight=0)
+
+        # Source of the category, hint and prompt version picks. PUZZLE_RANDOM_SEED makes them repeatable,
+        # so a run recorded into the response store (see response_store) replays with the same prompts
+        self.rng = random.Random(os.environ.get("PUZZLE_RANDOM_SEED") or None)
+
+    def _get_recent_phrases(self):
+        """Recently served phrases, oldest first; shared by all workers when a shared store is configured."""
+        if self.shared_state is not None:
+            return self.shared_state.recent_phrases()
+        with self._recent_phrases_lock:
+            return list(self.recently_used_phrases)
 
     def _add_to_recent_phrases(self, phrase):
         if not phrase:
             return
-        if phrase in self.recently_used_phrases:
-            self.recently_used_phrases.remove(phrase)
-        self.recently_used_phrases.append(phrase)
-        if len(self.recently_used_phrases) > self.max_recent_phrases:
-            self.recently_used_phrases.pop(0)
+        if self.shared_state is not None:
+            self.shared_state.add_recent_phrase(phrase, self.max_recent_phrases)
+            return
+        with self._recent_phrases_lock:
+            if phrase in self.recently_used_phrases:
+                self.recently_used_phrases.remove(phrase)
+            self.recently_used_phrases.append(phrase)
+            if len(self.recently_used_phrases) > self.max_recent_phrases:
+                self.recently_used_phrases.pop(0)
 
     def _log_puzzle_to_csv(self, category, phrase, emojis_string,
                            solved_correctly, letter_hints_used, 
                            puzzle_score, total_score_at_end):
         """Appends the puzzle generation and play details to a CSV log file."""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        row_to_log = [
+        self._log_puzzle_rows_to_csv([self._result_row(
+            category, phrase, emojis_string, solved_correctly, letter_hints_used,
+            puzzle_score, total_score_at_end)])
+
+    @staticmethod
+    def _result_row(category, phrase, emojis_string, solved_correctly, letter_hints_used,
+                    puzzle_score, total_score_at_end, played_at=None, puzzle_id=""):
+        """One CSV log row. played_at (datetime) defaults to now; puzzle_id joins it to the usage log."""
+        timestamp = (played_at or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        return [
             timestamp, category, phrase, emojis_string,
-            solved_correctly, letter_hints_used, puzzle_score, total_score_at_end
+            solved_correctly, letter_hints_used, puzzle_score, total_score_at_end, puzzle_id
         ]
-        
-        file_exists = os.path.isfile(self.csv_log_file_path)
-        
+
+    def _log_puzzle_rows_to_csv(self, rows_to_log):
+        """Appends several result rows with one file open (and one shared lock acquisition).
+
+        Returns:
+            bool: True if the rows were written.
+        """
+        write_started = time.perf_counter()
         try:
-            with open(self.csv_log_file_path, 'a', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                if not file_exists or os.path.getsize(self.csv_log_file_path) == 0:
-                    writer.writerow(self.csv_header) 
-                writer.writerow(row_to_log)
+            if self.shared_state is not None:
+                # Several worker processes append to the same file; hold the shared write lock
+                with self.shared_state.exclusive():
+                    self._append_csv_rows(rows_to_log)
+            else:
+                self._append_csv_rows(rows_to_log)
+            RESULT_LOG_WRITE_SECONDS.observe(time.perf_counter() - write_started)
+            return True
         except IOError as e:
-            print(f"Error writing to CSV log file {self.csv_log_file_path}: {e}")
+            logger.error(f"Error writing to CSV log file {self.csv_log_file_path}: {e}")
         except Exception as e:
-            print(f"An unexpected error occurred during CSV logging: {e}")
+            logger.exception(f"An unexpected error occurred during CSV logging: {e}")
+        return False
+
+    def _append_csv_rows(self, rows_to_log):
+        file_exists = os.path.isfile(self.csv_log_file_path)
+        with open(self.csv_log_file_path, 'a', newline='', encoding='utf-8') as csvfile:
+            writer = csv.writer(csvfile)
+            if not file_exists or os.path.getsize(self.csv_log_file_path) == 0:
+                writer.writerow(self.csv_header) 
+            writer.writerows(rows_to_log)
+
+    def _capture_response(self, response_text, category):
+        """Appends a raw model response to the capture file (one JSON object per line)."""
+        line = json.dumps({"model": self.model_name, "category": category, "response": response_text},
+                          ensure_ascii=False)
+        try:
+            with self._capture_lock, open(self.response_capture_path, 'a', encoding='utf-8') as capture_file:
+                capture_file.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not capture model response: {e}")
 
     def _create_category_variant_prompt(self, base_category):
         """Creates a prompt to ask the LLM for a creative variant of a base category."""
@@ -1075,29 +1178,44 @@ class PuzzleGenerator:
         )
         return prompt
 
-    def _generate_category_variant(self, base_category):
+    def _generate_category_variant(self, base_category, deadline=None):
         """Attempts to generate a unique variant for the given base category using the LLM."""
-        print(f"Attempting to generate a variant for base category: '{base_category}'")
+        logger.debug(f"Attempting to generate a variant for base category: '{base_category}'")
         for attempt in range(self.max_category_variant_attempts):
+            if not self.connector.is_available():
+                logger.warning("Ollama circuit is open; skipping category variant generation.")
+                break
+            # The variant is optional; only spend budget on it if a puzzle attempt still fits afterwards
+            if deadline and not deadline.has_time_for(2 * self.min_attempt_seconds):
+                logger.info(f"Skipping category variant generation: not enough time left ({deadline}).")
+                break
             prompt_text = self._create_category_variant_prompt(base_category)
-            variant_response = self.connector.enhance_prompt(self.model_name, prompt_text, prompt_type="general")
+            with usage_stage("variant"), trace_span(logger, "variant_llm_call", attempt=attempt + 1):
+                variant_response = self.connector.enhance_prompt(self.model_name, prompt_text, prompt_type="general", deadline=deadline)
 
             if variant_response and not variant_response.startswith("Error:") and not variant_response.startswith("No response from model"):
                 cleaned_variant = variant_response.strip().replace('"', '')
                 # Basic validation: not empty, different from base (case-insensitive), and a reasonable length
                 if cleaned_variant and cleaned_variant.lower() != base_category.lower() and len(cleaned_variant) > 5:
-                    print(f"Successfully generated variant category: '{cleaned_variant}' for base: '{base_category}'")
+                    self.connector.record_response(self.model_name, prompt_text, variant_response)
+                    logger.info(f"Successfully generated variant category: '{cleaned_variant}' for base: '{base_category}'")
                     return cleaned_variant
                 else:
-                    print(f"Variant generation attempt {attempt + 1} for '{base_category}' was invalid, too similar, or too short: '{variant_response}'")
+                    logger.info(f"Variant generation attempt {attempt + 1} for '{base_category}' was invalid, too similar, or too short: '{variant_response}'")
             else:
-                print(f"Failed to get a valid response from LLM for category variant generation (attempt {attempt + 1}): {variant_response}")
+                logger.warning(f"Failed to get a valid response from LLM for category variant generation (attempt {attempt + 1}): {variant_response}")
         
-        print(f"Failed to generate a unique variant for '{base_category}' after {self.max_category_variant_attempts} attempts. Falling back to base category.")
+        logger.warning(f"Failed to generate a unique variant for '{base_category}' after {self.max_category_variant_attempts} attempts. Falling back to base category.")
         return base_category # Fallback to original if all attempts fail
 
-    def _create_emoji_puzzle_prompt_v2(self, category, previous_phrases=None):
-        dynamic_focus_hint = random.choice(self.focus_strings)
+    def _create_emoji_puzzle_prompt_v2(self, category, previous_phrases=None, photo_description=None):
+        dynamic_focus_hint = self.rng.choice(self.focus_strings)
+        if photo_description:
+            # The photo replaces the random focus hint as the puzzle's theme
+            dynamic_focus_hint = (
+                "Base the puzzle on this description of the player's photo. The phrase must be a common "
+                f"saying or concept that clearly fits what the photo shows: {photo_description}"
+            )
         if previous_phrases is None: previous_phrases = []
         avoid_phrases_instruction = ""
         if previous_phrases:
@@ -1152,81 +1270,143 @@ class PuzzleGenerator:
         )
         return prompt
 
-    def _generate_single_puzzle_attempt(self, current_category_for_puzzle):
+    def _create_emoji_puzzle_prompt_compact(self, category, previous_phrases=None, photo_description=None):
+        """A shorter prompt with the same rules and JSON keys as v2, without the worked examples."""
+        if photo_description:
+            theme = f"The phrase must clearly fit this description of the player's photo: {photo_description}\n"
+        else:
+            theme = f"Creative hint: \"{self.rng.choice(self.focus_strings)}\"\n"
+        avoid = f"Do not use any of these recent phrases: {', '.join(previous_phrases)}.\n" if previous_phrases else ""
+        return (
+            f"Create an emoji puzzle from a common English phrase in the category '{category}'.\n"
+            f"{theme}{avoid}"
+            "Rules:\n"
+            "- The phrase is 2 to 4 words, widely known, and an obvious example of the category.\n"
+            "- Use 4 to 5 emojis that clearly show the phrase, literally or as a simple story. Every emoji must be relevant.\n"
+            "- The explanation is 3-5 sentences: what the phrase means, then why each emoji was chosen.\n"
+            "Reply with only a JSON object with these keys:\n"
+            "'phrase' (string), 'words' (list of the phrase's words), "
+            f"'category' (exactly '{category}'), 'emojis' (the emojis as one space-separated string), "
+            "'explanation' (string)."
+        )
+
+    def _generate_single_puzzle_attempt(self, current_category_for_puzzle, deadline=None, photo_description=None,
+                                        prompt_version="v2"):
         # current_category_for_puzzle is the (potentially variant) category to be used for this attempt
-        prompt_text = self._create_emoji_puzzle_prompt_v2(current_category_for_puzzle, self.recently_used_phrases)
-        response_text = self.connector.enhance_prompt(self.model_name, prompt_text, prompt_type="general")
+        with trace_span(logger, "prompt_build", category=current_category_for_puzzle,
+                        prompt_version=prompt_version) as span:
+            prompt_text = self.prompt_versions.build(prompt_version, current_category_for_puzzle,
+                                                     self._get_recent_phrases(), photo_description)
+            span['prompt_chars'] = len(prompt_text)
+        with trace_span(logger, "puzzle_llm_call"):
+            response_text = self.connector.enhance_prompt(self.model_name, prompt_text, prompt_type="general", deadline=deadline)
+        logger.debug("Raw puzzle response", extra=fields(response=response_text))
 
         if response_text and not response_text.startswith("Error:") and not response_text.startswith("No response from model"):
+            if self.response_capture_path:
+                self._capture_response(response_text, current_category_for_puzzle)
             try:
-                cleaned_response = response_text.strip()
-                if cleaned_response.startswith("```json"): cleaned_response = cleaned_response[len("```json"):].strip()
-                elif cleaned_response.startswith("```"): cleaned_response = cleaned_response[len("```"):].strip()
-                if cleaned_response.endswith("```"): cleaned_response = cleaned_response[:-len("```")].strip()
-
-                puzzle_data = json.loads(cleaned_response)
-                # UPDATED: Add 'explanation' to required keys
-                required_keys = ['phrase', 'words', 'category', 'emojis', 'explanation']
-                if not all(key in puzzle_data for key in required_keys):
-                    print(f"Missing one of the required keys: {required_keys}")
-                    return None
-                
-                # Critical: Ensure the category in the output is the one we used for the prompt (the variant)
-                puzzle_data['category'] = current_category_for_puzzle 
-                
-                if not isinstance(puzzle_data['words'], list) or not puzzle_data['words']:
-                    return None
-                if not all(isinstance(word, str) for word in puzzle_data['words']):
-                    return None
-                generated_phrase = puzzle_data.get('phrase')
-                if not generated_phrase:
-                     return None
-                # NEW: Check for explanation
-                explanation = puzzle_data.get('explanation')
-                if not explanation or len(explanation) < 10: # Basic check for empty/too short explanation
-                    return None
+                with trace_span(logger, "parse", response_chars=len(response_text)) as span:
+                    # Finds the object anywhere in the response and repairs common syntax slips
+                    puzzle_data, repairs = extract_json_object(response_text)
+                    span['repairs'] = repairs
+            except JSONExtractionError as e:
+                JSON_PARSE_FAILURES.inc()
+                logger.info(f"JSON Decode Error: {e}", extra=fields(response_head=response_text[:500]))
+                return None
+            for repair in repairs:
+                JSON_REPAIRS.labels(repair=repair).inc()
 
-                emoji_char_list = [emoji for emoji in puzzle_data['emojis'].split(' ') if emoji]
-                if not emoji_char_list:
-                    return None
-                
-                # UPDATED: Add explanation to the returned dictionary
-                parsed_details = {
-                    'phrase': puzzle_data['phrase'], 
-                    'words': puzzle_data['words'],
-                    'category': puzzle_data['category'], 
-                    'emojis_list': emoji_char_list,
-                    'explanation': puzzle_data['explanation']
-                }
+            try:
+                with trace_span(logger, "validation") as span:
+                    parsed_details = self._validate_puzzle_data(puzzle_data, current_category_for_puzzle)
+                    span['passed'] = parsed_details is not None
+                if parsed_details is not None:
+                    self.connector.record_response(self.model_name, prompt_text, response_text)
                 return parsed_details
-            except json.JSONDecodeError as e:
-                print(f"JSON Decode Error: {e}\nCould not parse response: {response_text[:500]}")
-                return None
             except Exception as e:
-                print(f"An unexpected error occurred during puzzle parsing: {e}")
+                logger.exception(f"An unexpected error occurred during puzzle parsing: {e}")
                 return None
         else:
-            print(f"Failed to get a valid response from model: {response_text}")
+            logger.warning(f"Failed to get a valid response from model: {response_text}")
+            return None
+
+    def _validate_puzzle_data(self, puzzle_data, current_category_for_puzzle):
+        """Checks decoded model output against the puzzle rules and returns the puzzle details dict,
+        or None if any rule fails (each failed rule is counted in VALIDATION_REJECTIONS)."""
+        result = self.validator.validate(puzzle_data)
+        if not result.passed:
+            for reason in result.reasons:
+                VALIDATION_REJECTIONS.labels(reason=reason).inc()
+            logger.info("Puzzle rejected by validation",
+                        extra=fields(failures=result.failures, score=round(result.score, 2),
+                                     phrase=puzzle_data.get('phrase')))
             return None
 
-    def generate_parsed_puzzle_details(self):
+        # Critical: Ensure the category in the output is the one we used for the prompt (the variant)
+        puzzle_data['category'] = current_category_for_puzzle
+
+        # UPDATED: Add explanation to the returned dictionary
+        parsed_details = {
+            'phrase': puzzle_data['phrase'], 
+            'words': puzzle_data['words'],
+            'category': puzzle_data['category'], 
+            'emojis_list': result.emojis_list,
+            'explanation': puzzle_data['explanation']
+        }
+        return parsed_details
+
+    def generate_parsed_puzzle_details(self, deadline=None):
+        """Generates one puzzle (category variant + up to max_retry_attempts attempts).
+
+        One prompt version is picked for all attempts and recorded on the puzzle ('prompt_version').
+        The tokens and model time of every call are written to the usage log, per stage.
+
+        Args:
+            deadline (Deadline, optional): End-to-end budget for the whole request. Every model call
+                is capped to the remaining budget and retries are skipped once too little is left.
+        """
+        started = time.perf_counter()
+        with collect_usage() as usage:
+            parsed_details = self._generate_parsed_puzzle_details(deadline)
+        self._log_usage("puzzle", parsed_details, usage, started)
+        return parsed_details
+
+    def _generate_parsed_puzzle_details(self, deadline):
         if not self.model_name and (not self.connector or not self.connector.get_models()):
             return None
         if not self.categories:
             return None
 
-        base_category = random.choice(self.categories)
-        print(f"Selected base category: '{base_category}'")
+        with trace_span(logger, "category_pick") as span:
+            base_category = self.rng.choice(self.categories)
+            span['base_category'] = base_category
+        logger.info(f"Selected base category: '{base_category}'")
 
         # Step 1: Generate a variant of the category
-        current_puzzle_category = self._generate_category_variant(base_category)
+        with CATEGORY_VARIANT_SECONDS.time():
+            current_puzzle_category = self._generate_category_variant(base_category, deadline)
         # current_puzzle_category is now either the variant or the base_category (if fallback)
-        print(f"Using category for puzzle generation: '{current_puzzle_category}'")
+        logger.info(f"Using category for puzzle generation: '{current_puzzle_category}'")
         
+        prompt_version = self.prompt_versions.choose(self.rng)
+        duplicate_details = None # Last parsed puzzle that repeated a recent phrase, served if time runs out
+        attempts_made = 0
         for attempt in range(self.max_retry_attempts):
+            if not self.connector.is_available():
+                # Retrying against an open circuit would only collect more fast "Error:" responses
+                logger.warning("Ollama circuit is open; abandoning remaining puzzle attempts.")
+                break
+            if deadline and attempt > 0 and not deadline.has_time_for(self.min_attempt_seconds):
+                logger.info(f"Skipping remaining puzzle attempts: not enough time left ({deadline}).")
+                break
             
             # Pass the (potentially variant) current_puzzle_category to the attempt method
-            parsed_details = self._generate_single_puzzle_attempt(current_puzzle_category) 
+            attempts_made += 1
+            with usage_stage(f"attempt_{attempts_made}"):
+                parsed_details = self._generate_single_puzzle_attempt(current_puzzle_category, deadline,
+                                                                      prompt_version=prompt_version)
+            self._record_prompt_attempt(prompt_version, parsed_details)
             
             if parsed_details is None:
                 continue
@@ -1234,24 +1414,113 @@ class PuzzleGenerator:
             generated_phrase = parsed_details['phrase']
             
             if parsed_details['category'] != current_puzzle_category:
-                print(f"Warning: Category mismatch after puzzle attempt. Expected '{current_puzzle_category}', got '{parsed_details['category']}'. Overwriting.")
+                logger.warning(f"Warning: Category mismatch after puzzle attempt. Expected '{current_puzzle_category}', got '{parsed_details['category']}'. Overwriting.")
                 parsed_details['category'] = current_puzzle_category
 
 
-            if generated_phrase in self.recently_used_phrases:
+            with trace_span(logger, "dedup", phrase=generated_phrase) as span:
+                is_duplicate = generated_phrase in self._get_recent_phrases()
+                span['duplicate'] = is_duplicate
+            if is_duplicate:
+                DUPLICATE_REJECTIONS.inc()
                 if attempt == self.max_retry_attempts - 1:
                     self._add_to_recent_phrases(generated_phrase)
-                    return parsed_details
+                    return self._record_attempts(attempts_made, parsed_details, prompt_version)
                 else:
+                    duplicate_details = parsed_details
                     continue
             else:
                 self._add_to_recent_phrases(generated_phrase)
-                return parsed_details
+                return self._record_attempts(attempts_made, parsed_details, prompt_version)
         
-        return None
+        if duplicate_details is not None:
+            # Retries were cut short; a repeated phrase beats no puzzle at all
+            self._add_to_recent_phrases(duplicate_details['phrase'])
+            return self._record_attempts(attempts_made, duplicate_details, prompt_version)
+        return self._record_attempts(attempts_made, None, prompt_version)
+
+    def generate_puzzle_from_image(self, image_data, deadline=None):
+        """Generates a puzzle themed on an uploaded photo.
+
+        The photo is downsized once (see image_preprocess), described by the vision model, and
+        the description then replaces the random focus hint in the normal puzzle prompt.
+
+        Args:
+            image_data (bytes): The uploaded image file.
+            deadline (Deadline, optional): Budget shared by the vision call and the puzzle attempts.
+
+        Returns:
+            dict | None: Puzzle details as from generate_parsed_puzzle_details, or None on failure.
+
+        Raises:
+            ImagePreprocessError: If the upload is not a usable image.
+        """
+        started = time.perf_counter()
+        with collect_usage() as usage:
+            parsed_details = self._generate_puzzle_from_image(image_data, deadline)
+        self._log_usage("photo", parsed_details, usage, started)
+        return parsed_details
+
+    def _generate_puzzle_from_image(self, image_data, deadline):
+        with trace_span(logger, "image_preprocess", upload_bytes=len(image_data)) as span:
+            prepared = prepare_image(image_data)
+            span.update(prepared.summary())
+        with usage_stage("analysis"), trace_span(logger, "vision_llm_call", model=self.vision_model_name) as span:
+            description = self.connector.analyze_image(self.vision_model_name, PHOTO_DESCRIPTION_PROMPT, prepared,
+                                                       deadline=deadline, mock_on_failure=False)
+            span['description_chars'] = len(description)
+        if not description or description.startswith("Error:"):
+            logger.warning(f"Photo description failed: {description}")
+            return None
+        description = " ".join(description.split())[:600] # Keep the puzzle prompt bounded
+
+        prompt_version = self.prompt_versions.choose(self.rng)
+        attempts_made = 0
+        for attempt in range(self.max_retry_attempts):
+            if not self.connector.is_available():
+                break
+            if deadline and attempt > 0 and not deadline.has_time_for(self.min_attempt_seconds):
+                break
+            attempts_made += 1
+            with usage_stage(f"attempt_{attempts_made}"):
+                parsed_details = self._generate_single_puzzle_attempt(self.photo_category, deadline, description,
+                                                                      prompt_version)
+            self._record_prompt_attempt(prompt_version, parsed_details)
+            if parsed_details is not None:
+                parsed_details['category'] = self.photo_category
+                self._add_to_recent_phrases(parsed_details['phrase'])
+                return self._record_attempts(attempts_made, parsed_details, prompt_version)
+        return self._record_attempts(attempts_made, None, prompt_version)
+
+    def _log_usage(self, kind, parsed_details, usage, started):
+        """Writes a generation's model usage, keyed by the puzzle's ID (None if generation failed)."""
+        if not usage.calls:
+            return # Nothing reached the model (e.g. circuit open, or a cached image analysis only)
+        self.usage_log.write(kind, puzzle_id(parsed_details) if parsed_details else None, usage,
+                             outcome="ok" if parsed_details else "failed",
+                             category=parsed_details['category'] if parsed_details else None,
+                             duration_ms=round((time.perf_counter() - started) * 1000, 2))
+
+    @staticmethod
+    def _record_prompt_attempt(prompt_version, parsed_details):
+        """Counts one attempt of a prompt version as valid (parsed and passed validation) or invalid."""
+        outcome = "valid" if parsed_details is not None else "invalid"
+        PROMPT_VERSION_ATTEMPTS.labels(prompt_version=prompt_version, outcome=outcome).inc()
+        count_usage("valid_attempts", 1 if parsed_details is not None else 0)
+
+    @staticmethod
+    def _record_attempts(attempts_made, parsed_details, prompt_version):
+        """Records how many attempts a generation took and which prompt version it used, on the
+        puzzle and in its usage record, and passes the result through."""
+        PUZZLE_ATTEMPTS.labels(outcome="ok" if parsed_details else "failed").observe(attempts_made)
+        annotate_usage(prompt_version=prompt_version, attempts=attempts_made)
+        if parsed_details is not None:
+            parsed_details['prompt_version'] = prompt_version
+        return parsed_details
 
 # --- Main execution for testing (optional) ---
 if __name__ == "__main__":
+    configure_logging()
     print("Starting Puzzle Generator Test (CSV Logging now triggered by backend API)...")
     generator = PuzzleGenerator(model_name="gemma3:27b")
 
@@ -0,0 +1,15 @@
+# src/gunicorn.conf.py
+# Production server settings; every value can be overridden from the environment.
+
+import os
+
+bind = os.environ.get('PUZZLE_BIND', '0.0.0.0:5006')
+# Model call slots are per worker: set OLLAMA_MAX_CONCURRENT to OLLAMA_NUM_PARALLEL / workers
+workers = int(os.environ.get('PUZZLE_WORKERS', 4))
+# Threads let a worker keep serving while requests wait on a coalesced generation
+worker_class = 'gthread'
+threads = int(os.environ.get('PUZZLE_THREADS', 8))
+# Must exceed the generation deadline (PUZZLE_DEADLINE_GENERATE_PUZZLE, default 120s)
+timeout = int(os.environ.get('PUZZLE_WORKER_TIMEOUT', 180))
+# Each worker runs app.py startup itself; no forking of a preloaded generator and its threads
+preload_app = False
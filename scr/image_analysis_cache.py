@@ -0,0 +1,166 @@
+# src/image_analysis_cache.py
+
+"""Cache of vision-model answers, matched by perceptual hash instead of exact bytes.
+
+A re-uploaded photo almost never has the same bytes: phones re-encode it, and apps strip metadata
+or crop a few pixels. The cache therefore keys answers by model, prompt and the 64-bit dHash of the
+preprocessed image (see image_preprocess.difference_hash). A lookup also accepts any entry whose
+hash is within max_distance bits (Hamming distance). The scan is a few hundred XOR/popcounts per
+model and prompt, which is negligible next to a vision call.
+
+Entries are kept in an in-memory LRU. With a persist_path they are also written through to a
+small SQLite file, so answers survive restarts and are shared by worker processes. A lookup that
+misses in memory checks the file before reporting a miss.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import IMAGE_CACHE_LOOKUPS
+from trace_log import get_logger, fields
+
+logger = get_logger("image_analysis_cache")
+
+
+class ImageAnalysisCache:
+    def __init__(self, max_entries=2048, max_distance=5, persist_path=None, max_age=30 * 24 * 3600):
+        """
+        Args:
+            max_entries (int): Answers kept in memory (and in the file) before the oldest are evicted.
+            max_distance (int): Largest Hamming distance (of 64 bits) still treated as the same image.
+            persist_path (str | Path, optional): SQLite file for write-through persistence.
+            max_age (float): Seconds a persisted answer is reused.
+        """
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.persist_path = str(persist_path) if persist_path else None
+        self._answers = OrderedDict() # ((model, prompt digest), dhash) -> answer, least recently used first
+        self._hashes = {} # (model, prompt digest) -> set of dhashes, scanned for near matches
+        self._lock = threading.Lock()
+        self._local = threading.local() # sqlite3 connections must not be shared between threads
+        if self.persist_path:
+            self._connection().executescript(
+                """
+                CREATE TABLE IF NOT EXISTS image_analyses (
+                    model TEXT NOT NULL,
+                    prompt TEXT NOT NULL,
+                    dhash INTEGER NOT NULL,
+                    answer TEXT NOT NULL,
+                    saved_at REAL NOT NULL,
+                    PRIMARY KEY (model, prompt, dhash)
+                );
+                CREATE INDEX IF NOT EXISTS image_analyses_saved_at ON image_analyses (saved_at);
+                """
+            )
+            self._warm_from_disk()
+
+    @staticmethod
+    def _prompt_digest(prompt):
+        return hashlib.sha256(prompt.encode('utf-8')).hexdigest()[:16]
+
+    def get(self, model_name, prompt, dhash):
+        """Returns the cached answer for this image (or a near-identical one), or None."""
+        group_key = (model_name, self._prompt_digest(prompt))
+        with self._lock:
+            match = self._nearest(self._hashes.get(group_key), dhash)
+            if match is not None:
+                self._answers.move_to_end((group_key, match[0]))
+                answer = self._answers[(group_key, match[0])]
+        if match is None and self.persist_path:
+            match, answer = self._get_from_disk(group_key, dhash)
+            if match is not None:
+                self._remember(group_key, match[0], answer)
+        if match is None:
+            IMAGE_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        IMAGE_CACHE_LOOKUPS.labels(result="exact" if match[1] == 0 else "near").inc()
+        logger.info("Image analysis served from cache", extra=fields(model=model_name, distance=match[1]))
+        return answer
+
+    def put(self, model_name, prompt, dhash, answer):
+        """Stores a successful analysis."""
+        group_key = (model_name, self._prompt_digest(prompt))
+        saved_at = time.time()
+        self._remember(group_key, dhash, answer)
+        if self.persist_path:
+            try:
+                conn = self._connection()
+                conn.execute("INSERT OR REPLACE INTO image_analyses VALUES (?, ?, ?, ?, ?)",
+                             (group_key[0], group_key[1], self._to_signed(dhash), answer, saved_at))
+                conn.execute("DELETE FROM image_analyses WHERE rowid NOT IN "
+                             "(SELECT rowid FROM image_analyses ORDER BY saved_at DESC LIMIT ?)", (self.max_entries,))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not persist image analysis: {e}")
+
+    def __len__(self):
+        return len(self._answers)
+
+    def _nearest(self, hashes, dhash):
+        """(hash, distance) of the closest of `hashes` within max_distance, or None."""
+        if not hashes:
+            return None
+        if dhash in hashes:
+            return dhash, 0
+        best = None
+        for candidate in hashes:
+            distance = (candidate ^ dhash).bit_count()
+            if distance <= self.max_distance and (best is None or distance < best[1]):
+                best = (candidate, distance)
+        return best
+
+    def _remember(self, group_key, dhash, answer):
+        with self._lock:
+            self._answers[(group_key, dhash)] = answer
+            self._answers.move_to_end((group_key, dhash))
+            self._hashes.setdefault(group_key, set()).add(dhash)
+            while len(self._answers) > self.max_entries:
+                (old_group, old_hash), _ = self._answers.popitem(last=False)
+                self._hashes[old_group].discard(old_hash)
+                if not self._hashes[old_group]:
+                    del self._hashes[old_group]
+
+    # --- SQLite persistence ---
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.persist_path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _to_signed(dhash):
+        """SQLite integers are signed 64-bit."""
+        return dhash - (1 << 64) if dhash >= (1 << 63) else dhash
+
+    @staticmethod
+    def _to_unsigned(value):
+        return value + (1 << 64) if value < 0 else value
+
+    def _get_from_disk(self, group_key, dhash):
+        try:
+            rows = self._connection().execute(
+                "SELECT dhash, answer FROM image_analyses WHERE model = ? AND prompt = ? AND saved_at > ?",
+                (group_key[0], group_key[1], time.time() - self.max_age)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read image analysis cache: {e}")
+            return None, None
+        answers = {self._to_unsigned(value): answer for value, answer in rows}
+        match = self._nearest(answers, dhash)
+        return (match, answers[match[0]]) if match is not None else (None, None)
+
+    def _warm_from_disk(self):
+        try:
+            rows = self._connection().execute(
+                "SELECT model, prompt, dhash, answer, saved_at FROM image_analyses WHERE saved_at > ? "
+                "ORDER BY saved_at DESC LIMIT ?", (time.time() - self.max_age, self.max_entries)).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not load image analysis cache: {e}")
+            return
+        for model, prompt, value, answer, _ in reversed(rows): # Oldest first, so LRU order matches
+            self._remember((model, prompt), self._to_unsigned(value), answer)
+        logger.info("Loaded image analysis cache", extra=fields(entries=len(rows), path=self.persist_path))
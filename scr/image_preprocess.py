@@ -0,0 +1,150 @@
+# src/image_preprocess.py
+
+"""Bounded preprocessing for images sent to the vision model.
+
+Uploaded photos vary from small screenshots to 50-megapixel camera files. The vision model sees
+only a few hundred pixels per side anyway, so each upload is turned into a small JPEG before the
+model call. This keeps the request payload and the model's image-encoding time about the same for
+every upload:
+
+- Dimensions and format come from the file header (Image.open is lazy), so an oversized or
+  malformed upload is rejected before any pixel data is decoded.
+- For JPEGs, draft() lets the decoder scale down by 1/2, 1/4 or 1/8 while decoding, so a large
+  photo is never fully decoded at its original size.
+- The result is re-encoded as a JPEG no larger than max_bytes, and base64-encoded exactly once.
+  Every attempt against the model reuses that string.
+- A 64-bit difference hash (dHash) of the downsized image is computed at the same time, so
+  re-uploads of the same photo can be recognized (see image_analysis_cache).
+"""
+
+import base64
+import io
+import time
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from metrics import IMAGE_PREPROCESS_SECONDS
+from trace_log import get_logger, fields
+
+logger = get_logger("image_preprocess")
+
+# Re-encode quality steps tried, highest first, until the JPEG fits max_bytes
+JPEG_QUALITY_STEPS = (85, 75, 65, 50)
+
+
+class ImagePreprocessError(ValueError):
+    """The upload is not a usable image (unreadable, or outside the size limits)."""
+
+
+class PreparedImage:
+    """A downsized JPEG ready for the vision model, plus what was learned about the original."""
+
+    __slots__ = ('jpeg_bytes', 'base64', 'dhash', 'width', 'height', 'source_format', 'source_width',
+                 'source_height', 'source_bytes')
+
+    def __init__(self, jpeg_bytes, dhash, width, height, source_format, source_width, source_height, source_bytes):
+        self.jpeg_bytes = jpeg_bytes
+        self.dhash = dhash
+        self.base64 = base64.b64encode(jpeg_bytes).decode('ascii')
+        self.width = width
+        self.height = height
+        self.source_format = source_format
+        self.source_width = source_width
+        self.source_height = source_height
+        self.source_bytes = source_bytes
+
+    def summary(self):
+        """Log fields describing the conversion."""
+        return {'source_format': self.source_format, 'source_size': f"{self.source_width}x{self.source_height}",
+                'source_bytes': self.source_bytes, 'size': f"{self.width}x{self.height}",
+                'bytes': len(self.jpeg_bytes)}
+
+
+def prepare_image(image_data, max_edge=1024, max_bytes=400_000, max_source_pixels=60_000_000):
+    """Downsizes and re-encodes an uploaded image for the vision model.
+
+    Args:
+        image_data (bytes): The uploaded file.
+        max_edge (int): Longest side of the prepared image in pixels.
+        max_bytes (int): Largest prepared JPEG; quality and then size are reduced to fit.
+        max_source_pixels (int): Uploads with more pixels are rejected without being decoded.
+
+    Returns:
+        PreparedImage: The bounded JPEG and its base64 encoding.
+
+    Raises:
+        ImagePreprocessError: If the data is not a readable image or is too large.
+    """
+    started = time.perf_counter()
+    try:
+        img = Image.open(io.BytesIO(image_data)) # Reads the header only
+    except Image.DecompressionBombError as e:
+        # PIL's own limit (~179 MP) is checked in open(); it subclasses Exception, not OSError
+        raise ImagePreprocessError(f"Image is too large; at most {max_source_pixels // 1_000_000} megapixels.") from e
+    except (UnidentifiedImageError, OSError) as e:
+        raise ImagePreprocessError("The upload is not a readable image.") from e
+    source_format = img.format or "unknown"
+    source_width, source_height = img.size
+    if source_width * source_height > max_source_pixels:
+        raise ImagePreprocessError(
+            f"Image is too large ({source_width}x{source_height}); at most {max_source_pixels // 1_000_000} megapixels.")
+
+    try:
+        if source_format == "JPEG":
+            # Let the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding (never below max_edge)
+            img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img) # Phone photos store their rotation in EXIF
+        img = _to_rgb(img)
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        jpeg_bytes, img = _encode_within(img, max_bytes)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ImagePreprocessError("The image could not be decoded.") from e
+
+    prepared = PreparedImage(jpeg_bytes, difference_hash(img), img.width, img.height, source_format,
+                             source_width, source_height, len(image_data))
+    elapsed = time.perf_counter() - started
+    IMAGE_PREPROCESS_SECONDS.observe(elapsed)
+    logger.debug("Prepared image for vision model", extra=fields(duration_ms=round(elapsed * 1000, 2),
+                                                                 **prepared.summary()))
+    return prepared
+
+
+def difference_hash(img, hash_size=8):
+    """64-bit dHash: one bit per horizontally adjacent pixel pair of a tiny grayscale copy,
+    set when brightness increases left to right. Re-encoding, resizing and small edits flip
+    only a few bits, so similar images have a small Hamming distance."""
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def _to_rgb(img):
+    """JPEG has no alpha channel: transparent areas are flattened onto white."""
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _encode_within(img, max_bytes):
+    """Encodes img as a JPEG of at most max_bytes, lowering quality first and then halving the size.
+
+    Returns:
+        tuple: (JPEG bytes, the image that was encoded)
+    """
+    while True:
+        for quality in JPEG_QUALITY_STEPS:
+            buffer = io.BytesIO()
+            img.save(buffer, format="JPEG", quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue(), img
+        if min(img.size) <= 64:
+            return buffer.getvalue(), img # Can't usefully shrink further; take the smallest encoding
+        img = img.resize((max(1, img.width // 2), max(1, img.height // 2)), Image.Resampling.LANCZOS)
@@ -0,0 +1,185 @@
+# src/json_extraction.py
+
+"""Tolerant extraction of the JSON object from a model response.
+
+Models wrap the puzzle JSON in prose, code fences or a second example block, and now and then
+emit small syntax defects. extract_json_object() tries the cheap paths first (the whole response,
+then the C decoder at the first '{'); only when both fail does it scan the response for balanced
+top-level objects and repair the defects models commonly produce:
+
+- smart quotes used as JSON string delimiters
+- trailing commas before '}' or ']'
+- missing commas between members (usually a dropped comma at a line break)
+- unescaped double quotes inside strings ("He said "hi" to me")
+- raw newlines/tabs inside strings (accepted by decoding with strict=False)
+
+Usage:
+    puzzle_data, repairs = extract_json_object(response_text)
+"""
+
+import json
+import re
+
+# Smart double quotes are only treated as delimiters outside a string; inside one they are content
+_SMART_OPEN_QUOTES = "\u201c\u201d\u201e\u201f"
+_SMART_CLOSE_QUOTES = "\u201d\u201c"
+# Characters the scanner has to look at; everything else is copied through in one slice
+_SIGNIFICANT = re.compile(r'["\\{}\[\],:\u201c\u201d\u201e\u201f]')
+# Last significant character of a complete value, used to detect a missing comma
+_VALUE_END = re.compile(r'[\]}"\w.+-]')
+# A quote only ends a string if a delimiter or a line break follows it; otherwise it is content
+_STRING_END_FOLLOWS = re.compile(r'[ \t]*(?:[\r\n,:}\]]|\Z)')
+
+_DECODER = json.JSONDecoder(strict=False)
+
+
+class JSONExtractionError(ValueError):
+    """Raised when no JSON object can be recovered from a response."""
+
+
+def extract_json_object(text):
+    """Finds, repairs if needed, and decodes the first JSON object in a model response.
+
+    Args:
+        text (str): Raw model response.
+
+    Returns:
+        tuple: (dict, tuple of repair names applied; empty when the object parsed as-is).
+
+    Raises:
+        JSONExtractionError: If the response contains no decodable JSON object.
+    """
+    if not text:
+        raise JSONExtractionError("Empty response")
+
+    # Fast path: the whole response is the object (the format the prompt asks for)
+    stripped = text.strip()
+    if stripped.startswith("{"):
+        try:
+            value = json.loads(stripped, strict=False)
+            if isinstance(value, dict):
+                return value, ()
+        except ValueError:
+            pass
+
+    # Fast path: a valid object starting at the first brace, with prose or a fence around it
+    first_brace = text.find("{")
+    if first_brace == -1:
+        raise JSONExtractionError("No JSON object in response")
+    try:
+        value, _ = _DECODER.raw_decode(text, first_brace)
+        if isinstance(value, dict):
+            return value, ()
+    except ValueError:
+        pass
+
+    # Slow path: walk every balanced top-level object, repairing as we go
+    start = first_brace
+    last_error = None
+    while start != -1:
+        scanned = _scan_object(text, start)
+        if scanned is None: # Unbalanced to the end of the response (truncated output)
+            break
+        candidate, end, repairs = scanned
+        try:
+            value = json.loads(candidate, strict=False)
+            if isinstance(value, dict):
+                return value, repairs
+        except ValueError as e:
+            last_error = e
+        start = text.find("{", end)
+    raise JSONExtractionError(f"No decodable JSON object in response ({last_error or 'unbalanced braces'})")
+
+
+def _scan_object(text, start):
+    """Copies the balanced object starting at text[start] while repairing delimiter defects.
+
+    Returns:
+        tuple | None: (repaired text, index just past the object, repairs applied), or None if the
+            braces never balance.
+    """
+    out = []
+    repairs = []
+    depth = 0
+    in_string = False
+    closing_quotes = '"'
+    previous = "" # Last significant character outside strings
+    pos = start
+    for match in _SIGNIFICANT.finditer(text, start):
+        index = match.start()
+        if index < pos: # Character consumed by an escape sequence
+            continue
+        char = match.group()
+        gap = text[pos:index]
+        out.append(gap)
+        pos = index + 1
+
+        if in_string:
+            if char == "\\":
+                # Copy the escape and the escaped character verbatim
+                out.append(text[index:index + 2])
+                pos = index + 2
+                continue
+            if char in closing_quotes or char == '"':
+                if not _STRING_END_FOLLOWS.match(text, index + 1):
+                    if char == '"':
+                        _note(repairs, "unescaped_quotes")
+                        char = '\\"'
+                    out.append(char)
+                    continue
+                if char != '"':
+                    _note(repairs, "smart_quotes")
+                out.append('"')
+                in_string = False
+                previous = '"'
+            else:
+                out.append(char)
+            continue
+
+        if gap.strip():
+            previous = gap.strip()[-1]
+
+        if char == '"' or char in _SMART_OPEN_QUOTES:
+            if previous and _VALUE_END.match(previous):
+                _note(repairs, "missing_commas")
+                out.append(",")
+            if char != '"':
+                _note(repairs, "smart_quotes")
+                closing_quotes = _SMART_CLOSE_QUOTES
+            else:
+                closing_quotes = '"'
+            out.append('"')
+            in_string = True
+        elif char in "{[":
+            if previous and _VALUE_END.match(previous) and depth:
+                _note(repairs, "missing_commas")
+                out.append(",")
+            depth += 1
+            out.append(char)
+            previous = char
+        elif char in "}]":
+            if previous == ",":
+                _note(repairs, "trailing_commas")
+                _drop_last_comma(out)
+            depth -= 1
+            out.append(char)
+            previous = char
+            if depth == 0:
+                return "".join(out), pos, tuple(repairs)
+        else: # ',' or ':' (or a stray backslash outside a string)
+            out.append(char)
+            previous = char
+    return None
+
+
+def _note(repairs, name):
+    if name not in repairs:
+        repairs.append(name)
+
+
+def _drop_last_comma(out):
+    """Removes the most recent ',' emitted outside a string (whitespace after it is kept)."""
+    for i in range(len(out) - 1, -1, -1):
+        if out[i] == ",":
+            del out[i]
+            return
@@ -0,0 +1,164 @@
+# src/llm_scheduler.py
+
+"""Priority scheduling of model calls per Ollama backend.
+
+Every ModelConnector call takes a slot from the scheduler of its backend URL before it reaches
+Ollama. Each backend has a fixed number of slots (its efficient parallelism). Waiting calls are
+granted in priority order:
+
+- INTERACTIVE: a player is waiting on the result (/api/generate-puzzle, photo puzzles).
+- BACKGROUND: work nobody is waiting on yet (surplus-pool prefill, the daily puzzle schedule).
+
+Background calls are paused whenever an interactive call is queued: they get no slot while one
+waits, and they never hold more than max_background slots, so an interactive call never queues
+behind a full backend of background work. A call that is already running is not interrupted.
+Multi-call pipelines (category variant, then puzzle attempts) take a slot per call, so background
+pipelines yield between their stages.
+
+The priority of the current thread's calls is set with the llm_priority() context manager (a
+context variable, like the request ID in trace_log). Calls made outside one are INTERACTIVE.
+Work whose priority can rise while it runs (a background generation a player starts waiting on)
+passes a PriorityHandle instead: promote() applies to its next call and to a call already queued.
+
+Schedulers are per process. Under gunicorn every worker has its own slots, so the backend sees up
+to max_concurrent x workers calls at once: size max_concurrent as OLLAMA_NUM_PARALLEL / workers.
+Priority also only holds within a worker; a background call in one worker does not pause for an
+interactive call queued in another.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import LLM_QUEUE_WAIT_SECONDS, LLM_QUEUE_DEPTH, LLM_ACTIVE_CALLS
+from trace_log import get_logger, fields
+
+logger = get_logger("llm_scheduler")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND) # Highest first
+
+llm_priority_var = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class PriorityHandle:
+    """A priority class that can be raised to INTERACTIVE while the work using it runs."""
+    __slots__ = ("priority",)
+
+    def __init__(self, priority=BACKGROUND):
+        self.priority = priority
+
+    def promote(self):
+        self.priority = INTERACTIVE
+
+
+def current_priority(value=None):
+    """The priority class of `value` (a class name or a PriorityHandle), default the current llm_priority()."""
+    value = value if value is not None else llm_priority_var.get()
+    return value.priority if isinstance(value, PriorityHandle) else value
+
+
+@contextmanager
+def llm_priority(priority):
+    """Runs the block's model calls at the given priority class (a class name or a PriorityHandle)."""
+    token = llm_priority_var.set(priority)
+    try:
+        yield
+    finally:
+        llm_priority_var.reset(token)
+
+
+class LLMScheduler:
+    _backends = {}
+    _backends_lock = threading.Lock()
+
+    def __init__(self, max_concurrent=2, max_background=None):
+        """
+        Args:
+            max_concurrent (int): Calls allowed against the backend at once.
+            max_background (int, optional): Slots background calls may hold at once. Defaults to
+                max_concurrent - 1 (at least 1), keeping a slot free for interactive calls.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_background = max_background if max_background is not None else max(1, max_concurrent - 1)
+        self._cond = threading.Condition()
+        self._active = {priority: 0 for priority in PRIORITIES}
+        self._waiting = {priority: 0 for priority in PRIORITIES}
+
+    @classmethod
+    def for_backend(cls, backend_url, max_concurrent=2, max_background=None):
+        """The scheduler shared by every connector of this backend in the process (not across workers)."""
+        with cls._backends_lock:
+            scheduler = cls._backends.get(backend_url)
+            if scheduler is None:
+                scheduler = cls(max_concurrent, max_background)
+                cls._backends[backend_url] = scheduler
+            return scheduler
+
+    def _can_start(self, priority):
+        """Caller holds the lock."""
+        if sum(self._active.values()) >= self.max_concurrent:
+            return False
+        if priority == BACKGROUND:
+            # Paused while players wait, and capped so interactive calls always find a slot soon
+            return self._waiting[INTERACTIVE] == 0 and self._active[BACKGROUND] < self.max_background
+        return True
+
+    @contextmanager
+    def slot(self, deadline=None, priority=None):
+        """Holds a backend slot for the block. Yields False if the deadline passed while queued.
+
+        Args:
+            deadline (Deadline, optional): Give up waiting when it expires.
+            priority (str, optional): INTERACTIVE or BACKGROUND. Defaults to the current llm_priority().
+        """
+        handle = llm_priority_var.get() if priority is None else None
+        handle = handle if isinstance(handle, PriorityHandle) else None
+        priority = current_priority(priority)
+        queued_at = time.perf_counter()
+        granted = False
+        with self._cond:
+            self._waiting[priority] += 1
+            LLM_QUEUE_DEPTH.labels(priority=priority).inc()
+            try:
+                while not self._can_start(priority):
+                    timeout = None if deadline is None else deadline.remaining()
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                    if handle is not None and handle.priority != priority:
+                        # Promoted while queued (someone started waiting on this work): requeue as interactive
+                        self._waiting[priority] -= 1
+                        LLM_QUEUE_DEPTH.labels(priority=priority).dec()
+                        priority = handle.priority
+                        self._waiting[priority] += 1
+                        LLM_QUEUE_DEPTH.labels(priority=priority).inc()
+                else:
+                    granted = True
+                    self._active[priority] += 1
+                    LLM_ACTIVE_CALLS.labels(priority=priority).inc()
+            finally:
+                self._waiting[priority] -= 1
+                LLM_QUEUE_DEPTH.labels(priority=priority).dec()
+                # A background call may have been held back only by this waiter
+                self._cond.notify_all()
+        waited = time.perf_counter() - queued_at
+        LLM_QUEUE_WAIT_SECONDS.labels(priority=priority).observe(waited)
+        if waited > 1:
+            logger.debug("Model call queued for a backend slot", extra=fields(
+                priority=priority, waited_ms=round(waited * 1000, 2), granted=granted))
+        try:
+            yield granted
+        finally:
+            if granted:
+                with self._cond:
+                    self._active[priority] -= 1
+                    LLM_ACTIVE_CALLS.labels(priority=priority).dec()
+                    self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {'active': dict(self._active), 'waiting': dict(self._waiting),
+                    'max_concurrent': self.max_concurrent, 'max_background': self.max_background}
@@ -0,0 +1,312 @@
+# src/metrics.py
+
+"""Minimal in-process metrics with Prometheus text exposition (served at /metrics).
+
+Recording is a dict lookup, a bisect and a few integer updates under a per-series lock, so it is
+cheap enough for the generation hot path. Values are per process: under the multi-process server
+(wsgi.py) each worker keeps its own series, and a scrape is answered by whichever worker receives it.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Default latency buckets (seconds), sized for LLM calls that take from ~1s to minutes
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 90, 120, 180)
+# Buckets for fast local work such as CSV appends
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=None):
+    pairs = list(zip(labelnames, labelvalues))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base for labelled metric families."""
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+            self._children[()] = self._default
+
+    def labels(self, **labelvalues):
+        key = tuple(str(labelvalues[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        for labelvalues, child in sorted(self._children.items()):
+            lines.extend(child.render(self.name, self.labelnames, labelvalues))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def render(self, name, labelnames, labelvalues):
+        return [f"{name}_total{_format_labels(labelnames, labelvalues)} {_format_value(self._value)}"]
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class _GaugeChild:
+    __slots__ = ("_value", "_lock")
+
+    def __init__(self):
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return self._value
+
+    def render(self, name, labelnames, labelvalues):
+        return [f"{name}{_format_labels(labelnames, labelvalues)} {_format_value(self._value)}"]
+
+
+class Gauge(_Metric):
+    metric_type = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value):
+        self._default.set(value)
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+
+class _HistogramChild:
+    __slots__ = ("_buckets", "_counts", "_sum", "_count", "_lock")
+
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * (len(buckets) + 1) # Last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self._buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def time(self):
+        return _Timer(self)
+
+    def render(self, name, labelnames, labelvalues):
+        with self._lock:
+            counts = list(self._counts)
+            total_sum, total_count = self._sum, self._count
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self._buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(labelnames, labelvalues, ("le", _format_value(float(bound))))
+            lines.append(f"{name}_bucket{labels} {cumulative}")
+        labels = _format_labels(labelnames, labelvalues)
+        lines.append(f"{name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{name}_count{labels} {total_count}")
+        return lines
+
+
+class _Timer:
+    """Context manager that observes the elapsed wall time of its block."""
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, labelnames=()):
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# --- Generation pipeline metrics ---
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "puzzle_http_request_seconds", "Latency of API requests by endpoint and status code.",
+    labelnames=("endpoint", "status"))
+MODEL_CALL_SECONDS = REGISTRY.histogram(
+    "puzzle_model_call_seconds", "Latency of individual Ollama calls made by enhance_prompt.",
+    labelnames=("endpoint_style", "outcome"))
+CATEGORY_VARIANT_SECONDS = REGISTRY.histogram(
+    "puzzle_category_variant_seconds", "Time spent generating the category variant for a puzzle.")
+PUZZLE_ATTEMPTS = REGISTRY.histogram(
+    "puzzle_generation_attempts", "Puzzle attempts made per generate_parsed_puzzle_details call.",
+    labelnames=("outcome",), buckets=(1, 2, 3, 4, 5))
+JSON_PARSE_FAILURES = REGISTRY.counter(
+    "puzzle_json_parse_failures", "Model responses that could not be parsed as puzzle JSON.")
+JSON_REPAIRS = REGISTRY.counter(
+    "puzzle_json_repairs", "Model responses that only parsed after a syntax repair, by repair.",
+    labelnames=("repair",))
+VALIDATION_REJECTIONS = REGISTRY.counter(
+    "puzzle_validation_rejections", "Parsed puzzles rejected by validation, by reason.",
+    labelnames=("reason",))
+DUPLICATE_REJECTIONS = REGISTRY.counter(
+    "puzzle_duplicate_rejections", "Generated puzzles rejected because the phrase was used recently.")
+RESULT_LOG_WRITE_SECONDS = REGISTRY.histogram(
+    "puzzle_result_log_write_seconds", "Time to append a puzzle result to the CSV log.",
+    buckets=FAST_BUCKETS)
+
+# --- Share card metrics ---
+CARD_RENDER_SECONDS = REGISTRY.histogram(
+    "puzzle_card_render_seconds", "Time to render a puzzle share card that was not in the card cache.",
+    buckets=FAST_BUCKETS)
+CARD_REQUESTS = REGISTRY.counter(
+    "puzzle_card_requests", "Puzzle share card requests, by whether the PNG came from the card cache.",
+    labelnames=("cache",))
+
+# --- Photo puzzle metrics ---
+IMAGE_PREPROCESS_SECONDS = REGISTRY.histogram(
+    "puzzle_image_preprocess_seconds", "Time to downsize and re-encode an uploaded photo for the vision model.",
+    buckets=FAST_BUCKETS)
+IMAGE_CACHE_LOOKUPS = REGISTRY.counter(
+    "puzzle_image_cache_lookups", "Image analysis cache lookups, by result (exact, near or miss).",
+    labelnames=("result",))
+
+# --- Admission control metrics ---
+ADMISSION_REJECTIONS = REGISTRY.counter(
+    "puzzle_admission_rejections", "Requests refused before any model work, by endpoint and reason.",
+    labelnames=("endpoint", "reason"))
+
+# --- LLM scheduler metrics ---
+LLM_QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    "puzzle_llm_queue_wait_seconds", "Time a model call waited for a backend slot, by priority class.",
+    labelnames=("priority",))
+LLM_QUEUE_DEPTH = REGISTRY.gauge(
+    "puzzle_llm_queue_depth", "Model calls currently waiting for a backend slot, by priority class.",
+    labelnames=("priority",))
+LLM_ACTIVE_CALLS = REGISTRY.gauge(
+    "puzzle_llm_active_calls", "Model calls currently holding a backend slot, by priority class.",
+    labelnames=("priority",))
+
+# --- Model usage metrics ---
+MODEL_TOKENS = REGISTRY.counter(
+    "puzzle_model_tokens", "Tokens reported by Ollama, by pipeline stage and kind (prompt or completion).",
+    labelnames=("stage", "kind"))
+PROMPT_VERSION_ATTEMPTS = REGISTRY.counter(
+    "puzzle_prompt_version_attempts", "Puzzle attempts by prompt version and whether they passed parsing and validation.",
+    labelnames=("prompt_version", "outcome"))
+MODEL_STAGE_SECONDS = REGISTRY.histogram(
+    "puzzle_model_stage_seconds", "Latency of individual model calls, by the pipeline stage they served.",
+    labelnames=("stage",))
+
+# --- Response store metrics ---
+RESPONSE_STORE_LOOKUPS = REGISTRY.counter(
+    "puzzle_response_store_lookups", "Model calls looked up in the record/replay response store, by mode and result.",
+    labelnames=("mode", "result"))
@@ -1,15 +1,55 @@
+import io
+import os
+import time
 import requests
+from PIL import Image
+from circuit_breaker import CircuitBreaker
+from image_analysis_cache import ImageAnalysisCache
+from image_preprocess import ImagePreprocessError, PreparedImage, prepare_image
+from llm_scheduler import LLMScheduler
+from metrics import MODEL_CALL_SECONDS
+from model_usage import record_model_call
+from response_store import ResponseStore
+from trace_log import get_logger, fields
+
+logger = get_logger("model_connector")
+
+# HTTP statuses that mean "this endpoint style isn't served here", as opposed to the backend failing
+UNSUPPORTED_ENDPOINT_STATUSES = (404, 405, 501)
+VISION_SYSTEM_PROMPT = "You are a helpful assistant specializing in image analysis."
 
 class ModelConnector:
-    def __init__(self):
+    def __init__(self, request_timeout=180, connect_timeout=5,
+                 failure_threshold=3, reset_timeout=30.0,
+                 min_call_seconds=2.0, slow_call_threshold=30.0, image_cache=None, response_store=None):
         self.available_models = []
-        self.ollama_endpoint = "http://localhost:11434"
+        # Override with OLLAMA_ENDPOINT, e.g. to point at bench/fake_ollama.py
+        self.ollama_endpoint = os.environ.get("OLLAMA_ENDPOINT", "http://localhost:11434").rstrip("/")
+        self.request_timeout = request_timeout # Seconds to wait for a model response
+        self.connect_timeout = connect_timeout # Seconds to wait for the TCP connection to Ollama
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        # Endpoint style ('chat' or 'generate') that last worked; None until the first successful call
+        self.preferred_endpoint = None
+        # Don't start a call with less budget than this left on the request deadline
+        self.min_call_seconds = min_call_seconds
+        # A deadline-shortened timeout only counts against the breaker if it was at least this long
+        self.slow_call_threshold = slow_call_threshold
+        # Calls to this backend share its slots with every other connector in the process; interactive
+        # calls go first (see llm_scheduler). OLLAMA_MAX_CONCURRENT is per worker process: set it to
+        # Ollama's OLLAMA_NUM_PARALLEL divided by the number of workers
+        self.scheduler = LLMScheduler.for_backend(
+            self.ollama_endpoint, max_concurrent=int(os.environ.get("OLLAMA_MAX_CONCURRENT", 2)))
+        # Vision answers by perceptual hash; PUZZLE_IMAGE_CACHE_DB persists them across restarts and workers
+        self.image_cache = image_cache if image_cache is not None else ImageAnalysisCache(
+            persist_path=os.environ.get("PUZZLE_IMAGE_CACHE_DB"))
+        # Recorded responses (see response_store): PUZZLE_RESPONSE_STORE_MODE=record, replay or reuse
+        self.response_store = response_store if response_store is not None else ResponseStore.from_env()
         
     def refresh_models(self):
         """Get list of all available models from Ollama"""
         try:
             # Try to get models from Ollama
-            response = requests.get(f"{self.ollama_endpoint}/api/tags")
+            response = requests.get(f"{self.ollama_endpoint}/api/tags", timeout=(self.connect_timeout, 10))
             if response.status_code == 200:
                 ollama_models = response.json().get("models", [])
                 
@@ -26,169 +66,325 @@ class ModelConnector:
                     
                 return self.available_models
             else:
-                print(f"Error from Ollama API: {response.status_code}")
+                logger.warning(f"Error from Ollama API: {response.status_code}")
                 return ["llava:latest", "gemma3:27b"]  # Default fallback
         except Exception as e:
-            print(f"Error fetching Ollama models: {str(e)}")
+            logger.warning(f"Error fetching Ollama models: {str(e)}")
             return ["llava:latest", "gemma3:27b"]  # Default fallback
     
     def get_models(self):
         """Return available models"""
         return self.available_models
+
+    def is_available(self):
+        """Returns False while the circuit breaker is failing calls fast."""
+        return not self.breaker.is_open()
+
+    def _endpoint_order(self):
+        """Endpoint styles to try, the one known to work first."""
+        if self.preferred_endpoint == "generate":
+            return ["generate", "chat"]
+        return ["chat", "generate"]
+
+    def _read_timeout(self, deadline):
+        """Per-call read timeout shrunk to the request's remaining budget, or None if it is spent."""
+        if deadline is None:
+            return self.request_timeout
+        if not deadline.has_time_for(self.min_call_seconds):
+            return None
+        return deadline.cap_timeout(self.request_timeout)
+
+    def _post_endpoint(self, endpoint_style, model_name, system_prompt, prompt_text, read_timeout):
+        """Performs one call against /api/chat or /api/generate and returns the raw response."""
+        if endpoint_style == "chat":
+            url = f"{self.ollama_endpoint}/api/chat"
+            payload = {
+                "model": model_name,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt_text}
+                ],
+                "stream": False
+            }
+        else:
+            url = f"{self.ollama_endpoint}/api/generate"
+            payload = {
+                "model": model_name,
+                "prompt": f"{system_prompt}\n\n{prompt_text}",
+                "stream": False
+            }
+        return requests.post(url, json=payload, timeout=(min(self.connect_timeout, read_timeout), read_timeout))
+
+    @staticmethod
+    def _record_call(endpoint_style, model_name, outcome, call_started, response_payload=None):
+        """Records one Ollama call in the latency histogram, in the usage accounting (tokens and
+        model timings from response_payload, see model_usage) and as an "llm_call" trace span."""
+        elapsed = time.perf_counter() - call_started
+        MODEL_CALL_SECONDS.labels(endpoint_style=endpoint_style, outcome=outcome).observe(elapsed)
+        usage = record_model_call(model_name, endpoint_style, outcome, elapsed, response_payload)
+        logger.debug("span", extra=fields(stage="llm_call", endpoint_style=endpoint_style, model=model_name,
+                                          outcome=outcome, duration_ms=usage.wall_ms, usage_stage=usage.stage,
+                                          prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens))
+
+    def _stored_response(self, store_key, model_name):
+        """The recorded response for store_key, accounted as a model call that took no model time."""
+        started = time.perf_counter()
+        stored = self.response_store.get(store_key)
+        if stored is not None:
+            record_model_call(model_name, "store", "stored", time.perf_counter() - started)
+        return stored
+
+    @staticmethod
+    def _system_prompt(prompt_type):
+        if prompt_type == "image":
+            return "You are a helpful assistant specializing in image analysis."
+        return "You are a helpful assistant. Your task is to respond to the user's prompt clearly and concisely."
+
+    @staticmethod
+    def _is_storable(text):
+        return bool(text and text.strip()) and not text.startswith("Error:") and text != "No response from model"
+
+    @staticmethod
+    def _extract_text(endpoint_style, response_payload):
+        if endpoint_style == "chat":
+            return response_payload.get("message", {}).get("content", "No response from model")
+        return response_payload.get("response", "No response from model")
     
-    def enhance_prompt(self, model_name, prompt_text, prompt_type="general"):
+    def enhance_prompt(self, model_name, prompt_text, prompt_type="general", deadline=None):
         """Send prompt to selected model and get response
+
+        Calls go through a circuit breaker: after repeated failures or timeouts the connector
+        returns an "Error:" string immediately instead of waiting on Ollama, until a half-open
+        probe succeeds. The endpoint style that worked last is tried first, and the other style
+        is only tried when the first one reports it is unsupported (or before any style is known).
         
         Args:
             model_name (str): Name of the model to use
             prompt_text (str): The prompt text to enhance
             prompt_type (str, optional): Type of prompt ('image' or 'general'). Defaults to "general".
+            deadline (Deadline, optional): Request budget; the call's timeout is shrunk to what remains.
         """
-        try:
-            # Choose appropriate system prompt based on prompt type
-            if prompt_type == "image":
-                system_prompt = "You are a helpful assistant specializing in image analysis."
-            else:
-                system_prompt = "You are a helpful assistant. Your task is to respond to the user's prompt clearly and concisely."
-            
-            # Try the chat endpoint first
-            try:
-                response = requests.post(
-                    f"{self.ollama_endpoint}/api/chat",
-                    json={
-                        "model": model_name,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": prompt_text}
-                        ],
-                        "stream": False
-                    },
-                    timeout=180  # Add timeout
-                )
-                
-                if response.status_code == 200:
-                    return response.json().get("message", {}).get("content", "No response from model")
-            except Exception as e:
-                print(f"Error with chat endpoint: {str(e)}")
-                # Fall through to generate endpoint
-            
-            # Try the generate endpoint if chat didn't work
+        system_prompt = self._system_prompt(prompt_type)
+
+        if self.response_store is not None:
+            # Only looked up here; the caller records the response once it has accepted it (record_response)
+            stored = self._stored_response(self.response_store.key(model_name, "text", system_prompt, prompt_text),
+                                           model_name)
+            if stored is not None:
+                return stored
+            if self.response_store.replay_only:
+                return "Error: no recorded response for this prompt (response store in replay mode)"
+
+        if self._read_timeout(deadline) is None:
+            return "Error: request deadline exceeded before calling model"
+        if not self.is_available():
+            # Don't queue for a slot only to be failed fast by the open circuit
+            return f"Error: Ollama unavailable (circuit open, next probe in {self.breaker.retry_after():.0f}s)"
+        with self.scheduler.slot(deadline) as granted:
+            if not granted:
+                return "Error: request deadline exceeded while waiting for a model slot"
+            if self._read_timeout(deadline) is None:
+                # The queue wait used up the budget; that says nothing about the backend's health
+                return "Error: request deadline exceeded while waiting for a model slot"
+            return self._call_text_model(model_name, system_prompt, prompt_text, deadline)
+
+    def record_response(self, model_name, prompt_text, response_text, prompt_type="general"):
+        """Stores an enhance_prompt response the caller accepted (no-op without a response store).
+
+        Responses are not stored when they arrive: one that later fails parsing or validation would
+        otherwise be replayed to every retry of the same prompt (the photo flow repeats its prompt).
+        """
+        if self.response_store is None or not self._is_storable(response_text):
+            return
+        store_key = self.response_store.key(model_name, "text", self._system_prompt(prompt_type), prompt_text)
+        self.response_store.put(store_key, model_name, "text", response_text)
+
+    def _call_text_model(self, model_name, system_prompt, prompt_text, deadline):
+        """The breaker-guarded calls behind enhance_prompt (the caller holds a scheduler slot)."""
+        if not self.breaker.allow_request():
+            return f"Error: Ollama unavailable (circuit open, next probe in {self.breaker.retry_after():.0f}s)"
+
+        last_error = "Error: No endpoint attempted"
+        for endpoint_style in self._endpoint_order():
+            read_timeout = self._read_timeout(deadline)
+            if read_timeout is None:
+                # Out of budget (for the first or the other endpoint style): not a backend failure,
+                # and a half-open probe that never reached the backend must not re-open the circuit
+                self.breaker.release_probe()
+                if last_error == "Error: No endpoint attempted":
+                    return "Error: request deadline exceeded before calling model"
+                return f"{last_error}; the request deadline leaves no time for the other endpoint style."
+            call_started = time.perf_counter()
             try:
-                full_prompt = f"{system_prompt}\n\n{prompt_text}"
-                response = requests.post(
-                    f"{self.ollama_endpoint}/api/generate",
-                    json={
-                        "model": model_name,
-                        "prompt": full_prompt,
-                        "stream": False
-                    },
-                    timeout=180  # Add timeout
-                )
-                
-                if response.status_code == 200:
-                    return response.json().get("response", "No response from model")
+                response = self._post_endpoint(endpoint_style, model_name, system_prompt, prompt_text, read_timeout)
+            except requests.exceptions.Timeout as e:
+                self._record_call(endpoint_style, model_name, "timeout", call_started)
+                logger.warning(f"Timeout with {endpoint_style} endpoint after {read_timeout:.1f}s: {str(e)}")
+                if read_timeout >= self.slow_call_threshold:
+                    self.breaker.record_failure()
                 else:
-                    return f"Error: {response.status_code} - {response.text}"
-            except Exception as e:
-                return f"Error calling model with generate endpoint: {str(e)}"
-                
-        except Exception as e:
-            return f"General error calling model: {str(e)}"
+                    # Cut short by the caller's deadline rather than by the backend being stuck
+                    self.breaker.release_probe()
+                return f"Error: calling model with {endpoint_style} endpoint: {str(e)}"
+            except requests.exceptions.RequestException as e:
+                # Connection errors mean the backend itself is unhealthy;
+                # the other endpoint style lives on the same server, so don't wait on it too.
+                self._record_call(endpoint_style, model_name, "error", call_started)
+                logger.warning(f"Error with {endpoint_style} endpoint: {str(e)}")
+                self.breaker.record_failure()
+                return f"Error: calling model with {endpoint_style} endpoint: {str(e)}"
+
+            outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+            if response.status_code == 200:
+                try:
+                    response_payload = response.json()
+                except ValueError as e:
+                    self._record_call(endpoint_style, model_name, outcome, call_started)
+                    self.breaker.record_failure()
+                    return f"Error: invalid JSON from {endpoint_style} endpoint: {str(e)}"
+                self._record_call(endpoint_style, model_name, outcome, call_started, response_payload)
+                text = self._extract_text(endpoint_style, response_payload)
+                self.breaker.record_success()
+                if self.preferred_endpoint != endpoint_style:
+                    logger.info(f"ModelConnector: using '{endpoint_style}' endpoint style from now on.")
+                    self.preferred_endpoint = endpoint_style
+                return text
+
+            self._record_call(endpoint_style, model_name, outcome, call_started)
+            last_error = f"Error: {response.status_code} - {response.text}"
+            logger.warning(f"Error with {endpoint_style} endpoint: {response.status_code}")
+            endpoint_unsupported = response.status_code in UNSUPPORTED_ENDPOINT_STATUSES
+            if not endpoint_unsupported and self.preferred_endpoint is not None:
+                # A known-good endpoint failing is a backend failure, not a reason to switch styles
+                break
+
+        self.breaker.record_failure()
+        return last_error
             
-    def analyze_image(self, model_name, prompt, image_data):
+    def analyze_image(self, model_name, prompt, image_data, deadline=None, mock_on_failure=True):
         """Send an image to the model for analysis using Ollama
-        
+
+        The image is downsized and base64-encoded once (see image_preprocess), and that same
+        encoding is reused if the alternative message format has to be tried.
+
         Args:
             model_name: Name of the model to use (llava is recommended)
             prompt: The analysis prompt text
-            image_data: Raw binary image data
-            
+            image_data: Raw binary image data, or a PreparedImage that was already preprocessed
+            deadline: Optional Deadline; each call's timeout is shrunk to the remaining budget
+            mock_on_failure: Return a placeholder analysis when the call fails (the default), or an
+                "Error:" string so callers can tell a failed analysis from a real one
+
         Returns:
             The model's analysis text response
         """
-        try:
-            # Convert image to base64 encoding
-            import base64
-            encoded_image = base64.b64encode(image_data).decode('utf-8')
-            
-            # Try to determine mime type (for debugging only)
-            import io
-            from PIL import Image
+        def failed(message):
+            logger.warning(message)
+            if mock_on_failure:
+                return self._mock_analyze_image(model_name, prompt, image_data)
+            return f"Error: {message}"
+
+        if isinstance(image_data, PreparedImage):
+            prepared = image_data
+        else:
             try:
-                img = Image.open(io.BytesIO(image_data))
-                format_lower = img.format.lower() if img.format else "jpeg"
-                print(f"Image format detected: {format_lower}")
-            except Exception as e:
-                print(f"Warning: Could not determine image type: {e}")
-            
-            # Create the correct format for Ollama vision models
-            system_prompt = "You are a helpful assistant specializing in image analysis."
-            
-            # Format payload according to Ollama's vision model API
+                prepared = prepare_image(image_data)
+            except ImagePreprocessError as e:
+                return failed(f"Image preprocessing failed: {e}")
+        store_key = None
+        if self.response_store is not None:
+            store_key = self.response_store.key(model_name, "vision", VISION_SYSTEM_PROMPT, prompt, prepared.jpeg_bytes)
+            stored = self._stored_response(store_key, model_name)
+            if stored is not None:
+                return stored
+            if self.response_store.replay_only:
+                return failed("No recorded analysis for this image (response store in replay mode).")
+        # Re-uploads and near-identical images are answered without calling Ollama
+        cached = self.image_cache.get(model_name, prompt, prepared.dhash)
+        if cached is not None:
+            return cached
+        if self._read_timeout(deadline) is None:
+            return failed("Request deadline exceeded, skipping image analysis call.")
+        with self.scheduler.slot(deadline) as granted:
+            if not granted:
+                return failed("Request deadline exceeded while waiting for a model slot.")
+            return self._call_vision_model(model_name, prompt, prepared, deadline, failed, store_key)
+
+    def _call_vision_model(self, model_name, prompt, prepared, deadline, failed, store_key=None):
+        """The breaker-guarded calls behind analyze_image (the caller holds a scheduler slot)."""
+        if not self.breaker.allow_request():
+            return failed("Ollama unavailable (circuit open), skipping image analysis call.")
+
+        system_prompt = VISION_SYSTEM_PROMPT
+        # Ollama's native vision format first, then the OpenAI-style content list some servers expect
+        payload_formats = [
+            ("vision", [{"role": "user", "content": prompt, "images": [prepared.base64]}]),
+            ("vision_alt", [{"role": "user", "content": [
+                {"type": "text", "text": prompt},
+                {"type": "image", "image_url": f"data:image/jpeg;base64,{prepared.base64}"}
+            ]}]),
+        ]
+        logger.info(f"Sending image to model {model_name} for analysis...", extra=fields(**prepared.summary()))
+        last_error = "Image analysis failed: no format attempted"
+        for endpoint_style, messages in payload_formats:
+            read_timeout = self._read_timeout(deadline)
+            if read_timeout is None:
+                self.breaker.release_probe()
+                return failed(f"{last_error}; the request deadline leaves no time for the alternative format.")
             payload = {
                 "model": model_name,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user", 
-                        "content": prompt,
-                        "images": [encoded_image]
-                    }
-                ],
+                "messages": [{"role": "system", "content": system_prompt}] + messages,
                 "stream": False
             }
-            
-            # Make the API call
-            print(f"Sending image to model {model_name} for analysis...")
-            response = requests.post(
-                f"{self.ollama_endpoint}/api/chat",
-                json=payload,
-                timeout=180
-            )
-            
+            call_started = time.perf_counter()
+            try:
+                response = requests.post(
+                    f"{self.ollama_endpoint}/api/chat",
+                    json=payload,
+                    timeout=(min(self.connect_timeout, read_timeout), read_timeout)
+                )
+            except requests.exceptions.Timeout as e:
+                self._record_call(endpoint_style, model_name, "timeout", call_started)
+                if read_timeout >= self.slow_call_threshold:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release_probe() # Cut short by the caller's deadline
+                return failed(f"Timeout analyzing image after {read_timeout:.1f}s: {e}")
+            except requests.exceptions.RequestException as e:
+                # Connection errors aren't about the payload format; don't resend it
+                self._record_call(endpoint_style, model_name, "error", call_started)
+                self.breaker.record_failure()
+                return failed(f"Error analyzing image: {e}")
+
+            outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
             if response.status_code == 200:
-                print("Received successful response from Ollama")
-                result = response.json()
-                return result.get("message", {}).get("content", "")
-            else:
-                error_msg = f"Ollama Error ({response.status_code}): {response.text}"
-                print(error_msg)
-                
-                # Try alternative format as fallback
-                print("Trying alternative format as fallback...")
-                alt_payload = {
-                    "model": model_name,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": [
-                            {"type": "text", "text": prompt},
-                            {"type": "image", "image_url": f"data:image/jpeg;base64,{encoded_image}"}
-                        ]}
-                    ],
-                    "stream": False
-                }
-                
                 try:
-                    response = requests.post(
-                        f"{self.ollama_endpoint}/api/chat",
-                        json=alt_payload,
-                        timeout=180
-                    )
-                    
-                    if response.status_code == 200:
-                        print("Alternative format succeeded")
-                        result = response.json()
-                        return result.get("message", {}).get("content", "")
-                    else:
-                        return f"Image analysis failed with both formats. Error: {response.status_code} - {response.text}"
-                except Exception as e:
-                    print(f"Error with alternative format: {e}")
-                    return self._mock_analyze_image(model_name, prompt, image_data)
-                
-        except Exception as e:
-            print(f"Error analyzing image: {e}")
-            return self._mock_analyze_image(model_name, prompt, image_data)
-    
+                    response_payload = response.json()
+                except ValueError as e:
+                    self._record_call(endpoint_style, model_name, outcome, call_started)
+                    self.breaker.record_failure()
+                    return failed(f"Invalid JSON from image analysis: {e}")
+                self._record_call(endpoint_style, model_name, outcome, call_started, response_payload)
+                text = response_payload.get("message", {}).get("content", "")
+                logger.info("Received successful response from Ollama")
+                self.breaker.record_success()
+                if text.strip():
+                    self.image_cache.put(model_name, prompt, prepared.dhash, text)
+                    if store_key is not None:
+                        self.response_store.put(store_key, model_name, "vision", text)
+                return text
+
+            self._record_call(endpoint_style, model_name, outcome, call_started)
+            last_error = f"Ollama Error ({response.status_code}): {response.text}"
+            logger.warning(last_error)
+            if response.status_code != 400 and response.status_code not in UNSUPPORTED_ENDPOINT_STATUSES:
+                # The server failed, it didn't reject the format: the other format would fail the same way
+                break
+            logger.info("Trying alternative format as fallback...")
+
+        self.breaker.record_failure()
+        return failed(f"Image analysis failed. {last_error}")
+
     def _mock_analyze_image(self, model_name, prompt, image_data):
         """Mock implementation when Ollama is unavailable
         
@@ -200,17 +396,17 @@ class ModelConnector:
         Returns:
             A mock analysis result
         """
-        print(f"Using mock analyze_image with model: {model_name}")
+        logger.warning(f"Using mock analyze_image with model: {model_name}")
         
         try:
-            import io
-            from PIL import Image
-            
-            # Try to extract basic image metadata for more realistic mock response
-            img = Image.open(io.BytesIO(image_data))
-            width, height = img.size
-            format_name = img.format
-            mode = img.mode
+            if isinstance(image_data, PreparedImage):
+                width, height = image_data.source_width, image_data.source_height
+                format_name = image_data.source_format
+            else:
+                # Try to extract basic image metadata for more realistic mock response (header only)
+                img = Image.open(io.BytesIO(image_data))
+                width, height = img.size
+                format_name = img.format
             
             # Mock analysis response
             return (f"Description: This is a {width}x{height} {format_name} image.\n\n"
@@ -224,7 +420,7 @@ class ModelConnector:
                    "or because Ollama is not configured correctly. Try using a model like 'llava:latest'.")
             
         except Exception as e:
-            print(f"Error in mock image analysis: {e}")
+            logger.warning(f"Error in mock image analysis: {e}")
             return ("Description: Unable to analyze this image.\n\n"
                    "Note: This is a placeholder analysis - Ollama couldn't be reached or process the image. "
                    "Try using a model like 'llava:latest' which has vision capabilities.")
@@ -0,0 +1,218 @@
+# src/model_usage.py
+
+"""Token and timing accounting for model calls, attributed to the puzzle and pipeline stage.
+
+Every Ollama response reports what the call cost: prompt_eval_count and eval_count (tokens), and
+total_duration, load_duration, prompt_eval_duration and eval_duration (nanoseconds). ModelConnector
+passes each response to record_model_call(). The call is then:
+
+- attributed to the current stage, set with the usage_stage() context manager ("variant",
+  "attempt_1", "analysis", ...; a context variable, like the priority in llm_scheduler),
+- counted in the MODEL_TOKENS and MODEL_STAGE_SECONDS metrics, and
+- appended to the UsageCollector of the enclosing collect_usage() block, if there is one.
+
+PuzzleGenerator opens one collect_usage() block per generation and writes the collected calls to
+the usage log (UsageLog, one JSON line per generation) keyed by the puzzle's ID. The result log
+carries the same ID, so bench/usage_report.py can join the two into tokens per served puzzle and
+the latency share of each stage.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+from metrics import MODEL_TOKENS, MODEL_STAGE_SECONDS
+from trace_log import get_logger, request_id_var
+
+logger = get_logger("model_usage")
+
+UNATTRIBUTED = "unattributed"
+# Ollama duration fields (nanoseconds) -> milliseconds fields of a ModelCallUsage
+DURATION_FIELDS = (("total_duration", "total_ms"), ("load_duration", "load_ms"),
+                   ("prompt_eval_duration", "prompt_eval_ms"), ("eval_duration", "eval_ms"))
+
+usage_stage_var = ContextVar("usage_stage", default=UNATTRIBUTED)
+_collector_var = ContextVar("usage_collector", default=None)
+
+
+@contextmanager
+def usage_stage(stage):
+    """Attributes the block's model calls to a pipeline stage."""
+    token = usage_stage_var.set(stage)
+    try:
+        yield
+    finally:
+        usage_stage_var.reset(token)
+
+
+class ModelCallUsage:
+    """What one model call cost. Token counts and model-side timings are None when the call failed."""
+
+    __slots__ = ('stage', 'model', 'endpoint_style', 'outcome', 'wall_ms', 'prompt_tokens', 'completion_tokens',
+                 'total_ms', 'load_ms', 'prompt_eval_ms', 'eval_ms')
+
+    def __init__(self, stage, model, endpoint_style, outcome, wall_seconds, response_payload=None):
+        self.stage = stage
+        self.model = model
+        self.endpoint_style = endpoint_style
+        self.outcome = outcome
+        self.wall_ms = round(wall_seconds * 1000, 2)
+        payload = response_payload if isinstance(response_payload, dict) else {}
+        self.prompt_tokens = _int_or_none(payload.get('prompt_eval_count'))
+        self.completion_tokens = _int_or_none(payload.get('eval_count'))
+        for source, target in DURATION_FIELDS:
+            nanoseconds = _int_or_none(payload.get(source))
+            setattr(self, target, None if nanoseconds is None else round(nanoseconds / 1e6, 2))
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def _int_or_none(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class UsageCollector:
+    """The calls made inside one collect_usage() block."""
+
+    def __init__(self):
+        self.calls = []
+        self.annotations = {} # Facts about the generation itself (e.g. prompt version), see annotate_usage
+        self._lock = threading.Lock()
+
+    def add(self, call):
+        with self._lock:
+            self.calls.append(call)
+
+    def annotate(self, **annotations):
+        with self._lock:
+            self.annotations.update(annotations)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self.annotations[name] = self.annotations.get(name, 0) + amount
+
+    def summary(self):
+        """Totals over all calls, and per stage in the order the stages first ran.
+
+        Returns:
+            dict: {'calls', 'prompt_tokens', 'completion_tokens', 'model_ms', 'wall_ms', 'stages': {stage: totals}}
+        """
+        with self._lock:
+            calls = list(self.calls)
+        totals = _empty_totals()
+        stages = {}
+        for call in calls:
+            for bucket in (totals, stages.setdefault(call.stage, _empty_totals())):
+                bucket['calls'] += 1
+                bucket['prompt_tokens'] += call.prompt_tokens or 0
+                bucket['completion_tokens'] += call.completion_tokens or 0
+                bucket['model_ms'] = round(bucket['model_ms'] + (call.total_ms or 0), 2)
+                bucket['wall_ms'] = round(bucket['wall_ms'] + call.wall_ms, 2)
+        totals['stages'] = stages
+        return totals
+
+
+def _empty_totals():
+    return {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0, 'model_ms': 0.0, 'wall_ms': 0.0}
+
+
+@contextmanager
+def collect_usage():
+    """Collects the usage of every model call made inside the block (on this thread or context)."""
+    collector = UsageCollector()
+    token = _collector_var.set(collector)
+    try:
+        yield collector
+    finally:
+        _collector_var.reset(token)
+
+
+def annotate_usage(**annotations):
+    """Attaches fields to the enclosing collect_usage() block's record (no-op outside one)."""
+    collector = _collector_var.get()
+    if collector is not None:
+        collector.annotate(**annotations)
+
+
+def count_usage(name, amount=1):
+    """Adds to a counter field of the enclosing collect_usage() block's record (no-op outside one)."""
+    collector = _collector_var.get()
+    if collector is not None:
+        collector.count(name, amount)
+
+
+def record_model_call(model_name, endpoint_style, outcome, wall_seconds, response_payload=None):
+    """Accounts one model call to the current stage and collector.
+
+    Args:
+        model_name (str): Model the call went to.
+        endpoint_style (str): 'chat', 'generate', 'vision' or 'vision_alt'.
+        outcome (str): 'ok', 'timeout', 'error' or 'http_<status>'.
+        wall_seconds (float): Time from sending the request to having the response.
+        response_payload (dict, optional): The decoded Ollama response, for its token and duration fields.
+
+    Returns:
+        ModelCallUsage: The recorded call.
+    """
+    call = ModelCallUsage(usage_stage_var.get(), model_name, endpoint_style, outcome, wall_seconds, response_payload)
+    MODEL_STAGE_SECONDS.labels(stage=call.stage).observe(wall_seconds)
+    if call.prompt_tokens:
+        MODEL_TOKENS.labels(stage=call.stage, kind="prompt").inc(call.prompt_tokens)
+    if call.completion_tokens:
+        MODEL_TOKENS.labels(stage=call.stage, kind="completion").inc(call.completion_tokens)
+    collector = _collector_var.get()
+    if collector is not None:
+        collector.add(call)
+    return call
+
+
+class UsageLog:
+    def __init__(self, path, shared_state=None):
+        """
+        Args:
+            path (str): JSONL file the generation records are appended to.
+            shared_state (SharedStateStore, optional): Its write lock serializes appends from several
+                worker processes. Defaults to None, using an in-process lock only.
+        """
+        self.path = path
+        self.shared_state = shared_state
+        self._lock = threading.Lock()
+
+    def write(self, kind, puzzle_id, collector, **record_fields):
+        """Appends one generation: its outcome, its usage totals and every call it made.
+
+        Args:
+            kind (str): 'puzzle' or 'photo'.
+            puzzle_id (str | None): ID of the generated puzzle (see puzzle_registry), or None if it failed.
+            collector (UsageCollector): The generation's calls.
+            **record_fields: Extra fields for the record, e.g. category.
+        """
+        record = {'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'request_id': request_id_var.get(),
+                  'kind': kind, 'puzzle_id': puzzle_id, **record_fields, **collector.annotations,
+                  **collector.summary(),
+                  'call_log': [call.as_dict() for call in collector.calls]}
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            if self.shared_state is not None:
+                with self.shared_state.exclusive():
+                    self._append(line)
+            else:
+                self._append(line)
+        except (OSError, sqlite3.Error) as e:
+            # Bookkeeping only: a full disk or a contended store lock ("database is locked") must not fail the generation
+            logger.warning(f"Could not write model usage to {self.path}: {e}")
+
+    def _append(self, line):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as usage_file:
+            usage_file.write(line)
@@ -0,0 +1,86 @@
+# src/prompt_versions.py
+
+"""Registered versions of the puzzle prompt, with a weighted traffic split between them.
+
+Each generation picks one version by weight and uses it for all of its attempts. The version's name
+is stored on the puzzle ('prompt_version') and in its usage log record, so versions can be compared
+on prompt tokens, generation latency, validation pass rate and solve rate
+(bench/usage_report.py --by-prompt-version).
+
+Weights come from the registering code and can be overridden without a deploy through
+PUZZLE_PROMPT_WEIGHTS, e.g. "v2=9,v3_compact=1" to send a tenth of generations to v3_compact.
+A weight of 0 keeps a version registered but unused.
+"""
+
+import random
+import threading
+
+from trace_log import get_logger
+
+logger = get_logger("prompt_versions")
+
+
+def parse_weights(spec):
+    """Parses "name=weight,name=weight" into a dict, skipping malformed entries."""
+    weights = {}
+    for entry in (spec or "").split(","):
+        name, _, value = entry.partition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            if entry.strip():
+                logger.warning(f"Ignoring malformed prompt weight '{entry.strip()}'")
+            continue
+        if weight >= 0:
+            weights[name.strip()] = weight
+    return weights
+
+
+class PromptVersionRegistry:
+    def __init__(self, weight_overrides=None):
+        """
+        Args:
+            weight_overrides (str | dict, optional): Weights replacing the registered ones, as a dict
+                or in PUZZLE_PROMPT_WEIGHTS format.
+        """
+        if isinstance(weight_overrides, str):
+            weight_overrides = parse_weights(weight_overrides)
+        self.weight_overrides = weight_overrides or {}
+        self._builders = {} # name -> prompt builder
+        self._weights = {} # name -> traffic weight
+        self._lock = threading.Lock()
+
+    def register(self, name, builder, weight=1.0):
+        """Adds a prompt version.
+
+        Args:
+            name (str): Recorded on every puzzle generated with this version; keep it stable.
+            builder (callable): builder(category, previous_phrases, photo_description) -> prompt text.
+            weight (float): Share of generations relative to the other versions' weights.
+        """
+        with self._lock:
+            self._builders[name] = builder
+            self._weights[name] = self.weight_overrides.get(name, weight)
+
+    def choose(self, rng=None):
+        """A version name picked by weight (the first registered one if every weight is 0).
+
+        Args:
+            rng (random.Random, optional): Source of the pick; defaults to the random module.
+        """
+        with self._lock:
+            names = list(self._weights)
+            weights = [self._weights[name] for name in names]
+        if not names:
+            raise LookupError("No prompt versions registered.")
+        if sum(weights) <= 0:
+            return names[0]
+        return (rng or random).choices(names, weights=weights)[0]
+
+    def build(self, name, category, previous_phrases=None, photo_description=None):
+        """The prompt text of version `name`."""
+        return self._builders[name](category, previous_phrases, photo_description)
+
+    def weights(self):
+        with self._lock:
+            return dict(self._weights)
@@ -0,0 +1,197 @@
+# src/puzzle_cards.py
+
+"""Shareable PNG cards for puzzles, rendered with Pillow.
+
+Two caches keep repeated shares cheap:
+
+- GlyphAtlas rasterizes each emoji once from the Noto Color Emoji font (located by AssetManager)
+  and reuses the scaled tile for every later card.
+- CardRenderer keeps the finished PNG bytes of recently rendered cards in an LRU. A card is
+  identified by its puzzle ID, which is a content hash, so a cached card never goes stale.
+
+The card shows the category, the emojis and one blank per letter of the phrase. It never shows the
+answer. Without the emoji font, each glyph is drawn as a labelled placeholder tile.
+"""
+
+import io
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw, ImageFont
+
+from asset_manager import AssetManager
+from metrics import CARD_RENDER_SECONDS, CARD_REQUESTS
+from trace_log import get_logger, fields
+
+logger = get_logger("puzzle_cards")
+
+CARD_SIZE = (1200, 630) # Open Graph image size, shown uncropped by most link previews
+BACKGROUND = (26, 115, 232) # theme_color from manifest.json
+PANEL = (255, 255, 255)
+TEXT = (32, 33, 36)
+MUTED = (95, 99, 104)
+# Bumped whenever the layout changes, so cached cards and ETags from the old layout are not reused.
+# It is part of the card URL the page shares (?v=), which is what lets browsers cache cards as immutable
+CARD_LAYOUT_VERSION = 1
+# Noto Color Emoji is a bitmap (CBDT) font with a single 109px strike
+EMOJI_FONT_NATIVE_SIZE = 109
+
+
+class GlyphAtlas:
+    """Rasterizes each emoji cluster once and hands out the cached RGBA tile afterwards."""
+
+    def __init__(self, font_path=None, glyph_size=150, max_glyphs=4096):
+        """
+        Args:
+            font_path (Path, optional): Color emoji font. Defaults to AssetManager's font, if present.
+            glyph_size (int): Edge length in pixels of the square tile each emoji is scaled into.
+            max_glyphs (int): Tiles kept before the least recently used are dropped.
+        """
+        self.glyph_size = glyph_size
+        self.max_glyphs = max_glyphs
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+        self._font = self._load_font(font_path or AssetManager().get_emoji_font_path())
+        self._label_font = ImageFont.load_default(size=max(12, glyph_size // 6))
+
+    @staticmethod
+    def _load_font(font_path):
+        if font_path is None:
+            logger.warning("No emoji font available; puzzle cards will use placeholder glyphs")
+            return None
+        try:
+            return ImageFont.truetype(str(font_path), EMOJI_FONT_NATIVE_SIZE)
+        except OSError as e:
+            logger.warning(f"Could not load emoji font {font_path}: {e}")
+            return None
+
+    def glyph(self, emoji):
+        """The tile for one emoji cluster (rasterized on first use)."""
+        with self._lock:
+            tile = self._tiles.get(emoji)
+            if tile is not None:
+                self._tiles.move_to_end(emoji)
+                return tile
+        tile = self._rasterize(emoji)
+        with self._lock:
+            self._tiles[emoji] = tile
+            while len(self._tiles) > self.max_glyphs:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def __len__(self):
+        return len(self._tiles)
+
+    def _rasterize(self, emoji):
+        size = self.glyph_size
+        if self._font is None:
+            return self._placeholder(emoji)
+        canvas = Image.new("RGBA", (EMOJI_FONT_NATIVE_SIZE * 3, EMOJI_FONT_NATIVE_SIZE * 2), (0, 0, 0, 0))
+        ImageDraw.Draw(canvas).text((0, 0), emoji, font=self._font, fill=TEXT, embedded_color=True)
+        bbox = canvas.getbbox()
+        if bbox is None:
+            return self._placeholder(emoji)
+        glyph = canvas.crop(bbox)
+        # Fit into the tile; ZWJ sequences the font can't shape come out wider and are scaled down
+        glyph.thumbnail((size, size), Image.Resampling.LANCZOS)
+        if glyph.width < size * 0.6 and glyph.height < size * 0.6:
+            scale = size / max(glyph.width, glyph.height)
+            glyph = glyph.resize((round(glyph.width * scale), round(glyph.height * scale)), Image.Resampling.LANCZOS)
+        tile = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        tile.alpha_composite(glyph, ((size - glyph.width) // 2, (size - glyph.height) // 2))
+        return tile
+
+    def _placeholder(self, emoji):
+        size = self.glyph_size
+        tile = Image.new("RGBA", (size, size), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(tile)
+        draw.rounded_rectangle((4, 4, size - 4, size - 4), radius=size // 6, fill=(232, 240, 254), outline=BACKGROUND, width=3)
+        label = f"U+{ord(emoji[0]):04X}" if emoji else "?" # First code point is enough to tell tiles apart
+        draw.text((size / 2, size / 2), label, font=self._label_font, fill=MUTED, anchor="mm")
+        return tile
+
+
+class CardRenderer:
+    def __init__(self, atlas=None, max_cards=256):
+        """
+        Args:
+            atlas (GlyphAtlas, optional): Shared glyph cache. Defaults to a new GlyphAtlas.
+            max_cards (int): Finished PNG cards kept in the LRU.
+        """
+        self.atlas = atlas if atlas is not None else GlyphAtlas()
+        self.max_cards = max_cards
+        self._cards = OrderedDict() # puzzle ID -> PNG bytes
+        self._lock = threading.Lock()
+        self._title_font = ImageFont.load_default(size=44)
+        self._category_font = ImageFont.load_default(size=34)
+        self._blanks_font = ImageFont.load_default(size=40)
+        self._footer_font = ImageFont.load_default(size=28)
+
+    def card_png(self, puzzle):
+        """PNG bytes of the puzzle's card, rendered once per puzzle ID and then served from the LRU.
+
+        Args:
+            puzzle (dict): Registered puzzle details (must include 'id').
+        """
+        key = puzzle['id']
+        with self._lock:
+            png = self._cards.get(key)
+            if png is not None:
+                self._cards.move_to_end(key)
+        if png is not None:
+            CARD_REQUESTS.labels(cache="hit").inc()
+            return png
+
+        CARD_REQUESTS.labels(cache="miss").inc()
+        started = time.perf_counter()
+        png = self._render(puzzle)
+        CARD_RENDER_SECONDS.observe(time.perf_counter() - started)
+        with self._lock:
+            self._cards[key] = png
+            while len(self._cards) > self.max_cards:
+                self._cards.popitem(last=False)
+        logger.debug("Rendered puzzle card", extra=fields(
+            puzzle_id=key, bytes=len(png), glyphs_cached=len(self.atlas),
+            duration_ms=round((time.perf_counter() - started) * 1000, 2)))
+        return png
+
+    def _render(self, puzzle):
+        width, height = CARD_SIZE
+        card = Image.new("RGBA", CARD_SIZE, BACKGROUND + (255,))
+        draw = ImageDraw.Draw(card)
+        margin = 40
+        draw.rounded_rectangle((margin, margin, width - margin, height - margin), radius=36, fill=PANEL)
+
+        draw.text((width / 2, 110), "Emoji Puzzle Challenge", font=self._title_font, fill=BACKGROUND, anchor="mm")
+        draw.text((width / 2, 170), self._fit(puzzle.get('category', ''), self._category_font, width - 4 * margin),
+                  font=self._category_font, fill=MUTED, anchor="mm")
+
+        emojis = puzzle.get('emojis_list', [])[:6]
+        size = self.atlas.glyph_size
+        gap = 24
+        row_width = len(emojis) * size + max(0, len(emojis) - 1) * gap
+        x = (width - row_width) // 2
+        for emoji in emojis:
+            card.alpha_composite(self.atlas.glyph(emoji), (x, 215))
+            x += size + gap
+
+        # One blank per letter, words separated by wider gaps: the shape of the answer, not the answer
+        blanks = "   ".join(" ".join("_" if char.isalnum() else char for char in word)
+                            for word in puzzle.get('phrase', '').split())
+        draw.text((width / 2, 440), self._fit(blanks, self._blanks_font, width - 4 * margin),
+                  font=self._blanks_font, fill=TEXT, anchor="mm")
+        draw.text((width / 2, 525), "Can you guess the phrase?", font=self._footer_font, fill=MUTED, anchor="mm")
+
+        buffer = io.BytesIO()
+        card.convert("RGB").save(buffer, format="PNG", optimize=True)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _fit(text, font, max_width):
+        """Truncates text with an ellipsis so it fits max_width pixels."""
+        if font.getlength(text) <= max_width:
+            return text
+        while text and font.getlength(text + "…") > max_width:
+            text = text[:-1]
+        return text + "…"
@@ -0,0 +1,83 @@
+# src/puzzle_pack.py
+
+"""Offline puzzle packs built from puzzles that have already been played.
+
+The service worker downloads a pack at install time and serves puzzles from it whenever the
+server can't be reached. Packs come from the CSV result log, not from new generations, so building
+one costs a file read and never a model call. Each distinct phrase appears once, newest first, and
+must pass the same word and emoji rules as freshly generated puzzles. The log doesn't store
+explanations, so pack puzzles have none; the game only shows an explanation when there is one.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import threading
+
+from puzzle_validator import PuzzleValidator
+from trace_log import get_logger, fields
+
+logger = get_logger("puzzle_pack")
+
+
+class PuzzlePackBuilder:
+    def __init__(self, csv_log_file_path, validator=None, registry=None):
+        """
+        Args:
+            csv_log_file_path (str): The puzzle result log (see PuzzleGenerator.csv_log_file_path).
+            validator (PuzzleValidator, optional): Rules a logged puzzle must pass to be packed.
+                Defaults to the standard rules without the explanation check.
+            registry (PuzzleRegistry, optional): If given, packed puzzles are registered and carry an 'id'.
+        """
+        self.csv_log_file_path = csv_log_file_path
+        self.validator = validator or PuzzleValidator(min_explanation_chars=0)
+        self.registry = registry
+        self._cache = {} # size -> (log mtime, pack)
+        self._lock = threading.Lock()
+
+    def get_pack(self, size):
+        """Returns the pack for `size` puzzles, rebuilding it only when the log file has changed.
+
+        Returns:
+            dict: {'version': content hash, 'puzzles': [puzzle details, ...]}
+        """
+        try:
+            mtime = os.path.getmtime(self.csv_log_file_path)
+        except OSError:
+            mtime = None
+        with self._lock:
+            cached = self._cache.get(size)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        puzzles = self._read_puzzles(size) if mtime is not None else []
+        digest = hashlib.sha256(json.dumps(puzzles, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        pack = {'version': digest.hexdigest()[:16], 'puzzles': puzzles}
+        with self._lock:
+            self._cache[size] = (mtime, pack)
+        logger.info("Built puzzle pack", extra=fields(size=size, puzzles=len(puzzles), version=pack['version']))
+        return pack
+
+    def _read_puzzles(self, size):
+        with open(self.csv_log_file_path, newline='', encoding='utf-8') as log_file:
+            rows = [row for row in csv.reader(log_file) if len(row) >= 4 and row[0] != "Timestamp"]
+        puzzles = []
+        seen_phrases = set()
+        for row in reversed(rows): # Newest first
+            category, phrase, emojis = row[1], row[2].strip(), row[3]
+            if not phrase or phrase.lower() in seen_phrases:
+                continue
+            candidate = {'phrase': phrase, 'words': phrase.split(), 'category': category,
+                         'emojis': emojis, 'explanation': ''}
+            result = self.validator.validate(candidate)
+            if not result.passed:
+                continue
+            seen_phrases.add(phrase.lower())
+            puzzle = {'phrase': phrase, 'words': candidate['words'], 'category': category,
+                      'emojis_list': result.emojis_list, 'explanation': ''}
+            if self.registry is not None:
+                self.registry.register(puzzle)
+            puzzles.append(puzzle)
+            if len(puzzles) >= size:
+                break
+        return puzzles
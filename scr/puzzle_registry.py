@@ -0,0 +1,63 @@
+# src/puzzle_registry.py
+
+"""Stable IDs for served puzzles, so a puzzle can be referenced later (e.g. by its share card URL).
+
+A puzzle's ID is a hash of its content, so the same puzzle always gets the same ID in every worker
+process and the registry never needs to hand out counters. Served puzzles are remembered in the
+SharedStateStore under the multi-process server, or in a bounded in-process store otherwise.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def puzzle_id(puzzle):
+    """Content hash of a puzzle's phrase, emojis and category (12 hex characters)."""
+    content = "\n".join([puzzle.get('phrase', ''), " ".join(puzzle.get('emojis_list', [])), puzzle.get('category', '')])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]
+
+
+class LocalPuzzleStore:
+    """In-process puzzle store (SharedStateStore offers the same interface across processes)."""
+
+    def __init__(self, max_puzzles=5000):
+        self.max_puzzles = max_puzzles
+        self._puzzles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def save_puzzle(self, puzzle_id, puzzle):
+        with self._lock:
+            self._puzzles[puzzle_id] = puzzle
+            self._puzzles.move_to_end(puzzle_id)
+            while len(self._puzzles) > self.max_puzzles:
+                self._puzzles.popitem(last=False)
+
+    def load_puzzle(self, puzzle_id):
+        with self._lock:
+            return self._puzzles.get(puzzle_id)
+
+
+class PuzzleRegistry:
+    def __init__(self, store=None):
+        """
+        Args:
+            store (optional): Where puzzles are kept; anything with save_puzzle/load_puzzle, e.g. a
+                SharedStateStore so all worker processes see the same puzzles. Defaults to a LocalPuzzleStore.
+        """
+        self.store = store if store is not None else LocalPuzzleStore()
+
+    def register(self, puzzle):
+        """Assigns the puzzle its ID (puzzle['id']), remembers it and returns the ID."""
+        puzzle_details = {key: value for key, value in puzzle.items() if key != 'id'}
+        new_id = puzzle_id(puzzle_details)
+        self.store.save_puzzle(new_id, puzzle_details)
+        puzzle['id'] = new_id
+        return new_id
+
+    def get(self, puzzle_id):
+        """Returns the registered puzzle (with its 'id'), or None if unknown."""
+        puzzle = self.store.load_puzzle(puzzle_id)
+        if puzzle is None:
+            return None
+        return dict(puzzle, id=puzzle_id)
@@ -0,0 +1,156 @@
+# src/puzzle_validator.py
+
+"""Local rule checks for decoded puzzle JSON before a puzzle is served.
+
+The puzzle prompt asks for 2-4 words, 4-5 emojis and a 'words' list that spells out 'phrase'.
+PuzzleValidator checks every rule and reports each failure by name, so callers can count
+rejections per rule (puzzle_validation_rejections_total{reason}) and tune the prompt.
+
+Usage:
+    result = PuzzleValidator().validate(puzzle_data)
+    if not result.passed:
+        print(result.failures) # {"emoji_count": "3 emojis, expected 4-5", ...}
+"""
+
+from emoji_tokenizer import is_emoji, split_emoji_text, split_emojis
+
+# Keys every puzzle must have; without them (or with the wrong types) no other rule can run
+REQUIRED_KEYS = ('phrase', 'words', 'category', 'emojis', 'explanation')
+# Characters stripped from both ends of a word before comparing 'words' with 'phrase'
+_WORD_PUNCTUATION = "\"'.,!?;:()[]“”‘’…-"
+
+
+class ValidationResult:
+    """Outcome of PuzzleValidator.validate()."""
+    __slots__ = ("failures", "score", "emojis_list")
+
+    def __init__(self, failures, score, emojis_list=None):
+        self.failures = failures # Rule name -> human-readable reason, in rule order
+        self.score = score # Weighted share of rules passed, 0.0-1.0
+        self.emojis_list = emojis_list or []
+
+    @property
+    def passed(self):
+        return not self.failures
+
+    @property
+    def reasons(self):
+        return list(self.failures)
+
+    def __repr__(self):
+        return f"ValidationResult(passed={self.passed}, score={self.score:.2f}, failures={self.failures})"
+
+
+class PuzzleValidator:
+    def __init__(self, min_words=2, max_words=4, min_emojis=4, max_emojis=5, min_explanation_chars=10):
+        """
+        Args:
+            min_words (int): Fewest words a phrase may have.
+            max_words (int): Most words a phrase may have.
+            min_emojis (int): Fewest emojis a puzzle may use.
+            max_emojis (int): Most emojis a puzzle may use.
+            min_explanation_chars (int): Shortest acceptable explanation.
+        """
+        self.min_words = min_words
+        self.max_words = max_words
+        self.min_emojis = min_emojis
+        self.max_emojis = max_emojis
+        self.min_explanation_chars = min_explanation_chars
+        # (rule name, weight, check) - a check returns None when the rule passes, else the reason
+        self.rules = [
+            ("empty_phrase", 3, self._check_phrase),
+            ("word_count", 2, self._check_word_count),
+            ("words_mismatch", 2, self._check_words_match_phrase),
+            ("no_emojis", 3, self._check_has_emojis),
+            ("emoji_count", 2, self._check_emoji_count),
+            ("text_in_emojis", 1, self._check_emojis_are_not_text),
+            ("short_explanation", 1, self._check_explanation),
+        ]
+
+    def validate(self, puzzle_data):
+        """Runs every rule against decoded model output.
+
+        Args:
+            puzzle_data: The decoded JSON value.
+
+        Returns:
+            ValidationResult: Failed rules with reasons, the score and the parsed emoji list.
+        """
+        structural_failures = self._check_structure(puzzle_data)
+        if structural_failures:
+            return ValidationResult(structural_failures, 0.0)
+
+        emojis_list = split_emojis(puzzle_data['emojis'])
+        failures = {}
+        total_weight = passed_weight = 0
+        for name, weight, check in self.rules:
+            total_weight += weight
+            reason = check(puzzle_data, emojis_list)
+            if reason is None:
+                passed_weight += weight
+            else:
+                failures[name] = reason
+        return ValidationResult(failures, passed_weight / total_weight, emojis_list)
+
+    @staticmethod
+    def _check_structure(puzzle_data):
+        if not isinstance(puzzle_data, dict):
+            return {"missing_keys": "puzzle is not a JSON object"}
+        missing = [key for key in REQUIRED_KEYS if key not in puzzle_data]
+        if missing:
+            return {"missing_keys": f"missing {', '.join(missing)}"}
+        if not isinstance(puzzle_data['words'], list) or not puzzle_data['words']:
+            return {"words_not_list": "'words' is not a non-empty list"}
+        if not all(isinstance(word, str) for word in puzzle_data['words']):
+            return {"words_not_strings": "'words' contains non-string items"}
+        failures = {}
+        for key in ('phrase', 'emojis', 'explanation'):
+            if not isinstance(puzzle_data[key], str):
+                failures["wrong_types"] = f"'{key}' is not a string"
+        return failures
+
+    @staticmethod
+    def _normalize_words(words):
+        normalized = (word.strip(_WORD_PUNCTUATION).lower() for word in words)
+        return [word for word in normalized if word]
+
+    def _check_phrase(self, puzzle_data, emojis_list):
+        if not puzzle_data['phrase'].strip():
+            return "phrase is empty"
+        return None
+
+    def _check_word_count(self, puzzle_data, emojis_list):
+        count = len(self._normalize_words(puzzle_data['phrase'].split()))
+        if not self.min_words <= count <= self.max_words:
+            return f"{count} words, expected {self.min_words}-{self.max_words}"
+        return None
+
+    def _check_words_match_phrase(self, puzzle_data, emojis_list):
+        phrase_words = self._normalize_words(puzzle_data['phrase'].split())
+        listed_words = self._normalize_words(word for item in puzzle_data['words'] for word in item.split())
+        if phrase_words != listed_words:
+            return f"words {puzzle_data['words']} do not spell phrase '{puzzle_data['phrase']}'"
+        return None
+
+    def _check_has_emojis(self, puzzle_data, emojis_list):
+        if not emojis_list:
+            return "no emojis"
+        return None
+
+    def _check_emoji_count(self, puzzle_data, emojis_list):
+        if emojis_list and not self.min_emojis <= len(emojis_list) <= self.max_emojis:
+            return f"{len(emojis_list)} emojis, expected {self.min_emojis}-{self.max_emojis}"
+        return None
+
+    def _check_emojis_are_not_text(self, puzzle_data, emojis_list):
+        # Separators between emojis are fine; letters, digits or words in any script are not
+        text_words = split_emoji_text(puzzle_data['emojis'])[1]
+        not_emojis = text_words + [token for token in emojis_list if not is_emoji(token)]
+        if not_emojis:
+            return f"emojis field contains text: {', '.join(repr(word) for word in not_emojis[:3])}"
+        return None
+
+    def _check_explanation(self, puzzle_data, emojis_list):
+        if len(puzzle_data['explanation'].strip()) < self.min_explanation_chars:
+            return f"explanation shorter than {self.min_explanation_chars} characters"
+        return None
@@ -0,0 +1,163 @@
+# src/request_profiler.py
+
+"""Opt-in, sampled cProfile profiling of requests, aggregated per route.
+
+Profiling is off unless a sample rate is set: PUZZLE_PROFILE_SAMPLE_RATE at startup, or at runtime
+through POST /admin/profiling. A sampled request runs under cProfile and its stats are added to its
+route's aggregate (e.g. "/api/generate-puzzle"). Generations on the GenerationCoalescer's worker
+threads are sampled at the same rate under "generation", so the time spent building prompts,
+parsing JSON and waiting on Ollama shows up even though the request thread only waits for a result.
+The aggregates are read back as pstats text or as a binary .pstats dump (for snakeviz or
+flameprof) from GET /admin/profile.
+
+It is meant to be safe to leave available in production:
+
+- Unsampled requests pay only one random() call.
+- At most max_active profiles run at once per process. A sampled request that finds them all busy
+  runs unprofiled. On Python 3.12+ a second active cProfile raises, and that request is also skipped.
+- Aggregates are per process. Under the multi-process server a rate set through the admin endpoint
+  is stored in the SharedStateStore, and every worker picks it up within settings_max_age seconds.
+"""
+
+import cProfile
+import io
+import marshal
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from trace_log import get_logger, fields
+
+logger = get_logger("request_profiler")
+
+SAMPLE_RATE_KEY = "profile_sample_rate"
+SORT_KEYS = ("cumulative", "tottime", "calls", "ncalls", "time")
+
+
+class RequestProfiler:
+    def __init__(self, sample_rate=0.0, max_active=2, settings=None, settings_max_age=5.0):
+        """
+        Args:
+            sample_rate (float): Fraction of requests profiled (0 disables profiling).
+            max_active (int): Most profiles running at once in this process.
+            settings (optional): Store with get_value/set_value (e.g. the SharedStateStore) through
+                which a rate set at runtime reaches every worker process.
+            settings_max_age (float): Seconds between re-reads of the shared rate.
+        """
+        self._sample_rate = max(0.0, min(1.0, sample_rate))
+        self.settings = settings
+        self.settings_max_age = settings_max_age
+        self._settings_read_at = 0.0
+        self._active = threading.BoundedSemaphore(max_active)
+        self._stats = {} # route -> pstats.Stats aggregating every sampled request of the route
+        self._samples = {} # route -> (requests profiled, seconds spent in them)
+        self._lock = threading.Lock()
+
+    # --- Sampling ---
+    @property
+    def sample_rate(self):
+        if self.settings is not None and time.monotonic() - self._settings_read_at > self.settings_max_age:
+            self._settings_read_at = time.monotonic()
+            shared_rate = self.settings.get_value(SAMPLE_RATE_KEY)
+            if shared_rate is not None:
+                self._sample_rate = float(shared_rate)
+        return self._sample_rate
+
+    def set_sample_rate(self, sample_rate):
+        """Changes the rate in this process and, with a settings store, in every worker process."""
+        self._sample_rate = max(0.0, min(1.0, float(sample_rate)))
+        if self.settings is not None:
+            self.settings.set_value(SAMPLE_RATE_KEY, self._sample_rate)
+            self._settings_read_at = time.monotonic()
+        logger.info("Profiling sample rate changed", extra=fields(sample_rate=self._sample_rate))
+
+    def start(self):
+        """Starts profiling the current request if it is sampled.
+
+        Returns:
+            cProfile.Profile | None: Pass it to stop() when the request is done; None if not sampled.
+        """
+        rate = self.sample_rate
+        if rate <= 0 or random.random() >= rate:
+            return None
+        if not self._active.acquire(blocking=False):
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError: # Python 3.12+: another profiler is already active in the interpreter
+            self._active.release()
+            return None
+        profile.started_at = time.perf_counter()
+        return profile
+
+    def stop(self, profile, route):
+        """Stops a profile returned by start() and adds it to the route's aggregate."""
+        profile.disable()
+        self._active.release()
+        elapsed = time.perf_counter() - profile.started_at
+        with self._lock:
+            stats = self._stats.get(route)
+            if stats is None:
+                self._stats[route] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+            count, seconds = self._samples.get(route, (0, 0.0))
+            self._samples[route] = (count + 1, seconds + elapsed)
+
+    @contextmanager
+    def profile(self, route):
+        """Profiles the block under `route` if it is sampled."""
+        profile = self.start()
+        try:
+            yield
+        finally:
+            if profile is not None:
+                self.stop(profile, route)
+
+    def wrap(self, route, fn):
+        """fn, profiled under `route` whenever a call is sampled (e.g. the coalescer's generate_fn)."""
+        @wraps(fn)
+        def profiled(*args, **kwargs):
+            with self.profile(route):
+                return fn(*args, **kwargs)
+        return profiled
+
+    # --- Reports ---
+    def summary(self):
+        """Sample rate and, per route, how many requests were profiled and their mean duration."""
+        with self._lock:
+            routes = {route: {'samples': count, 'mean_ms': round(seconds * 1000 / count, 2)}
+                      for route, (count, seconds) in self._samples.items()}
+        return {'sample_rate': self.sample_rate, 'routes': routes}
+
+    def report(self, route, sort="cumulative", limit=40):
+        """The route's aggregate as pstats text, or None if it has no samples.
+
+        Raises:
+            ValueError: If sort is not a known pstats sort key.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of: {', '.join(SORT_KEYS)}")
+        output = io.StringIO()
+        with self._lock:
+            stats = self._stats.get(route)
+            if stats is None:
+                return None
+            stats.stream = output
+            stats.sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+    def dump(self, route):
+        """The route's aggregate in the binary format of pstats.Stats.dump_stats, or None."""
+        with self._lock:
+            stats = self._stats.get(route)
+            return marshal.dumps(stats.stats) if stats is not None else None
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._samples.clear()
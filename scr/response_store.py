@@ -0,0 +1,133 @@
+# src/response_store.py
+
+"""Recorded model responses, for replaying runs without Ollama and reusing exact repeats.
+
+ModelConnector looks every call up by a hash of the model, the kind of call (text or vision) and
+everything sent to the model: system prompt and prompt, and for vision calls the prepared JPEG.
+Responses are zlib-compressed in a small SQLite file. PUZZLE_RESPONSE_STORE_MODE picks the mode:
+
+- record: every call goes to Ollama; responses are stored (replacing older ones) once accepted:
+  puzzle and category-variant text after PuzzleGenerator has parsed and validated it
+  (ModelConnector.record_response), photo descriptions when they arrive.
+- replay: calls are answered from the store only, with no model latency. A prompt that was never
+  recorded gets an "Error:" response; Ollama is never contacted. Integration tests, benchmarks and
+  demos run in milliseconds and give the same answers every time.
+- reuse: an exact repeat is answered from the store, anything else goes to Ollama and is stored.
+  Suitable for production, e.g. for the fixed prompts of photo analysis.
+
+Prompts contain random picks (category, creative hint, prompt version), so a replayed run only
+hits the store if it makes the same picks as the recorded one: record and replay with the same
+PUZZLE_RANDOM_SEED, one generation at a time.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from metrics import RESPONSE_STORE_LOOKUPS
+from trace_log import get_logger, fields
+
+logger = get_logger("response_store")
+
+RECORD = "record"
+REPLAY = "replay"
+REUSE = "reuse"
+MODES = (RECORD, REPLAY, REUSE)
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_STORE_PATH = os.path.join(PROJECT_ROOT, "model_responses.db")
+
+
+class ResponseStore:
+    def __init__(self, path, mode=RECORD):
+        """
+        Args:
+            path (str | Path): SQLite file holding the responses (created if missing).
+            mode (str): RECORD, REPLAY or REUSE (see the module docstring).
+
+        Raises:
+            ValueError: If mode is not one of MODES.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Response store mode must be one of {', '.join(MODES)}, not '{mode}'.")
+        self.path = str(path)
+        self.mode = mode
+        self._local = threading.local() # sqlite3 connections must not be shared between threads
+        self._connection().executescript(
+            """
+            CREATE TABLE IF NOT EXISTS model_responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                response BLOB NOT NULL,
+                recorded_at REAL NOT NULL
+            );
+            """
+        )
+        logger.info("Model response store open", extra=fields(path=self.path, mode=mode))
+
+    @classmethod
+    def from_env(cls):
+        """The store configured by PUZZLE_RESPONSE_STORE_MODE and PUZZLE_RESPONSE_STORE, or None if off."""
+        mode = os.environ.get("PUZZLE_RESPONSE_STORE_MODE", "").strip().lower()
+        if not mode or mode == "off":
+            return None
+        return cls(os.environ.get("PUZZLE_RESPONSE_STORE") or DEFAULT_STORE_PATH, mode)
+
+    @property
+    def replay_only(self):
+        """True if calls missing from the store must fail instead of reaching Ollama."""
+        return self.mode == REPLAY
+
+    @staticmethod
+    def key(model_name, kind, *request_parts):
+        """Hash identifying one model request.
+
+        Args:
+            model_name (str): The model called.
+            kind (str): 'text' or 'vision'.
+            *request_parts (str | bytes): Everything else sent to the model (system prompt, prompt, image).
+        """
+        digest = hashlib.sha256()
+        for part in (model_name, kind) + request_parts:
+            data = part if isinstance(part, bytes) else str(part).encode('utf-8')
+            digest.update(len(data).to_bytes(8, 'big')) # Length-prefixed, so parts can't run into each other
+            digest.update(data)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """The stored response for key, or None (always None in record mode, which re-records)."""
+        if self.mode == RECORD:
+            return None
+        try:
+            row = self._connection().execute("SELECT response FROM model_responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read model response store: {e}")
+            row = None
+        RESPONSE_STORE_LOOKUPS.labels(mode=self.mode, result="hit" if row else "miss").inc()
+        return zlib.decompress(row[0]).decode('utf-8') if row else None
+
+    def put(self, key, model_name, kind, response_text):
+        """Stores a successful response (no-op in replay mode, which never changes the store)."""
+        if self.mode == REPLAY:
+            return
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO model_responses VALUES (?, ?, ?, ?, ?)",
+                (key, model_name, kind, zlib.compress(response_text.encode('utf-8'), 6), time.time()))
+        except sqlite3.Error as e:
+            logger.warning(f"Could not record model response: {e}")
+
+    def __len__(self):
+        return self._connection().execute("SELECT COUNT(*) FROM model_responses").fetchone()[0]
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,145 @@
+# src/result_ingest.py
+
+"""Result-log ingestion with client idempotency keys, for single and batched submissions.
+
+The client tags every finished puzzle with a random idempotency key and may send the same result
+more than once: a keepalive fetch whose response never arrived, a sendBeacon on page hide, or a
+replay from the service worker's offline queue. Each key is written to the CSV log at most once.
+Keys are remembered in the SharedStateStore under the multi-process server, or in an in-process
+LRU otherwise.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from puzzle_registry import puzzle_id
+from trace_log import get_logger, fields
+
+logger = get_logger("result_ingest")
+
+# Client-supplied play times further back than this (or in the future) are replaced by the server time
+MAX_PLAYED_AT_AGE = 7 * 24 * 3600
+REQUIRED_FIELDS = ('category', 'phrase', 'emojis_list', 'solvedCorrectly', 'letterHintsUsed',
+                   'puzzleScore', 'totalScoreAtEnd')
+
+
+class LocalIdempotencyKeys:
+    """In-process idempotency key memory (SharedStateStore offers the same interface across processes)."""
+
+    def __init__(self, max_keys=50000):
+        self.max_keys = max_keys
+        self._keys = OrderedDict() # key -> claimed_at, oldest first
+        self._lock = threading.Lock()
+
+    def claim_idempotency_key(self, key, ttl):
+        now = time.time()
+        with self._lock:
+            claimed_at = self._keys.get(key)
+            if claimed_at is not None and now - claimed_at < ttl:
+                return False
+            self._keys[key] = now
+            self._keys.move_to_end(key)
+            while len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+            return True
+
+    def release_idempotency_key(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+
+
+class ResultIngestor:
+    def __init__(self, generator, keys=None, key_ttl=MAX_PLAYED_AT_AGE, max_batch=100):
+        """
+        Args:
+            generator (PuzzleGenerator): Owns the CSV result log.
+            keys (optional): Idempotency key memory with claim_idempotency_key/release_idempotency_key,
+                e.g. the SharedStateStore. Defaults to a LocalIdempotencyKeys.
+            key_ttl (float): Seconds a key is remembered; must cover the longest offline retry window.
+            max_batch (int): Most results accepted in one batch request.
+        """
+        self.generator = generator
+        self.keys = keys if keys is not None else LocalIdempotencyKeys()
+        self.key_ttl = key_ttl
+        self.max_batch = max_batch
+
+    @staticmethod
+    def parse_result(data):
+        """Validates one result payload.
+
+        Returns:
+            tuple: (idempotency key or None, arguments for PuzzleGenerator._result_row)
+
+        Raises:
+            ValueError: With a client-facing message if a field is missing or has the wrong type.
+        """
+        if not isinstance(data, dict):
+            raise ValueError("Result must be a JSON object.")
+        missing_fields = [key for key in REQUIRED_FIELDS if data.get(key) is None]
+        if missing_fields:
+            raise ValueError(f'Missing data: {", ".join(missing_fields)}')
+        if not isinstance(data['emojis_list'], list):
+            raise ValueError("Invalid data type provided: 'emojis_list' must be a list.")
+        try:
+            played_at = None
+            if data.get('playedAt') is not None:
+                played_at_seconds = float(data['playedAt']) / 1000 # Client sends Date.now() milliseconds
+                if -60 <= time.time() - played_at_seconds <= MAX_PLAYED_AT_AGE:
+                    played_at = datetime.fromtimestamp(played_at_seconds)
+            emojis_list = [str(emoji) for emoji in data['emojis_list']]
+            row_args = (
+                data['category'], data['phrase'], " ".join(emojis_list),
+                str(data['solvedCorrectly']), # Ensure it's a string for CSV consistency
+                int(data['letterHintsUsed']), float(data['puzzleScore']), float(data['totalScoreAtEnd']),
+                played_at,
+                # The content hash the puzzle was served under, joining the row to the usage log
+                puzzle_id({'phrase': data['phrase'], 'emojis_list': emojis_list, 'category': data['category']}),
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid data type provided: {e}") from e
+        key = data.get('idempotencyKey')
+        return (str(key) if key else None), row_args
+
+    def ingest(self, results):
+        """Logs a batch of results, skipping any whose idempotency key was already ingested.
+
+        Args:
+            results (list): Result payloads, each optionally carrying 'idempotencyKey' and 'playedAt'.
+
+        Returns:
+            dict: Counts of accepted and duplicate results plus the invalid ones by index.
+
+        Raises:
+            ValueError: If the batch itself is malformed or too large.
+            IOError: If the CSV write failed (claimed keys are released so a retry is accepted).
+        """
+        if not isinstance(results, list):
+            raise ValueError("'results' must be a list.")
+        if len(results) > self.max_batch:
+            raise ValueError(f"At most {self.max_batch} results per batch.")
+
+        rows, claimed_keys, rejected = [], [], []
+        duplicates = 0
+        for index, data in enumerate(results):
+            try:
+                key, row_args = self.parse_result(data)
+            except ValueError as e:
+                rejected.append({'index': index, 'message': str(e)})
+                continue
+            if key:
+                if not self.keys.claim_idempotency_key(key, self.key_ttl):
+                    duplicates += 1
+                    continue
+                claimed_keys.append(key)
+            rows.append(self.generator._result_row(*row_args))
+
+        if rows and not self.generator._log_puzzle_rows_to_csv(rows):
+            for key in claimed_keys:
+                self.keys.release_idempotency_key(key)
+            raise IOError("Could not write to the result log.")
+
+        logger.info("Ingested puzzle results", extra=fields(
+            accepted=len(rows), duplicates=duplicates, rejected=len(rejected)))
+        return {'accepted': len(rows), 'duplicates': duplicates, 'rejected': rejected}
@@ -0,0 +1,196 @@
+# src/shared_state.py
+
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+
+class SharedStateStore:
+    """SQLite-backed state shared by every worker process of the production server.
+
+    Holds the state that has to be global rather than per process: the recently used phrases,
+    the pool of generated-but-unclaimed puzzles, the registry of served puzzles, the idempotency
+    keys of logged results, per-client rate-limit buckets, small cached values (e.g. the Ollama
+    model list), and a cross-process lock used to serialize writes to the CSV result log.
+    """
+
+    def __init__(self, db_path, busy_timeout=10.0):
+        """
+        Args:
+            db_path (str | Path): SQLite database file. Created if missing.
+            busy_timeout (float): Seconds to wait for another process holding the write lock.
+        """
+        self.db_path = str(db_path)
+        self.busy_timeout = busy_timeout
+        self.idempotency_key_retention = 8 * 24 * 3600 # Longest idempotency key ttl any caller uses, plus slack
+        self._local = threading.local() # sqlite3 connections must not be shared between threads
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS recent_phrases (
+                phrase TEXT PRIMARY KEY,
+                used_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS puzzle_pool (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS puzzles (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                saved_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS puzzles_saved_at ON puzzles (saved_at);
+            CREATE TABLE IF NOT EXISTS idempotency_keys (
+                key TEXT PRIMARY KEY,
+                claimed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idempotency_keys_claimed_at ON idempotency_keys (claimed_at);
+            CREATE TABLE IF NOT EXISTS rate_buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS rate_buckets_updated_at ON rate_buckets (updated_at);
+            CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: autocommit, transactions are opened explicitly where needed
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def exclusive(self):
+        """Holds the database write lock for the duration of the block (across all processes)."""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        else:
+            conn.execute("COMMIT")
+
+    # --- Recently used phrases ---
+    def add_recent_phrase(self, phrase, max_recent):
+        """Marks a phrase as just used and trims the list to the newest max_recent entries."""
+        with self.exclusive() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recent_phrases (phrase, used_at) VALUES (?, ?)",
+                (phrase, time.time()),
+            )
+            conn.execute(
+                "DELETE FROM recent_phrases WHERE phrase NOT IN "
+                "(SELECT phrase FROM recent_phrases ORDER BY used_at DESC LIMIT ?)",
+                (max_recent,),
+            )
+
+    def recent_phrases(self):
+        """Recently used phrases, oldest first (same order as PuzzleGenerator.recently_used_phrases)."""
+        rows = self._connection().execute("SELECT phrase FROM recent_phrases ORDER BY used_at").fetchall()
+        return [row[0] for row in rows]
+
+    # --- Pool of ready puzzles (same interface as generation_coalescer.LocalPuzzlePool) ---
+    def push_puzzle(self, puzzle, max_size):
+        """Adds a ready puzzle to the shared pool, dropping the oldest beyond max_size."""
+        with self.exclusive() as conn:
+            conn.execute(
+                "INSERT INTO puzzle_pool (payload, created_at) VALUES (?, ?)",
+                (json.dumps(puzzle, ensure_ascii=False), time.time()),
+            )
+            conn.execute(
+                "DELETE FROM puzzle_pool WHERE id NOT IN "
+                "(SELECT id FROM puzzle_pool ORDER BY id DESC LIMIT ?)",
+                (max_size,),
+            )
+
+    def pop_puzzle(self):
+        """Claims the oldest pooled puzzle, or returns None if the pool is empty."""
+        with self.exclusive() as conn:
+            row = conn.execute("SELECT id, payload FROM puzzle_pool ORDER BY id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            conn.execute("DELETE FROM puzzle_pool WHERE id = ?", (row[0],))
+        return json.loads(row[1])
+
+    def pool_size(self):
+        return self._connection().execute("SELECT COUNT(*) FROM puzzle_pool").fetchone()[0]
+
+    # --- Served puzzles by ID (same interface as puzzle_registry.LocalPuzzleStore) ---
+    def save_puzzle(self, puzzle_id, puzzle, max_age=30 * 24 * 3600):
+        """Stores a served puzzle under its ID and drops puzzles not served within max_age seconds."""
+        now = time.time()
+        with self.exclusive() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO puzzles (id, payload, saved_at) VALUES (?, ?, ?)",
+                (puzzle_id, json.dumps(puzzle, ensure_ascii=False), now),
+            )
+            conn.execute("DELETE FROM puzzles WHERE saved_at < ?", (now - max_age,))
+
+    def load_puzzle(self, puzzle_id):
+        row = self._connection().execute("SELECT payload FROM puzzles WHERE id = ?", (puzzle_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    # --- Idempotency keys of ingested results (same interface as result_ingest.LocalIdempotencyKeys) ---
+    def claim_idempotency_key(self, key, ttl):
+        """Records key as seen. Returns False if it was already claimed within the last ttl seconds."""
+        now = time.time()
+        with self.exclusive() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND claimed_at < ?", (key, now - ttl))
+            # Callers use different ttls (result keys: days, daily puzzle claims: minutes), so the
+            # table-wide purge only drops keys older than any caller's window
+            conn.execute("DELETE FROM idempotency_keys WHERE claimed_at < ?",
+                         (now - max(ttl, self.idempotency_key_retention),))
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO idempotency_keys (key, claimed_at) VALUES (?, ?)", (key, now))
+            return cursor.rowcount == 1
+
+    def release_idempotency_key(self, key):
+        """Forgets a claimed key (the write it guarded failed, so a retry must be accepted)."""
+        self._connection().execute("DELETE FROM idempotency_keys WHERE key = ?", (key,))
+
+    # --- Per-client rate limits (same interface as admission.LocalRateLimitBuckets) ---
+    def take_rate_token(self, key, rate, burst, cost=1):
+        """Takes `cost` tokens from the key's bucket. Returns 0, or the seconds until it could."""
+        now = time.time()
+        with self.exclusive() as conn:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = burst if row is None else min(burst, row[0] + (now - row[1]) * rate)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if wait == 0.0:
+                tokens -= cost
+            conn.execute("INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at) VALUES (?, ?, ?)",
+                         (key, tokens, now))
+            # A bucket idle long enough to be full again carries no state worth keeping
+            conn.execute("DELETE FROM rate_buckets WHERE updated_at < ?", (now - burst / rate,))
+        return wait
+
+    # --- Small cached values ---
+    def get_value(self, key, max_age=None):
+        """Returns the JSON-decoded value for key, or None if missing or older than max_age seconds."""
+        row = self._connection().execute("SELECT value, updated_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[0])
+
+    def set_value(self, key, value):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO kv (key, value, updated_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time()),
+        )
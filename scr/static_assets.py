@@ -0,0 +1,166 @@
+# src/static_assets.py
+
+"""Fingerprinted, precompressed static assets served with immutable cache headers.
+
+At startup every file under static/ is read once, hashed, and for text types compressed with gzip
+(and brotli, if the optional `brotli` package is installed). Templates link to the fingerprinted
+URL through the `asset_url` helper:
+
+    <script src="{{ asset_url('js/script.js') }}"></script>
+    -> /assets/js/script.3f9a1c07d2.js
+
+Because the URL changes whenever the content does, responses can be cached for a year as
+immutable. A returning client then makes no requests at all for these files. Files the
+manifest doesn't know about fall back to Flask's regular /static/ URL.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, url_for
+
+from trace_log import get_logger, fields
+
+try:
+    import brotli
+except ImportError: # Optional: gzip alone already covers every browser
+    brotli = None
+
+logger = get_logger("static_assets")
+
+# Types worth compressing; images and fonts are already compressed
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                      'image/svg+xml')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class _Asset:
+    __slots__ = ("filename", "fingerprinted", "digest", "mimetype", "mtime", "bodies")
+
+    def __init__(self, filename, fingerprinted, digest, mimetype, mtime, bodies):
+        self.filename = filename
+        self.fingerprinted = fingerprinted
+        self.digest = digest
+        self.mimetype = mimetype
+        self.mtime = mtime
+        self.bodies = bodies # Content-Encoding ('identity', 'gzip', 'br') -> bytes
+
+
+class StaticAssetManifest:
+    def __init__(self, static_folder, url_prefix='/assets', hash_length=10, min_compress_bytes=256,
+                 auto_reload=False):
+        """
+        Args:
+            static_folder (str): Directory to serve (the Flask app's static folder).
+            url_prefix (str): URL path the fingerprinted files are served under.
+            hash_length (int): Hex digits of the SHA-256 content hash kept in file names.
+            min_compress_bytes (int): Smaller files are only served uncompressed.
+            auto_reload (bool): Re-read a file when its mtime changes (development server).
+        """
+        self.static_folder = os.path.abspath(static_folder)
+        self.url_prefix = url_prefix.rstrip('/')
+        self.hash_length = hash_length
+        self.min_compress_bytes = min_compress_bytes
+        self.auto_reload = auto_reload
+        self._assets = {} # Logical filename ('js/script.js') -> _Asset
+        self._by_fingerprint = {} # 'js/script.<hash>.js' -> _Asset
+        self._lock = threading.Lock()
+        self.build()
+
+    def build(self):
+        """Reads, fingerprints and compresses every file in the static folder."""
+        total_bytes = compressed_bytes = 0
+        for directory, subdirectories, filenames in os.walk(self.static_folder):
+            subdirectories[:] = [name for name in subdirectories if not name.startswith('.')]
+            for name in filenames:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(directory, name)
+                filename = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                asset = self._load(filename)
+                total_bytes += len(asset.bodies['identity'])
+                compressed_bytes += min(len(body) for body in asset.bodies.values())
+        logger.info("Static asset manifest built", extra=fields(
+            files=len(self._assets), bytes=total_bytes, smallest_encoding_bytes=compressed_bytes,
+            brotli=brotli is not None))
+
+    def _load(self, filename):
+        path = os.path.join(self.static_folder, filename)
+        with open(path, 'rb') as asset_file:
+            content = asset_file.read()
+        digest = hashlib.sha256(content).hexdigest()[:self.hash_length]
+        stem, extension = os.path.splitext(filename)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if extension == '.webmanifest' or filename.endswith('manifest.json'):
+            mimetype = 'application/manifest+json'
+
+        bodies = {'identity': content}
+        if len(content) >= self.min_compress_bytes and mimetype.startswith(COMPRESSIBLE_TYPES):
+            # mtime=0 keeps the gzip bytes (and so the ETag) identical across restarts and workers
+            gzipped = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gzipped) < len(content):
+                bodies['gzip'] = gzipped
+            if brotli is not None:
+                brotlied = brotli.compress(content, quality=11)
+                if len(brotlied) < len(content):
+                    bodies['br'] = brotlied
+
+        asset = _Asset(filename, f"{stem}.{digest}{extension}", digest, mimetype, os.path.getmtime(path), bodies)
+        with self._lock:
+            previous = self._assets.get(filename)
+            if previous is not None:
+                self._by_fingerprint.pop(previous.fingerprinted, None)
+            self._assets[filename] = asset
+            self._by_fingerprint[asset.fingerprinted] = asset
+        return asset
+
+    def _current(self, filename):
+        asset = self._assets.get(filename)
+        if asset is not None and self.auto_reload:
+            path = os.path.join(self.static_folder, filename)
+            try:
+                if os.path.getmtime(path) != asset.mtime:
+                    asset = self._load(filename)
+            except OSError:
+                pass
+        return asset
+
+    def url(self, filename):
+        """Fingerprinted URL for a static file (template helper `asset_url`).
+
+        Args:
+            filename (str): Path relative to the static folder, e.g. 'css/style.css'.
+        """
+        asset = self._current(filename)
+        if asset is None:
+            return url_for('static', filename=filename)
+        return f"{self.url_prefix}/{asset.fingerprinted}"
+
+    def response(self, fingerprinted, request):
+        """Serves a fingerprinted file in the best encoding the client accepts.
+
+        Args:
+            fingerprinted (str): Path after the URL prefix, e.g. 'js/script.3f9a1c07d2.js'.
+            request: The current Flask request (for Accept-Encoding and conditional headers).
+        """
+        asset = self._by_fingerprint.get(fingerprinted)
+        if asset is None:
+            abort(404)
+
+        encoding = 'identity'
+        accepted = request.accept_encodings
+        for candidate in ('br', 'gzip'):
+            if candidate in asset.bodies and accepted[candidate] > 0:
+                encoding = candidate
+                break
+
+        response = Response(asset.bodies[encoding], mimetype=asset.mimetype)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        response.set_etag(f"{asset.digest}-{encoding}")
+        return response.make_conditional(request)
@@ -0,0 +1,133 @@
+# src/trace_log.py
+
+"""Leveled, queue-backed structured logging with per-request trace spans.
+
+Log calls on request threads only build a LogRecord and put it on an in-memory queue; a background
+QueueListener thread formats each record as one JSON line and writes it to stdout. Verbose
+diagnostics (raw model responses, full puzzle dictionaries) are logged at DEBUG and cost nothing
+beyond a level check unless PUZZLE_LOG_LEVEL=DEBUG.
+
+Usage:
+    logger = get_logger(__name__)
+    with trace_span(logger, "llm_call", endpoint_style="chat"):
+        ...
+    logger.info("Selected base category", extra=fields(category=name))
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+ROOT_LOGGER_NAME = "puzzle"
+
+# Request ID of the work being done on the current thread/context ("-" outside any request)
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+_listener = None
+_configure_lock = threading.Lock()
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:12]
+
+
+def fields(**kwargs):
+    """Structured fields for a log call: logger.info("msg", extra=fields(key=value))."""
+    return {"fields": kwargs}
+
+
+class _RequestIdFilter(logging.Filter):
+    """Stamps the current request ID on the record while still on the calling thread."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        extra_fields = getattr(record, "fields", None)
+        if extra_fields:
+            entry.update(extra_fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(level=None, stream=None):
+    """Installs the queue-backed JSON handler on the "puzzle" logger (idempotent).
+
+    Args:
+        level (str | int, optional): Log level. Defaults to PUZZLE_LOG_LEVEL or INFO.
+        stream (optional): Output stream for the listener thread. Defaults to sys.stdout.
+    """
+    global _listener
+    with _configure_lock:
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(level or os.environ.get("PUZZLE_LOG_LEVEL", "INFO").upper())
+        if _listener is not None:
+            return root
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.addFilter(_RequestIdFilter())
+        output_handler = logging.StreamHandler(stream or sys.stdout)
+        output_handler.setFormatter(JsonLineFormatter())
+        _listener = logging.handlers.QueueListener(log_queue, output_handler)
+        _listener.start()
+        atexit.register(_listener.stop) # Flush queued records on interpreter exit
+        root.addHandler(queue_handler)
+        root.propagate = False
+        return root
+
+
+def get_logger(name):
+    """Returns a child of the "puzzle" logger, e.g. get_logger(__name__) -> "puzzle.generator"."""
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+@contextmanager
+def request_context(request_id=None):
+    """Binds a request ID to everything logged inside the block."""
+    token = request_id_var.set(request_id or new_request_id())
+    try:
+        yield request_id_var.get()
+    finally:
+        request_id_var.reset(token)
+
+
+@contextmanager
+def trace_span(logger, stage, **span_fields):
+    """Times one pipeline stage and logs it as a span (at DEBUG, or WARNING if the block raises).
+
+    Extra attributes discovered inside the block can be attached via the yielded dict.
+    """
+    started = time.perf_counter()
+    span = dict(span_fields)
+    try:
+        yield span
+    except Exception as e:
+        span["error"] = str(e)
+        logger.warning("span", extra=fields(stage=stage, duration_ms=_elapsed_ms(started), status="error", **span))
+        raise
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("span", extra=fields(stage=stage, duration_ms=_elapsed_ms(started), status="ok", **span))
+
+
+def _elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
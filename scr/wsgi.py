@@ -0,0 +1,26 @@
+# src/wsgi.py
+
+"""WSGI entry point for the production server.
+
+Run from this directory with several worker processes, e.g.:
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Each worker imports app.py once on startup. State that has to be global across workers
+(recent phrases, the pool of ready puzzles, the CSV write lock and the Ollama model list)
+lives in the SQLite file named by PUZZLE_SHARED_STATE_DB, so only the first worker to
+start probes Ollama and the others reuse its answer.
+"""
+
+import os
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+os.environ.setdefault('PUZZLE_SHARED_STATE_DB', str(PROJECT_ROOT / 'puzzle_state.db'))
+
+from app import app as application, start_background_work  # noqa: E402  (env must be set before app.py reads it)
+
+# gunicorn imports this module in each worker after forking (preload_app = False), so every worker
+# runs its own fill thread; the shared store's claims keep them from generating the same day twice
+start_background_work()
@@ -12,6 +12,10 @@ document.addEventListener('DOMContentLoaded', function() {
         const messageDisplay = document.getElementById('message-display');
         const scoreDisplay = document.getElementById('score-display');
         const newPuzzleButton = document.getElementById('new-puzzle-button');
+        const sharePuzzleButton = document.getElementById('share-puzzle-button');
+        const photoPuzzleButton = document.getElementById('photo-puzzle-button');
+        const dailyPuzzleButton = document.getElementById('daily-puzzle-button');
+        const photoPuzzleInput = document.getElementById('photo-puzzle-input');
         const letterHintButton = document.getElementById('letter-hint-button');
         const letterHintsUsedDisplay = document.getElementById('letter-hints-used-display');
         const explanationDisplay = document.getElementById('explanation-display'); // NEW Explanation Element
@@ -65,6 +69,45 @@ document.addEventListener('DOMContentLoaded', function() {
         const LETTER_HINT_COST = 5;
 
         let isCurrentPuzzleLogged = false; // Flag to track if current puzzle result is logged
+
+        // --- Prefetch queue: puzzles fetched ahead of time so "New Puzzle" doesn't wait on a generation ---
+        const PUZZLE_QUEUE_TARGET = 3; // Puzzles to keep ready locally
+        let puzzleQueue = [];
+        let puzzleQueueRefill = null; // Promise of the in-flight /api/puzzles request, if any
+
+        function isPlayablePuzzle(puzzle) {
+            return puzzle && puzzle.emojis_list && puzzle.phrase && puzzle.words && Array.isArray(puzzle.words);
+        }
+
+        // Tops the queue up to PUZZLE_QUEUE_TARGET with one batch request; concurrent callers share it
+        function refillPuzzleQueue() {
+            if (puzzleQueueRefill) return puzzleQueueRefill;
+            const needed = PUZZLE_QUEUE_TARGET - puzzleQueue.length;
+            if (needed <= 0) return Promise.resolve();
+            puzzleQueueRefill = (async () => {
+                try {
+                    const response = await fetch(`/api/puzzles?count=${needed}`);
+                    if (!response.ok) {
+                        const errorData = await response.json().catch(() => ({ error: "Network response was not ok." }));
+                        throw new Error(errorData.error || `HTTP error! Status: ${response.status}`);
+                    }
+                    const data = await response.json();
+                    puzzleQueue.push(...(data.puzzles || []).filter(isPlayablePuzzle));
+                } finally {
+                    puzzleQueueRefill = null;
+                }
+            })();
+            return puzzleQueueRefill;
+        }
+
+        async function takeQueuedPuzzle() {
+            if (puzzleQueue.length === 0) {
+                if (puzzleQueueRefill) await puzzleQueueRefill.catch(() => {});
+                if (puzzleQueue.length === 0) await refillPuzzleQueue();
+            }
+            if (puzzleQueue.length === 0) throw new Error("Invalid puzzle data received from server.");
+            return puzzleQueue.shift();
+        }
         
         // --- UPDATED: Function to display the puzzle explanation ---
         function displayExplanation() {
@@ -77,29 +120,88 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         // --- Helper Function to Log Puzzle Result to Server ---
-        async function logPuzzleResultToServer(logData) {
+        // Fire-and-forget: results are kept in localStorage with an idempotency key until the batch endpoint
+        // acknowledges them. Resending is always safe, because the server drops keys it has already logged.
+        const PENDING_RESULTS_KEY = 'pendingPuzzleResults';
+        const MAX_PENDING_RESULTS = 100;
+        let resultFlushInFlight = false;
+        let resultFlushRequested = false;
+
+        function newIdempotencyKey() {
+            if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+            return `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+        }
+
+        function loadPendingResults() {
+            try {
+                return JSON.parse(localStorage.getItem(PENDING_RESULTS_KEY)) || [];
+            } catch (error) {
+                return [];
+            }
+        }
+
+        function savePendingResults(results) {
+            try {
+                localStorage.setItem(PENDING_RESULTS_KEY, JSON.stringify(results.slice(-MAX_PENDING_RESULTS)));
+            } catch (error) {
+                console.warn('Could not persist pending puzzle results:', error);
+            }
+        }
+
+        function logPuzzleResultToServer(logData) {
             if (!logData || !logData.phrase) { // Basic check
                 console.warn("logPuzzleResultToServer: Attempted to log empty or invalid data.", logData);
                 return;
             }
             console.log("Logging puzzle result to server:", logData);
-            try {
-                const response = await fetch('/api/log-puzzle-result', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json',
-                    },
-                    body: JSON.stringify(logData),
-                });
-                const responseData = await response.json();
-                if (response.ok) {
-                    console.log('Puzzle result logged successfully:', responseData);
+            const pending = loadPendingResults();
+            pending.push({ ...logData, idempotencyKey: newIdempotencyKey(), playedAt: Date.now() });
+            savePendingResults(pending);
+            flushPendingResults();
+        }
+
+        function flushPendingResults() {
+            const batch = loadPendingResults();
+            if (batch.length === 0) return;
+            if (resultFlushInFlight) {
+                resultFlushRequested = true;
+                return;
+            }
+            resultFlushInFlight = true;
+            fetch('/api/log-puzzle-results', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ results: batch }),
+                keepalive: true, // Lets the request finish even if the page is closed meanwhile
+            }).then(async response => {
+                const responseData = await response.json().catch(() => ({}));
+                // 2xx: logged or queued offline by the service worker; 4xx: invalid, resending won't help
+                if (response.status < 500 && response.status !== 429) {
+                    const sentKeys = new Set(batch.map(result => result.idempotencyKey));
+                    savePendingResults(loadPendingResults().filter(result => !sentKeys.has(result.idempotencyKey)));
+                    console.log('Puzzle results logged:', responseData);
                 } else {
-                    console.error('Error logging puzzle result:', responseData);
+                    console.error('Error logging puzzle results:', responseData);
                 }
-            } catch (error) {
-                console.error('Fetch error while logging puzzle result:', error);
-            }
+            }).catch(error => {
+                console.warn('Puzzle results not sent yet, will retry:', error);
+            }).finally(() => {
+                resultFlushInFlight = false;
+                if (resultFlushRequested) {
+                    resultFlushRequested = false;
+                    flushPendingResults();
+                }
+            });
+        }
+
+        // On page hide a beacon is the only request guaranteed to go out. The results stay pending, and
+        // the idempotency keys turn the next flush into a no-op for whatever the beacon delivered.
+        function beaconPendingResults() {
+            const pending = loadPendingResults();
+            if (pending.length === 0 || !navigator.sendBeacon) return;
+            // A CORS-safelisted type: with application/json some browsers refuse or preflight the beacon
+            const body = new Blob([JSON.stringify({ results: pending })], { type: 'text/plain;charset=UTF-8' });
+            navigator.sendBeacon('/api/log-puzzle-results', body);
         }
 
         // --- NEW: Final Answer Timer Functions ---
@@ -679,7 +781,9 @@ document.addEventListener('DOMContentLoaded', function() {
             updateAllUI();
         }
 
-        async function fetchNewPuzzle() {
+        // loadPuzzle: optional async function supplying the puzzle (e.g. a photo puzzle); defaults to the prefetch queue
+        async function fetchNewPuzzle(loadPuzzle) {
+            const fromQueue = typeof loadPuzzle !== 'function'; // Also called as a click handler with an event
             // --- Log previous puzzle if abandoned and not yet logged ---
             if (currentPuzzle && !isCurrentPuzzleLogged) {
                 const abandonedPuzzleData = {
@@ -691,30 +795,30 @@ document.addEventListener('DOMContentLoaded', function() {
                     puzzleScore: 0, // No score for abandoned puzzle
                     totalScoreAtEnd: currentTotalScore // Score at the moment of abandonment
                 };
-                await logPuzzleResultToServer(abandonedPuzzleData);
+                logPuzzleResultToServer(abandonedPuzzleData); // Fire-and-forget: doesn't delay the next puzzle
                 isCurrentPuzzleLogged = true; // Mark as logged
             }
             // --- End logging abandoned puzzle ---
             
-            if (emojiDisplay) emojiDisplay.textContent = 'Loading...';
-            if (categoryText) categoryText.textContent = 'Loading...';
-            if (phraseDisplay) phraseDisplay.innerHTML = '';
+            if (!fromQueue || puzzleQueue.length === 0) { // Only a cold queue has to wait for the server
+                if (emojiDisplay) emojiDisplay.textContent = 'Loading...';
+                if (categoryText) categoryText.textContent = 'Loading...';
+                if (phraseDisplay) phraseDisplay.innerHTML = '';
+            }
             displayMessage('');
             stopHintTimer(); 
 
             try {
-                const response = await fetch('/api/generate-puzzle');
-                if (!response.ok) {
-                    const errorData = await response.json().catch(() => ({ error: "Network response was not ok." }));
-                    throw new Error(errorData.error || `HTTP error! Status: ${response.status}`);
-                }
-                currentPuzzle = await response.json();
+                currentPuzzle = fromQueue ? await takeQueuedPuzzle() : await loadPuzzle();
+                // Refill in the background while this puzzle is being played
+                refillPuzzleQueue().catch(error => console.warn('Puzzle prefetch failed:', error));
 
-                if (currentPuzzle && currentPuzzle.emojis_list && currentPuzzle.phrase && currentPuzzle.words && Array.isArray(currentPuzzle.words)) {
+                if (isPlayablePuzzle(currentPuzzle)) {
                     resetForNewPuzzle(); // This will set isCurrentPuzzleLogged to false and reset step state
                     if (emojiDisplay) emojiDisplay.textContent = currentPuzzle.emojis_list.join(' ');
                     if (categoryText) categoryText.textContent = currentPuzzle.category;
                     renderPhraseDisplay();
+                    if (sharePuzzleButton) sharePuzzleButton.disabled = !currentPuzzle.id; // Offline pack puzzles may lack one
                     // startHintTimer();// disable auto-start for hints on new puzzle
                     
                     // Update all UI elements for new puzzle
@@ -731,6 +835,39 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         }
         
+        async function requestPuzzle(url, options) {
+            const response = await fetch(url, options);
+            const data = await response.json().catch(() => ({}));
+            if (!response.ok) throw new Error(data.error || `HTTP error! status: ${response.status}`);
+            return data;
+        }
+
+        // Uploads a photo; the server downsizes it and asks the vision model for a puzzle themed on it
+        function requestPhotoPuzzle(file) {
+            const form = new FormData();
+            form.append('image', file);
+            return requestPuzzle('/api/photo-puzzle', { method: 'POST', body: form });
+        }
+
+        // Shares the puzzle's server-rendered card (emojis and letter blanks, never the answer)
+        async function sharePuzzleCard() {
+            if (!currentPuzzle || !currentPuzzle.id) return;
+            // The layout version in the URL lets the card be cached as immutable until the layout changes
+            const cardUrl = new URL(`/api/puzzle/${encodeURIComponent(currentPuzzle.id)}/card.png`, window.location.origin);
+            if (sharePuzzleButton && sharePuzzleButton.dataset.cardVersion) {
+                cardUrl.searchParams.set('v', sharePuzzleButton.dataset.cardVersion);
+            }
+            if (navigator.share) {
+                try {
+                    await navigator.share({ title: 'Emoji Puzzle Challenge', text: 'Can you guess the phrase?', url: cardUrl.href });
+                } catch (error) {
+                    if (error.name !== 'AbortError') console.warn('Share failed:', error);
+                }
+            } else {
+                window.open(cardUrl.href, '_blank', 'noopener');
+            }
+        }
+
         // --- UPDATED: Guess Handling (with final answer logic and all-words-revealed check) ---
         function handleSubmitGuess() {
             if (!currentPuzzle || !guessInput || !submitGuessButton || isCurrentPuzzleLogged) { 
@@ -850,7 +987,32 @@ document.addEventListener('DOMContentLoaded', function() {
         else console.error("Skip to Answer button not found!");
         if (pauseResumeButton) pauseResumeButton.addEventListener('click', togglePauseGame);
         else console.error("Pause/Resume button not found!");
+
+        // --- Optional buttons: share card, daily puzzle, photo puzzle ---
+        if (sharePuzzleButton) sharePuzzleButton.addEventListener('click', sharePuzzleCard);
+        // Everyone gets the same daily puzzle; it is precomputed on the server and HTTP-cached until midnight
+        if (dailyPuzzleButton) dailyPuzzleButton.addEventListener('click', () => fetchNewPuzzle(() => requestPuzzle('/api/daily-puzzle')));
+        if (photoPuzzleButton && photoPuzzleInput) {
+            photoPuzzleButton.addEventListener('click', () => photoPuzzleInput.click());
+            photoPuzzleInput.addEventListener('change', () => {
+                const file = photoPuzzleInput.files[0];
+                photoPuzzleInput.value = ''; // Choosing the same photo again should still fire 'change'
+                if (file) fetchNewPuzzle(() => requestPhotoPuzzle(file));
+            });
+        }
         
+        // --- Offline support: app shell + puzzle pack cache, queued result logs (see /service-worker.js) ---
+        if ('serviceWorker' in navigator) {
+            navigator.serviceWorker.register('/service-worker.js')
+                .catch(error => console.warn('Service worker registration failed:', error));
+            window.addEventListener('online', () => {
+                if (navigator.serviceWorker.controller) navigator.serviceWorker.controller.postMessage('flush-results');
+            });
+        }
+        window.addEventListener('online', flushPendingResults);
+        window.addEventListener('pagehide', beaconPendingResults);
+        flushPendingResults(); // Results left over from an earlier visit
+
         initializeGame();
 
     } catch (e) {
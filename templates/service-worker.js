@@ -0,0 +1,238 @@
+// templates/service-worker.js (served at /service-worker.js by app.py)
+//
+// Offline support for the game:
+// - App shell: the page and its fingerprinted CSS/JS are precached at install time.
+// - Puzzle pack: /api/puzzle-pack is downloaded into the cache. When the network is unavailable,
+//   /api/puzzles and /api/generate-puzzle are answered from it.
+// - Result log: a result POST (/api/log-puzzle-results batch or /api/log-puzzle-result) that fails is
+//   stored in IndexedDB. It is sent again once the connection returns (Background Sync, or the page's
+//   'online' event). Results carry idempotency keys, so a resend the server already has is dropped.
+
+const CACHE_VERSION = {{ cache_version|tojson }};
+const SHELL_CACHE = `shell-${CACHE_VERSION}`;
+const PACK_CACHE = 'puzzle-pack';
+const APP_SHELL_URLS = {{ shell_urls|tojson }};
+const PACK_URL = '/api/puzzle-pack';
+const PACK_REFRESH_MS = 60 * 60 * 1000; // Re-download the pack at most hourly while online
+const RESULT_SYNC_TAG = 'flush-results';
+const RESULT_LOG_PATHS = ['/api/log-puzzle-results', '/api/log-puzzle-result'];
+
+// --- Install / activate ---
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const shell = await caches.open(SHELL_CACHE);
+        await shell.addAll(APP_SHELL_URLS);
+        await refreshPuzzlePack().catch(error => console.warn('[SW] Puzzle pack download failed:', error));
+        await self.skipWaiting();
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const names = await caches.keys();
+        await Promise.all(names
+            .filter(name => name.startsWith('shell-') && name !== SHELL_CACHE)
+            .map(name => caches.delete(name)));
+        await self.clients.claim();
+        await flushQueuedResults();
+    })());
+});
+
+// --- Request routing ---
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    const url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.method === 'POST' && RESULT_LOG_PATHS.includes(url.pathname)) {
+        event.respondWith(logResultOrQueue(request, url.pathname));
+    } else if (request.method !== 'GET') {
+        return;
+    } else if (request.mode === 'navigate' && url.pathname === '/') {
+        event.respondWith(networkFirst(request, SHELL_CACHE, '/'));
+    } else if (request.mode === 'navigate') {
+        // Other pages (a share card, /api/daily-puzzle opened in a tab, ...) must never replace the
+        // cached game page, so they go to the network and only fall back to the game when offline
+        event.respondWith(fetch(request).catch(() => caches.match('/').then(cached => cached || Response.error())));
+    } else if (url.pathname.startsWith('/assets/')) {
+        // Fingerprinted URLs never change content, so the cache is always right
+        event.respondWith(caches.match(request).then(cached => cached || fetch(request)));
+    } else if (url.pathname === '/api/puzzles' || url.pathname === '/api/generate-puzzle') {
+        event.respondWith(puzzlesWithOfflineFallback(request, url));
+    }
+});
+
+async function networkFirst(request, cacheName, fallbackUrl) {
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            const cache = await caches.open(cacheName);
+            cache.put(fallbackUrl || request, response.clone());
+        }
+        return response;
+    } catch (error) {
+        const cached = await caches.match(fallbackUrl || request);
+        if (cached) return cached;
+        throw error;
+    }
+}
+
+// --- Puzzles ---
+async function puzzlesWithOfflineFallback(request, url) {
+    try {
+        const response = await fetch(request);
+        if (response.ok) {
+            maybeRefreshPuzzlePack();
+            flushQueuedResults();
+            return response;
+        }
+        if (response.status < 500) return response;
+    } catch (error) {
+        // Offline: fall through to the pack
+    }
+    const count = url.pathname === '/api/puzzles' ? Math.max(1, parseInt(url.searchParams.get('count') || '1', 10)) : 1;
+    const puzzles = await takePackPuzzles(count);
+    if (puzzles.length === 0) {
+        return jsonResponse({ error: 'You are offline and no saved puzzles are available.' }, 503);
+    }
+    return jsonResponse(url.pathname === '/api/puzzles' ? { puzzles, offline: true } : puzzles[0]);
+}
+
+async function refreshPuzzlePack() {
+    const response = await fetch(PACK_URL, { cache: 'no-cache' });
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+    const cache = await caches.open(PACK_CACHE);
+    await cache.put(PACK_URL, response);
+    await setMeta('packFetchedAt', Date.now());
+}
+
+async function maybeRefreshPuzzlePack() {
+    const fetchedAt = await getMeta('packFetchedAt');
+    if (!fetchedAt || Date.now() - fetchedAt > PACK_REFRESH_MS) {
+        refreshPuzzlePack().catch(error => console.warn('[SW] Puzzle pack refresh failed:', error));
+    }
+}
+
+// Hands out pack puzzles in rotation so an offline session doesn't repeat until the pack runs out
+async function takePackPuzzles(count) {
+    const cached = await caches.match(PACK_URL);
+    if (!cached) return [];
+    const pack = await cached.json();
+    const puzzles = pack.puzzles || [];
+    if (puzzles.length === 0) return [];
+    let cursor = (await getMeta('packCursor')) || 0;
+    const taken = [];
+    for (let i = 0; i < Math.min(count, puzzles.length); i++) {
+        taken.push(puzzles[cursor % puzzles.length]);
+        cursor++;
+    }
+    await setMeta('packCursor', cursor % puzzles.length);
+    return taken;
+}
+
+// --- Result log queue ---
+async function logResultOrQueue(request, path) {
+    const body = await request.clone().text();
+    try {
+        const response = await fetch(request);
+        if (response.status < 500) {
+            flushQueuedResults();
+            return response;
+        }
+    } catch (error) {
+        // Offline: queue below
+    }
+    await queueResult(path, body);
+    if (self.registration.sync) {
+        self.registration.sync.register(RESULT_SYNC_TAG).catch(() => {});
+    }
+    return jsonResponse({ status: 'queued', message: 'Result saved and will be sent when back online.' }, 202);
+}
+
+let flushing = null;
+function flushQueuedResults() {
+    if (!flushing) {
+        flushing = sendQueuedResults().finally(() => { flushing = null; });
+    }
+    return flushing;
+}
+
+async function sendQueuedResults() {
+    const queued = await allQueuedResults();
+    for (const entry of queued) {
+        let response;
+        try {
+            response = await fetch(entry.path, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: entry.body,
+            });
+        } catch (error) {
+            return; // Still offline; try again on the next sync
+        }
+        if (response.status >= 500) return;
+        await deleteQueuedResult(entry.id); // Sent, or rejected as invalid (4xx): either way done
+    }
+}
+
+self.addEventListener('sync', event => {
+    if (event.tag === RESULT_SYNC_TAG) event.waitUntil(flushQueuedResults());
+});
+
+self.addEventListener('message', event => {
+    if (event.data === RESULT_SYNC_TAG) event.waitUntil(flushQueuedResults());
+});
+
+function jsonResponse(payload, status = 200) {
+    return new Response(JSON.stringify(payload), {
+        status,
+        headers: { 'Content-Type': 'application/json' },
+    });
+}
+
+// --- IndexedDB: queued results and small bits of worker state ---
+const DB_NAME = 'emoji-puzzle';
+const RESULTS_STORE = 'queued-results';
+const META_STORE = 'meta';
+
+function openDatabase() {
+    return new Promise((resolve, reject) => {
+        const open = indexedDB.open(DB_NAME, 1);
+        open.onupgradeneeded = () => {
+            open.result.createObjectStore(RESULTS_STORE, { keyPath: 'id', autoIncrement: true });
+            open.result.createObjectStore(META_STORE);
+        };
+        open.onsuccess = () => resolve(open.result);
+        open.onerror = () => reject(open.error);
+    });
+}
+
+async function withStore(storeName, mode, operation) {
+    const db = await openDatabase();
+    return new Promise((resolve, reject) => {
+        const transaction = db.transaction(storeName, mode);
+        const request = operation(transaction.objectStore(storeName));
+        transaction.oncomplete = () => { db.close(); resolve(request && request.result); };
+        transaction.onerror = () => { db.close(); reject(transaction.error); };
+    });
+}
+
+function queueResult(path, body) {
+    return withStore(RESULTS_STORE, 'readwrite', store => store.add({ path, body, queuedAt: Date.now() }));
+}
+
+function allQueuedResults() {
+    return withStore(RESULTS_STORE, 'readonly', store => store.getAll());
+}
+
+function deleteQueuedResult(id) {
+    return withStore(RESULTS_STORE, 'readwrite', store => store.delete(id));
+}
+
+function getMeta(key) {
+    return withStore(META_STORE, 'readonly', store => store.get(key));
+}
+
+function setMeta(key, value) {
+    return withStore(META_STORE, 'readwrite', store => store.put(value, key));
+}
@@ -0,0 +1,59 @@
+# tests/test_emoji_tokenizer.py
+
+"""emoji_tokenizer.split_emojis and split_emoji_text on separated and multi-code-point emojis."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scr"))
+
+from emoji_tokenizer import is_emoji, split_emoji_text, split_emojis  # noqa: E402
+
+FOUR = ["🍬", "🦷", "😈", "🤤"]
+
+
+@pytest.mark.parametrize("text", [
+    "🍬🦷😈🤤",
+    "🍬 🦷 😈 🤤",
+    "🍬,🦷,😈,🤤",
+    "🍬, 🦷, 😈, 🤤",
+    "🍬-🦷-😈-🤤",
+    "🍬 - 🦷 - 😈 - 🤤",
+    "🍬|🦷|😈|🤤",
+    "🍬 | 🦷 | 😈 | 🤤",
+    "🍬 — 🦷 / 😈 · 🤤",
+])
+def test_separators_are_dropped(text):
+    assert split_emoji_text(text) == (FOUR, [])
+
+
+def test_multi_code_point_clusters():
+    family, flag, keycap, heart, thumbs = "👨‍👩‍👧", "🇯🇵", "2️⃣", "❤️", "👍🏽"
+    assert split_emojis(f"{family}{flag}{keycap}{heart}{thumbs}") == [family, flag, keycap, heart, thumbs]
+
+
+@pytest.mark.parametrize("text, words", [
+    ("Mother 🍬 🦷", ["Mother"]),
+    ("🍬,Mother,🦷", ["Mother"]),
+    ("🍬 7 🦷", ["7"]),
+    ("🍬 a 🦷", ["a"]),
+    ("🍬 Zähne 🦷", ["Zähne"]),
+])
+def test_text_is_returned_separately(text, words):
+    emojis, text_words = split_emoji_text(text)
+    assert emojis == ["🍬", "🦷"]
+    assert text_words == words
+
+
+def test_every_token_is_an_emoji():
+    assert all(is_emoji(token) for token in split_emojis("🍬, x, 🦷 | 7 | 😈 - 🤤"))
+    assert not is_emoji(",")
+    assert not is_emoji("ab")
+
+
+def test_empty():
+    assert split_emojis("") == []
+    assert split_emoji_text(None) == ([], [])
@@ -0,0 +1,56 @@
+# tests/test_generation_coalescer.py
+
+"""A prefill generation a player starts waiting on is promoted to interactive priority."""
+
+import sys
+import threading
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scr"))
+
+from deadline import Deadline  # noqa: E402
+from generation_coalescer import GenerationCoalescer  # noqa: E402
+from llm_scheduler import BACKGROUND, INTERACTIVE, current_priority  # noqa: E402
+
+
+def test_waiter_promotes_prefill_generation():
+    started, resume = threading.Event(), threading.Event()
+    priorities = [] # Priority of each "model call": one per pipeline stage
+
+    def generate(deadline):
+        priorities.append(current_priority())
+        started.set()
+        assert resume.wait(5)
+        priorities.append(current_priority())
+        return {'phrase': 'Sweet tooth'}
+
+    coalescer = GenerationCoalescer(generate, max_in_flight=1)
+    coalescer.prefill(1)
+    assert started.wait(5)
+
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(coalescer.get(Deadline(5))))
+    waiter.start()
+    while coalescer.stats()['waiting'] == 0:
+        pass
+    resume.set()
+    waiter.join(5)
+
+    assert priorities == [BACKGROUND, INTERACTIVE]
+    assert result == [{'phrase': 'Sweet tooth'}]
+
+
+def test_prefill_without_waiters_stays_background():
+    priorities = []
+    done = threading.Event()
+
+    def generate(deadline):
+        priorities.append(current_priority())
+        done.set()
+        return {'phrase': 'Sweet tooth'}
+
+    coalescer = GenerationCoalescer(generate, max_in_flight=1)
+    coalescer.prefill(1)
+    assert done.wait(5)
+    assert priorities == [BACKGROUND]
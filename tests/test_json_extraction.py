@@ -0,0 +1,38 @@
+# tests/test_json_extraction.py
+
+"""json_extraction.extract_json_object against the response corpus in bench/data.
+
+Every corpus entry names the phrase its response holds ("expected_phrase"), or null when the
+response holds no usable puzzle (refusals, truncated output). Run from the project root:
+
+    python -m pytest tests
+"""
+
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scr"))
+
+from json_extraction import JSONExtractionError, extract_json_object  # noqa: E402
+
+CORPUS = PROJECT_ROOT / "bench" / "data" / "model_responses.jsonl"
+
+
+def load_corpus():
+    with open(CORPUS, encoding="utf-8") as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+
+@pytest.mark.parametrize("entry", load_corpus(), ids=lambda entry: f"{entry['id']}-{entry['shape']}")
+def test_extracts_expected_phrase(entry):
+    if entry["expected_phrase"] is None:
+        with pytest.raises(JSONExtractionError):
+            extract_json_object(entry["response"])
+        return
+    puzzle_data, _ = extract_json_object(entry["response"])
+    assert isinstance(puzzle_data, dict)
+    assert puzzle_data.get("phrase") == entry["expected_phrase"]
@@ -0,0 +1,81 @@
+# tests/test_model_connector.py
+
+"""A request budget spent before any endpoint is called must not count against the circuit breaker."""
+
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scr"))
+
+from circuit_breaker import CircuitBreaker  # noqa: E402
+from deadline import Deadline  # noqa: E402
+from model_connector import ModelConnector  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class SlowQueue:
+    """A scheduler whose slot is granted only after `wait` seconds of the deadline have passed."""
+
+    def __init__(self, clock, wait):
+        self.clock = clock
+        self.wait = wait
+
+    @contextmanager
+    def slot(self, deadline=None, priority=None):
+        self.clock.now += self.wait
+        yield True
+
+
+@pytest.fixture
+def connector(monkeypatch):
+    monkeypatch.delenv("PUZZLE_RESPONSE_STORE_MODE", raising=False)
+    connector = ModelConnector(min_call_seconds=2.0)
+
+    def unexpected_call(*args, **kwargs):
+        raise AssertionError("no endpoint should be called without budget")
+    monkeypatch.setattr(connector, "_post_endpoint", unexpected_call)
+    return connector
+
+
+def half_open_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0, clock=clock)
+    breaker.record_failure()
+    clock.now += 31 # Past reset_timeout: the next allow_request() is the half-open probe
+    return breaker
+
+
+def test_budget_spent_in_queue_is_not_a_backend_failure(connector):
+    clock = FakeClock()
+    connector.breaker = half_open_breaker(clock)
+    connector.scheduler = SlowQueue(clock, wait=9.0)
+    deadline = Deadline(10.0, clock=clock) # 1s left once the slot is granted, under min_call_seconds
+
+    text = connector.enhance_prompt("model", "prompt", deadline=deadline)
+
+    assert text.startswith("Error: request deadline exceeded")
+    # The probe was never used, so the next call with budget may still probe
+    assert not connector.breaker.is_open()
+    assert connector.breaker.allow_request()
+
+
+def test_no_endpoint_attempted_releases_the_probe(connector):
+    clock = FakeClock()
+    connector.breaker = half_open_breaker(clock)
+    deadline = Deadline(1.0, clock=clock)
+
+    text = connector._call_text_model("model", "system", "prompt", deadline)
+
+    assert text == "Error: request deadline exceeded before calling model"
+    assert connector.breaker.state == CircuitBreaker.HALF_OPEN # Not re-opened
+    assert connector.breaker.allow_request()
@@ -0,0 +1,40 @@
+# tests/test_puzzle_validator.py
+
+"""PuzzleValidator's emoji rules: separators are tolerated, text in the emojis field is not."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "scr"))
+
+from puzzle_validator import PuzzleValidator  # noqa: E402
+
+PUZZLE = {"phrase": "Sweet tooth", "words": ["Sweet", "tooth"], "category": "Dessert",
+          "explanation": "Candy and a tooth spell out a love of sugar."}
+
+
+def validate(emojis):
+    return PuzzleValidator().validate(dict(PUZZLE, emojis=emojis))
+
+
+@pytest.mark.parametrize("emojis", ["🍬 🦷 😈 🤤", "🍬, 🦷, 😈, 🤤", "🍬-🦷-😈-🤤", "🍬 | 🦷 | 😈 | 🤤"])
+def test_separated_emojis_pass(emojis):
+    result = validate(emojis)
+    assert result.passed, result.failures
+    assert result.emojis_list == ["🍬", "🦷", "😈", "🤤"]
+
+
+def test_separators_are_not_counted_as_emojis():
+    result = validate("🍬,🦷,😈")
+    assert result.reasons == ["emoji_count"]
+    assert result.emojis_list == ["🍬", "🦷", "😈"]
+
+
+@pytest.mark.parametrize("emojis", ["🍬 🦷 😈 🤤 Mother", "🍬 🦷 😈 🤤 7", "🍬 🦷 a 😈 🤤", "🍬 🦷 Zähne 😈 🤤"])
+def test_text_in_emojis_is_rejected(emojis):
+    result = validate(emojis)
+    assert not result.passed
+    assert "text_in_emojis" in result.failures